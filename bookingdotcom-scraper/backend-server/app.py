@@ -1,11 +1,62 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-from curl_cffi import requests
+import asyncio
+import hashlib
 import json
 import logging
-from datetime import datetime
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+
+import upstream
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY
+from cache import ResultCache, STALE
+from shared_cache import SHARED_CACHE_DB, SharedCache
+from local_sqlite import BackgroundWriter
+from singleflight import Broadcast, SingleFlight
+from ratelimit import CircuitOpenError
+from pushdown import NO_PUSHDOWN, covers, filters_input, pushdown_filters
+from search_query import check_search_response, search_request
+from destinations import DESTINATION_DB, DestinationIndex, UnknownLocation
+from stream_parse import ResultsStreamParser
+from hotel_table import HotelTable, format_sort, parse_sort
+from result_sets import decode_result_set_id, encode_result_set_id
+from fast_json import JSON_ENCODER, FastJSONProvider, dumps, embed, loads, splice
+from compression import COMPRESS_MIN_BYTES, compress, negotiate
+from extractor import HOTEL_FIELDS, compile_extractor
+from image_proxy import (
+    ALLOWED_PREFIX, IMAGE_MAX_AGE, IMAGE_PROXY_URL, ImageError,
+    get_image, image_cache, is_allowed, proxied_url, thumbnail_width
+)
+from jobs import JOB_RETAIN_SECONDS, SUCCEEDED, JobQueue, JobQueueFull
+from change_feed import ChangeFeed, Snapshot, diff
+from snapshots import HISTORY_DEFAULT_LIMIT, HISTORY_MAX_LIMIT, SNAPSHOT_DB, SnapshotStore, parse_query_key, query_key
+from price_calendar import (
+    CALENDAR_CONCURRENCY, CALENDAR_DEFAULT_DAYS, CALENDAR_MAX_DAYS, MAX_NIGHTS,
+    checkin_dates, nightly_prices, parse_percentiles, summarize
+)
 
 app = Flask(__name__)
+# jsonify() goes through the fast encoder (orjson when installed)
+app.json = FastJSONProvider(app)
+
+# Parse upstream bodies incrementally as they arrive (STREAM_PARSE=1); slower than decoding the whole
+# body at once, so it only pays off when peak memory matters more than latency
+STREAM_PARSE = os.environ.get("STREAM_PARSE", "0") != "0"
+# Searches per /search/batch request and how many of them run at once
+BATCH_MAX_SEARCHES = int(os.environ.get("BATCH_MAX_SEARCHES", 100))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 8))
+# Largest page_size of a paged streaming search; Booking.com returns at most 100 hotels per page
+MAX_PAGE_SIZE = 100
+
+# search_hotels keyword arguments applied to a result set locally
+FILTER_PARAMS = ("max_price", "min_price", "min_stars", "min_reviews", "min_score")
+QUERY_PARAMS = FILTER_PARAMS + ("sort", "limit", "offset")
+
+# Fraction of /search requests logged as one structured JSON line
+SEARCH_LOG_SAMPLE_RATE = float(os.environ.get("SEARCH_LOG_SAMPLE_RATE", 0.01))
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,14 +67,108 @@ CORS(app,
      origins=['*'],  # Allow all origins
      methods=['GET', 'POST', 'OPTIONS'],  # Allow these HTTP methods
      allow_headers=['Content-Type', 'Accept', 'Authorization', 'X-Requested-With'],  # Allow these headers
+     expose_headers=['ETag'],  # Let browser clients send it back in If-None-Match
      supports_credentials=True)  # Allow credentials
 
+# Search results per (upstream query, pushed-down filters), shared by all requests in this process
+result_cache = ResultCache()
+# The same result sets, shared with the other worker processes when SHARED_CACHE_DB is set
+shared_cache = SharedCache(SHARED_CACHE_DB) if SHARED_CACHE_DB else None
+# Currency Booking.com priced each (dest_id, dest_type) in, learned from the result sets fetched for it
+destination_currency = {}
+# Writes to the shared cache and the price history, which can wait on other workers' locks, off the upstream loop
+store_writer = BackgroundWriter("store-writer")
+# Per-night price arrays per (destination, check-in date, length of stay, occupancy, filters)
+calendar_cache = ResultCache(stale_ttl=0, max_bytes=8 * 1024 * 1024)
+# Compressed /search bodies per (ETag, content coding); ETags change with the result set's contents
+response_cache = ResultCache(stale_ttl=0, max_bytes=16 * 1024 * 1024)
+# Concurrent identical upstream queries share one in-flight fetch
+search_flight = SingleFlight(upstream.get_loop)
+# Hotels of the streamed fetches in search_flight, by key, for streamed searches that join them
+live_fetches = {}
+# Searches submitted with async=1, run in the background on the upstream loop
+search_jobs = JobQueue(lambda params: run_search_job(params), upstream.get_loop, on_change=lambda job: job_changed(job))
+# Price history of every fetched result set, when SNAPSHOT_DB is set
+snapshot_store = SnapshotStore(SNAPSHOT_DB) if SNAPSHOT_DB else None
+# Free-text locations resolved to Booking.com destination ids
+destination_index = DestinationIndex(DESTINATION_DB)
+# Recent versions of the hotels each polled search matched, for /search/changes
+change_feed = ChangeFeed()
+
+# Metrics exposed at /metrics
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP requests by endpoint and status", ("endpoint", "status"))
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time until the response headers are ready, by endpoint", ("endpoint",))
+SEARCH_STAGE_LATENCY = REGISTRY.histogram(
+    "search_stage_duration_seconds",
+    "Time spent per search stage: upstream_wait, upstream_body, parse, project, filter, serialize, compress",
+    ("stage",))
+SEARCH_RESULTS = REGISTRY.histogram(
+    "search_results", "Hotels returned per search after filtering", (),
+    buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000))
+UPSTREAM_RESPONSES = REGISTRY.counter(
+    "upstream_responses_total", "Upstream search responses by HTTP status", ("status",))
+UPSTREAM_REQUEST_BYTES = REGISTRY.counter(
+    "upstream_request_bytes_total", "Bytes of search payload sent upstream")
+UPSTREAM_RESPONSE_BYTES = REGISTRY.counter(
+    "upstream_response_bytes_total", "Bytes of search response received from upstream")
+UPSTREAM_RESULTS = REGISTRY.counter(
+    "upstream_results_total", "Hotels received from upstream before local filtering")
+REGISTRY.callback_counter("result_cache_events_total", "Search result cache events by kind",
+                          lambda: cache_events(result_cache), ("event",))
+REGISTRY.gauge("result_cache_bytes", "Approximate bytes held by the search result cache",
+               lambda: result_cache.stats()["bytes"])
+REGISTRY.callback_counter("calendar_cache_events_total", "Calendar price cache events by kind",
+                          lambda: cache_events(calendar_cache), ("event",))
+REGISTRY.callback_counter("response_cache_events_total", "Compressed response cache events by kind",
+                          lambda: cache_events(response_cache), ("event",))
+REGISTRY.callback_counter("upstream_retries_total", "Upstream search attempts retried after throttling or an error",
+                          lambda: upstream.limiter_stats()["retries"])
+REGISTRY.gauge("singleflight_in_flight", "Upstream fetches currently in flight",
+               lambda: search_flight.stats()["in_flight"])
+JOB_LATENCY = REGISTRY.histogram(
+    "search_job_duration_seconds", "Async search job time by phase: queued (until a worker starts it), running",
+    ("phase",), buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+REGISTRY.gauge("search_jobs_queued", "Async search jobs waiting for a worker",
+               lambda: search_jobs.stats()["queued"])
+REGISTRY.gauge("search_job_utilization", "Fraction of async search job workers running a job",
+               lambda: search_jobs.stats()["utilization"])
+REGISTRY.callback_counter("search_jobs_events_total", "Async search jobs by outcome",
+                          lambda: {(event,): search_jobs.stats()[event] for event in ("submitted", "succeeded", "failed", "rejected")},
+                          ("event",))
+REGISTRY.gauge("upstream_concurrency_window", "Concurrent upstream search requests currently allowed",
+               lambda: upstream.search_limiter.window)
+REGISTRY.gauge("upstream_circuit_open", "1 while the upstream circuit breaker refuses search requests",
+               lambda: int(upstream.search_limiter.is_open()))
+REGISTRY.gauge("upstream_session_error_rate", "Recent error rate of each upstream session, by impersonation profile",
+               lambda: {(session["profile"],): session["error_rate"] for session in upstream.session_stats()},
+               ("profile",))
+REGISTRY.gauge("upstream_sessions_cooling", "Upstream sessions resting after too many errors",
+               lambda: sum(session["state"] == "cooling" for session in upstream.session_stats()))
+
+def cache_events(cache):
+    stats = cache.stats()
+    return {
+        (event,): stats[event]
+        for event in ("hits", "stale_hits", "expired_hits", "misses", "evictions", "expirations", "refreshes")
+    }
+
 def format_image_url(relative_url):
-    """Format image URL to use Booking.com's CDN domain"""
+    """Format image URL to use Booking.com's CDN domain, or the /img proxy when IMAGE_PROXY_URL is set"""
     if not relative_url:
         return None
+    if IMAGE_PROXY_URL:
+        return proxied_url(relative_url)
     return f"https://cf.bstatic.com{relative_url}"
 
+class SearchParamError(Exception):
+    """Invalid search parameters, reported to the client as a 400"""
+    def __init__(self, error, message):
+        super().__init__(message)
+        self.error = error
+        self.message = message
+
 def validate_date(date_string):
     """Validate and parse date in YYYY-MM-DD format"""
     try:
@@ -31,214 +176,418 @@ def validate_date(date_string):
     except ValueError:
         raise ValueError("Date must be in YYYY-MM-DD format")
 
-def search_hotels(checkin_date, checkout_date, location="Seattle, United States", dest_id=20144883, 
-                 max_price=None, min_stars=None, min_reviews=None, adults=2, rooms=1, children=0):
-    """Search for hotels using Booking.com API"""
-    
-    url = "https://www.booking.com/dml/graphql?ss=Seattle%2C+United+States&efdco=1&label=gen173nr-1FCAEoggI46AdIM1gEaLQCiAEBmAExuAEHyAEM2AEB6AEB-AECiAIBqAIDuAK-iPnBBsACAdICJGZmMzBhOGRjLTQ1M2ItNGY0Ny04YmZjLWQyMDFjYTNiZWM1MdgCBeACAQ&sid=13b7b29af206a79542e44dfdce841b83&aid=304142&lang=en-us&sb=1&src_elem=sb&src=index&dest_id=20144883&dest_type=city&checkin=2025-07-01&checkout=2025-07-19&group_adults=2&no_rooms=1&group_children=0"
-    
-    payload = json.dumps({
-        "operationName": "FullSearch",
-        "variables": {
-            "includeBundle": False,
-            "input": {
-                "acidCarouselContext": None,
-                "childrenAges": [],
-                "dates": {
-                    "checkin": checkin_date,
-                    "checkout": checkout_date
-                },
-                "doAvailabilityCheck": False,
-                "encodedAutocompleteMeta": None,
-                "enableCampaigns": True,
-                "filters": {},
-                "flexibleDatesConfig": {
-                    "broadDatesCalendar": {
-                        "checkinMonths": [],
-                        "los": [],
-                        "startWeekdays": []
-                    },
-                    "dateFlexUseCase": "DATE_RANGE",
-                    "dateRangeCalendar": {
-                        "checkin": [checkin_date],
-                        "checkout": [checkout_date]
-                    }
-                },
-                "forcedBlocks": None,
-                "location": {
-                    "searchString": location,
-                    "destType": "CITY",
-                    "destId": dest_id
-                },
-                "metaContext": {
-                    "metaCampaignId": 0,
-                    "externalTotalPrice": None,
-                    "feedPrice": None,
-                    "hotelCenterAccountId": None,
-                    "rateRuleId": None,
-                    "dragongateTraceId": None,
-                    "pricingProductsTag": None
-                },
-                "nbRooms": rooms,
-                "nbAdults": adults,
-                "nbChildren": children,
-                "showAparthotelAsHotel": True,
-                "needsRoomsMatch": False,
-                "optionalFeatures": {
-                    "forceArpExperiments": True,
-                    "testProperties": False
-                },
-                "pagination": {
-                    "rowsPerPage": 1000,
-                    "offset": 0
-                },
-                "rawQueryForSession": f"/searchresults.html?label=gen173nr-1FCAEoggI46AdIM1gEaLQCiAEBmAExuAEHyAEM2AEB6AEB-AECiAIBqAIDuAK-iPnBBsACAdICJGZmMzBhOGRjLTQ1M2ItNGY0Ny04YmZjLWQyMDFjYTNiZWM1MdgCBeACAQ&sid=13b7b29af206a79542e44dfdce841b83&aid=304142&ss=Seattle%2C+United+States&efdco=1&lang=en-us&sb=1&src_elem=sb&src=index&dest_id=20144883&dest_type=city&checkin={checkin_date}&checkout={checkout_date}&group_adults={adults}&no_rooms={rooms}&group_children={children}",
-                "referrerBlock": {
-                    "blockName": "searchbox"
-                },
-                "sbCalendarOpen": True,
-                "sorters": {
-                    "selectedSorter": None,
-                    "referenceGeoId": None,
-                    "tripTypeIntentId": None
-                },
-                "travelPurpose": 2,
-                "seoThemeIds": [],
-                "useSearchParamsFromSession": True,
-                "merchInput": {
-                    "testCampaignIds": []
-                },
-                "webSearchContext": {
-                    "reason": "CLIENT_SIDE_UPDATE",
-                    "source": "SEARCH_RESULTS",
-                    "outcome": "SEARCH_RESULTS"
-                },
-                "clientSideRequestId": "86ed05d965d10150"
-            },
-            "carouselLowCodeExp": False
-        },
-        "extensions": {},
-        "query": "query FullSearch($input: SearchQueryInput!, $carouselLowCodeExp: Boolean!, $includeBundle: Boolean = false) {\n  searchQueries {\n    search(input: $input) {\n      ...FullSearchFragment\n      __typename\n    }\n    __typename\n  }\n}\n\nfragment FullSearchFragment on SearchQueryOutput {\n  banners {\n    ...Banner\n    __typename\n  }\n  breadcrumbs {\n    ... on SearchResultsBreadcrumb {\n      ...SearchResultsBreadcrumb\n      __typename\n    }\n    ... on LandingPageBreadcrumb {\n      ...LandingPageBreadcrumb\n      __typename\n    }\n    __typename\n  }\n  carousels {\n    ...Carousel\n    __typename\n  }\n  destinationLocation {\n    ...DestinationLocation\n    __typename\n  }\n  entireHomesSearchEnabled\n  dateFlexibilityOptions {\n    enabled\n    __typename\n  }\n  flexibleDatesConfig {\n    broadDatesCalendar {\n      checkinMonths\n      los\n      startWeekdays\n      losType\n      __typename\n    }\n    dateFlexUseCase\n    dateRangeCalendar {\n      flexWindow\n      checkin\n      checkout\n      __typename\n    }\n    __typename\n  }\n  filters {\n    ...FilterData\n    __typename\n  }\n  filtersTrackOnView {\n    type\n    experimentHash\n    value\n    __typename\n  }\n  appliedFilterOptions {\n    ...FilterOption\n    __typename\n  }\n  recommendedFilterOptions {\n    ...FilterOption\n    __typename\n  }\n  pagination {\n    nbResultsPerPage\n    nbResultsTotal\n    __typename\n  }\n  tripTypes {\n    ...TripTypesData\n    __typename\n  }\n  results {\n    ...BasicPropertyData\n    ...PropertyUspBadges\n    ...MatchingUnitConfigurations\n    ...PropertyBlocks\n    ...BookerExperienceData\n    ...TopPhotos\n    generatedPropertyTitle\n    priceDisplayInfoIrene {\n      ...PriceDisplayInfoIrene\n      __typename\n    }\n    licenseDetails {\n      nextToHotelName\n      __typename\n    }\n    isTpiExclusiveProperty\n    propertyCribsAvailabilityLabel\n    mlBookingHomeTags\n    trackOnView {\n      experimentTag\n      __typename\n    }\n    __typename\n  }\n  searchMeta {\n    ...SearchMetadata\n    __typename\n  }\n  sorters {\n    option {\n      ...SorterFields\n      __typename\n    }\n    __typename\n  }\n  zeroResultsSection {\n    ...ZeroResultsSection\n    __typename\n  }\n  rocketmilesSearchUuid\n  previousSearches {\n    ...PreviousSearches\n    __typename\n  }\n  merchComponents {\n    ...MerchRegionIrene\n    __typename\n  }\n  wishlistData {\n    numProperties\n    __typename\n  }\n  seoThemes {\n    id\n    caption\n    __typename\n  }\n  gridViewPreference\n  advancedSearchWidget {\n    title\n    legalDisclaimer\n    description\n    placeholder\n    ctaText\n    helperText\n    __typename\n  }\n  visualFiltersGroups {\n    ...VisualFiltersGroup\n    __typename\n  }\n  __typename\n}\n\nfragment BasicPropertyData on SearchResultProperty {\n  acceptsWalletCredit\n  basicPropertyData {\n    accommodationTypeId\n    id\n    isTestProperty\n    location {\n      address\n      city\n      countryCode\n      __typename\n    }\n    pageName\n    ufi\n    photos {\n      main {\n        highResUrl {\n          relativeUrl\n          __typename\n        }\n        lowResUrl {\n          relativeUrl\n          __typename\n        }\n        highResJpegUrl {\n          relativeUrl\n          __typename\n        }\n        lowResJpegUrl {\n          relativeUrl\n          __typename\n        }\n        tags {\n          id\n          __typename\n        }\n        __typename\n      }\n      __typename\n    }\n    reviewScore: reviews {\n      score: totalScore\n      reviewCount: reviewsCount\n      totalScoreTextTag {\n        translation\n        __typename\n      }\n      showScore\n      secondaryScore\n      secondaryTextTag {\n        translation\n        __typename\n      }\n      showSecondaryScore\n      __typename\n    }\n    externalReviewScore: externalReviews {\n      score: totalScore\n      reviewCount: reviewsCount\n      showScore\n      totalScoreTextTag {\n        translation\n        __typename\n      }\n      __typename\n    }\n    starRating {\n      value\n      symbol\n      caption {\n        translation\n        __typename\n      }\n      tocLink {\n        translation\n        __typename\n      }\n      showAdditionalInfoIcon\n      __typename\n    }\n    isClosed\n    paymentConfig {\n      installments {\n        minPriceFormatted\n        maxAcceptCount\n        __typename\n      }\n      __typename\n    }\n    __typename\n  }\n  badges {\n    caption {\n      translation\n      __typename\n    }\n    closedFacilities {\n      startDate\n      endDate\n      __typename\n    }\n    __typename\n  }\n  customBadges {\n    showSkiToDoor\n    showBhTravelCreditBadge\n    showOnlineCheckinBadge\n    __typename\n  }\n  description {\n    text\n    __typename\n  }\n  displayName {\n    text\n    translationTag {\n      translation\n      __typename\n    }\n    __typename\n  }\n  geniusInfo {\n    benefitsCommunication {\n      header {\n        title\n        __typename\n      }\n      items {\n        title\n        __typename\n      }\n      __typename\n    }\n    geniusBenefits\n    geniusBenefitsData {\n      hotelCardHasFreeBreakfast\n      hotelCardHasFreeRoomUpgrade\n      sortedBenefits\n      __typename\n    }\n    showGeniusRateBadge\n    __typename\n  }\n  location {\n    displayLocation\n    mainDistance\n    mainDistanceDescription\n    publicTransportDistanceDescription\n    skiLiftDistance\n    beachDistance\n    nearbyBeachNames\n    beachWalkingTime\n    geoDistanceMeters\n    isCentrallyLocated\n    isWithinBestLocationScoreArea\n    popularFreeDistrictName\n    nearbyUsNaturalParkText\n    __typename\n  }\n  mealPlanIncluded {\n    mealPlanType\n    text\n    __typename\n  }\n  persuasion {\n    autoextended\n    geniusRateAvailable\n    highlighted\n    preferred\n    preferredPlus\n    showNativeAdLabel\n    nativeAdId\n    nativeAdsCpc\n    nativeAdsTracking\n    sponsoredAdsData {\n      isDsaCompliant\n      legalEntityName\n      sponsoredAdsDesign\n      __typename\n    }\n    __typename\n  }\n  policies {\n    showFreeCancellation\n    showNoPrepayment\n    showPetsAllowedForFree\n    enableJapaneseUsersSpecialCase\n    __typename\n  }\n  ribbon {\n    ribbonType\n    text\n    __typename\n  }\n  recommendedDate {\n    checkin\n    checkout\n    lengthOfStay\n    __typename\n  }\n  showGeniusLoginMessage\n  hostTraderLabel\n  soldOutInfo {\n    isSoldOut\n    messages {\n      text\n      __typename\n    }\n    alternativeDatesMessages {\n      text\n      __typename\n    }\n    __typename\n  }\n  nbWishlists\n  nonMatchingFlexibleFilterOptions {\n    label\n    __typename\n  }\n  visibilityBoosterEnabled\n  showAdLabel\n  isNewlyOpened\n  propertySustainability {\n    isSustainable\n    certifications {\n      name\n      __typename\n    }\n    __typename\n  }\n  seoThemes {\n    caption\n    __typename\n  }\n  relocationMode {\n    distanceToCityCenterKm\n    distanceToCityCenterMiles\n    distanceToOriginalHotelKm\n    distanceToOriginalHotelMiles\n    phoneNumber\n    __typename\n  }\n  bundleRatesAvailable\n  __typename\n}\n\nfragment Banner on Banner {\n  name\n  type\n  isDismissible\n  showAfterDismissedDuration\n  position\n  requestAlternativeDates\n  merchId\n  title {\n    text\n    __typename\n  }\n  imageUrl\n  paragraphs {\n    text\n    __typename\n  }\n  metadata {\n    key\n    value\n    __typename\n  }\n  pendingReviewInfo {\n    propertyPhoto {\n      lowResUrl {\n        relativeUrl\n        __typename\n      }\n      lowResJpegUrl {\n        relativeUrl\n        __typename\n      }\n      __typename\n    }\n    propertyName\n    urlAccessCode\n    __typename\n  }\n  nbDeals\n  primaryAction {\n    text {\n      text\n      __typename\n    }\n    action {\n      name\n      context {\n        key\n        value\n        __typename\n      }\n      __typename\n    }\n    __typename\n  }\n  secondaryAction {\n    text {\n      text\n      __typename\n    }\n    action {\n      name\n      context {\n        key\n        value\n        __typename\n      }\n      __typename\n    }\n    __typename\n  }\n  iconName\n  flexibleFilterOptions {\n    optionId\n    filterName\n    __typename\n  }\n  trackOnView {\n    type\n    experimentHash\n    value\n    __typename\n  }\n  dateFlexQueryOptions {\n    text {\n      text\n      __typename\n    }\n    action {\n      name\n      context {\n        key\n        value\n        __typename\n      }\n      __typename\n    }\n    isApplied\n    __typename\n  }\n  __typename\n}\n\nfragment Carousel on Carousel {\n  aggregatedCountsByFilterId\n  carouselId\n  position\n  contentType\n  hotelId\n  name\n  soldoutProperties\n  priority\n  themeId\n  title {\n    text\n    __typename\n  }\n  slides {\n    captionText {\n      text\n      __typename\n    }\n    name\n    photoUrl\n    subtitle {\n      text\n      __typename\n    }\n    type\n    title {\n      text\n      __typename\n    }\n    action {\n      context {\n        key\n        value\n        __typename\n      }\n      __typename\n    }\n    __typename\n  }\n  __typename\n}\n\nfragment DestinationLocation on DestinationLocation {\n  name {\n    text\n    __typename\n  }\n  inName {\n    text\n    __typename\n  }\n  countryCode\n  ufi\n  __typename\n}\n\nfragment FilterData on Filter {\n  trackOnView {\n    type\n    experimentHash\n    value\n    __typename\n  }\n  trackOnClick {\n    type\n    experimentHash\n    value\n    __typename\n  }\n  name\n  field\n  category\n  filterStyle\n  title {\n    text\n    translationTag {\n      translation\n      __typename\n    }\n    __typename\n  }\n  subtitle\n  options {\n    parentId\n    genericId\n    trackOnView {\n      type\n      experimentHash\n      value\n      __typename\n    }\n    trackOnClick {\n      type\n      experimentHash\n      value\n      __typename\n    }\n    trackOnSelect {\n      type\n      experimentHash\n      value\n      __typename\n    }\n    trackOnDeSelect {\n      type\n      experimentHash\n      value\n      __typename\n    }\n    trackOnViewPopular {\n      type\n      experimentHash\n      value\n      __typename\n    }\n    trackOnClickPopular {\n      type\n      experimentHash\n      value\n      __typename\n    }\n    trackOnSelectPopular {\n      type\n      experimentHash\n      value\n      __typename\n    }\n    trackOnDeSelectPopular {\n      type\n      experimentHash\n      value\n      __typename\n    }\n    ...FilterOption\n    __typename\n  }\n  filterLayout {\n    isCollapsable\n    collapsedCount\n    __typename\n  }\n  stepperOptions {\n    min\n    max\n    default\n    selected\n    title {\n      text\n      translationTag {\n        translation\n        __typename\n      }\n      __typename\n    }\n    field\n    labels {\n      text\n      translationTag {\n        translation\n        __typename\n      }\n      __typename\n    }\n    trackOnView {\n      type\n      experimentHash\n      value\n      __typename\n    }\n    trackOnClick {\n      type\n      experimentHash\n      value\n      __typename\n    }\n    trackOnSelect {\n      type\n      experimentHash\n      value\n      __typename\n    }\n    trackOnDeSelect {\n      type\n      experimentHash\n      value\n      __typename\n    }\n    trackOnClickDecrease {\n      type\n      experimentHash\n      value\n      __typename\n    }\n    trackOnClickIncrease {\n      type\n      experimentHash\n      value\n      __typename\n    }\n    trackOnDecrease {\n      type\n      experimentHash\n      value\n      __typename\n    }\n    trackOnIncrease {\n      type\n      experimentHash\n      value\n      __typename\n    }\n    __typename\n  }\n  sliderOptions {\n    min\n    max\n    minSelected\n    maxSelected\n    minPriceStep\n    minSelectedFormatted\n    currency\n    histogram\n    selectedRange {\n      translation\n      __typename\n    }\n    __typename\n  }\n  sliderOptionsPerStay {\n    min\n    max\n    minSelected\n    maxSelected\n    minPriceStep\n    minSelectedFormatted\n    currency\n    histogram\n    selectedRange {\n      translation\n      __typename\n    }\n    __typename\n  }\n  distanceToPoiData {\n    options {\n      text\n      value\n      isDefault\n      __typename\n    }\n    poiNotFound\n    poiPlaceholder\n    poiHelper\n    isSelected\n    selectedOptionValue\n    selectedPlaceId {\n      numValue\n      stringValue\n      __typename\n    }\n    selectedPoiType {\n      destType\n      source\n      __typename\n    }\n    selectedPoiText\n    selectedPoiLatitude\n    selectedPoiLongitude\n    __typename\n  }\n  __typename\n}\n\nfragment FilterOption on Option {\n  optionId: id\n  count\n  selected\n  urlId\n  source\n  field\n  additionalLabel {\n    text\n    translationTag {\n      translation\n      __typename\n    }\n    __typename\n  }\n  value {\n    text\n    translationTag {\n      translation\n      __typename\n    }\n    __typename\n  }\n  starRating {\n    value\n    symbol\n    caption {\n      translation\n      __typename\n    }\n    showAdditionalInfoIcon\n    __typename\n  }\n  __typename\n}\n\nfragment LandingPageBreadcrumb on LandingPageBreadcrumb {\n  destType\n  name\n  urlParts\n  __typename\n}\n\nfragment MatchingUnitConfigurations on SearchResultProperty {\n  matchingUnitConfigurations {\n    commonConfiguration {\n      name\n      unitId\n      bedConfigurations {\n        beds {\n          count\n          type\n          __typename\n        }\n        nbAllBeds\n        __typename\n      }\n      nbAllBeds\n      nbBathrooms\n      nbBedrooms\n      nbKitchens\n      nbLivingrooms\n      nbUnits\n      unitTypeNames {\n        translation\n        __typename\n      }\n      localizedArea {\n        localizedArea\n        unit\n        __typename\n      }\n      __typename\n    }\n    unitConfigurations {\n      name\n      unitId\n      bedConfigurations {\n        beds {\n          count\n          type\n          __typename\n        }\n        nbAllBeds\n        __typename\n      }\n      apartmentRooms {\n        config {\n          roomId: id\n          roomType\n          bedTypeId\n          bedCount: count\n          __typename\n        }\n        roomName: tag {\n          tag\n          translation\n          __typename\n        }\n        __typename\n      }\n      nbAllBeds\n      nbBathrooms\n      nbBedrooms\n      nbKitchens\n      nbLivingrooms\n      nbUnits\n      unitTypeNames {\n        translation\n        __typename\n      }\n      localizedArea {\n        localizedArea\n        unit\n        __typename\n      }\n      unitTypeId\n      __typename\n    }\n    __typename\n  }\n  __typename\n}\n\nfragment PropertyBlocks on SearchResultProperty {\n  blocks {\n    blockId {\n      roomId\n      occupancy\n      policyGroupId\n      packageId\n      mealPlanId\n      bundleId\n      __typename\n    }\n    finalPrice {\n      amount\n      currency\n      __typename\n    }\n    originalPrice {\n      amount\n      currency\n      __typename\n    }\n    onlyXLeftMessage {\n      tag\n      variables {\n        key\n        value\n        __typename\n      }\n      translation\n      __typename\n    }\n    freeCancellationUntil\n    hasCrib\n    blockMatchTags {\n      childStaysForFree\n      freeStayChildrenAges\n      __typename\n    }\n    thirdPartyInventoryContext {\n      isTpiBlock\n      __typename\n    }\n    bundle @include(if: $includeBundle) {\n      highlightedText\n      __typename\n    }\n    __typename\n  }\n  __typename\n}\n\nfragment PriceDisplayInfoIrene on PriceDisplayInfoIrene {\n  badges {\n    name {\n      translation\n      __typename\n    }\n    tooltip {\n      translation\n      __typename\n    }\n    style\n    identifier\n    __typename\n  }\n  chargesInfo {\n    translation\n    __typename\n  }\n  displayPrice {\n    copy {\n      translation\n      __typename\n    }\n    amountPerStay {\n      amount\n      amountRounded\n      amountUnformatted\n      currency\n      __typename\n    }\n    amountPerStayHotelCurr {\n      amount\n      amountRounded\n      amountUnformatted\n      currency\n      __typename\n    }\n    __typename\n  }\n  averagePricePerNight {\n    amount\n    amountRounded\n    amountUnformatted\n    currency\n    __typename\n  }\n  priceBeforeDiscount {\n    copy {\n      translation\n      __typename\n    }\n    amountPerStay {\n      amount\n      amountRounded\n      amountUnformatted\n      currency\n      __typename\n    }\n    __typename\n  }\n  rewards {\n    rewardsList {\n      termsAndConditions\n      amountPerStay {\n        amount\n        amountRounded\n        amountUnformatted\n        currency\n        __typename\n      }\n      breakdown {\n        productType\n        amountPerStay {\n          amount\n          amountRounded\n          amountUnformatted\n          currency\n          __typename\n        }\n        __typename\n      }\n      __typename\n    }\n    rewardsAggregated {\n      amountPerStay {\n        amount\n        amountRounded\n        amountUnformatted\n        currency\n        __typename\n      }\n      copy {\n        translation\n        __typename\n      }\n      __typename\n    }\n    __typename\n  }\n  useRoundedAmount\n  discounts {\n    amount {\n      amount\n      amountRounded\n      amountUnformatted\n      currency\n      __typename\n    }\n    name {\n      translation\n      __typename\n    }\n    description {\n      translation\n      __typename\n    }\n    itemType\n    productId\n    __typename\n  }\n  excludedCharges {\n    excludeChargesAggregated {\n      copy {\n        translation\n        __typename\n      }\n      amountPerStay {\n        amount\n        amountRounded\n        amountUnformatted\n        currency\n        __typename\n      }\n      __typename\n    }\n    excludeChargesList {\n      chargeMode\n      chargeInclusion\n      chargeType\n      amountPerStay {\n        amount\n        amountRounded\n        amountUnformatted\n        currency\n        __typename\n      }\n      __typename\n    }\n    __typename\n  }\n  taxExceptions {\n    shortDescription {\n      translation\n      __typename\n    }\n    longDescription {\n      translation\n      __typename\n    }\n    __typename\n  }\n  displayConfig {\n    key\n    value\n    __typename\n  }\n  serverTranslations {\n    key\n    value\n    __typename\n  }\n  __typename\n}\n\nfragment BookerExperienceData on SearchResultProperty {\n  bookerExperienceContentUIComponentProps {\n    ... on BookerExperienceContentLoyaltyBadgeListProps {\n      badges {\n        amount\n        variant\n        key\n        title\n        hidePopover\n        popover\n        tncMessage\n        tncUrl\n        logoSrc\n        logoAlt\n        __typename\n      }\n      __typename\n    }\n    ... on BookerExperienceContentFinancialBadgeProps {\n      paymentMethod\n      backgroundColor\n      hideAccepted\n      __typename\n    }\n    __typename\n  }\n  __typename\n}\n\nfragment TopPhotos on SearchResultProperty {\n  topPhotos {\n    highResUrl {\n      relativeUrl\n      __typename\n    }\n    lowResUrl {\n      relativeUrl\n      __typename\n    }\n    highResJpegUrl {\n      relativeUrl\n      __typename\n    }\n    lowResJpegUrl {\n      relativeUrl\n      __typename\n    }\n    __typename\n  }\n  __typename\n}\n\nfragment SearchMetadata on SearchMeta {\n  availabilityInfo {\n    hasLowAvailability\n    unavailabilityPercent\n    totalAvailableNotAutoextended\n    totalAutoextendedAvailable\n    __typename\n  }\n  boundingBoxes {\n    swLat\n    swLon\n    neLat\n    neLon\n    type\n    __typename\n  }\n  childrenAges\n  dates {\n    checkin\n    checkout\n    lengthOfStayInDays\n    __typename\n  }\n  destId\n  destType\n  guessedLocation {\n    destId\n    destType\n    destName\n    __typename\n  }\n  maxLengthOfStayInDays\n  nbRooms\n  nbAdults\n  nbChildren\n  userHasSelectedFilters\n  customerValueStatus\n  isAffiliateBookingOwned\n  affiliatePartnerChannelId\n  affiliateVerticalType\n  geniusLevel\n  __typename\n}\n\nfragment SearchResultsBreadcrumb on SearchResultsBreadcrumb {\n  destId\n  destType\n  name\n  __typename\n}\n\nfragment SorterFields on SorterOption {\n  type: name\n  captionTranslationTag {\n    translation\n    __typename\n  }\n  tooltipTranslationTag {\n    translation\n    __typename\n  }\n  isSelected: selected\n  __typename\n}\n\nfragment TripTypesData on TripTypes {\n  beach {\n    isBeachUfi\n    isEnabledBeachUfi\n    __typename\n  }\n  ski {\n    isSkiExperience\n    isSkiScaleUfi\n    __typename\n  }\n  __typename\n}\n\nfragment ZeroResultsSection on ZeroResultsSection {\n  title {\n    text\n    __typename\n  }\n  primaryAction {\n    text {\n      text\n      __typename\n    }\n    action {\n      name\n      __typename\n    }\n    __typename\n  }\n  paragraphs {\n    text\n    __typename\n  }\n  type\n  __typename\n}\n\nfragment PreviousSearches on PreviousSearch {\n  childrenAges\n  __typename\n}\n\nfragment MerchRegionIrene on MerchComponentsResultIrene {\n  regions {\n    id\n    components {\n      ... on PromotionalBannerIrene {\n        promotionalBannerCampaignId\n        contentArea {\n          title {\n            ... on PromotionalBannerSimpleTitleIrene {\n              value\n              __typename\n            }\n            __typename\n          }\n          subTitle {\n            ... on PromotionalBannerSimpleSubTitleIrene {\n              value\n              __typename\n            }\n            __typename\n          }\n          caption {\n            ... on PromotionalBannerSimpleCaptionIrene {\n              value\n              __typename\n            }\n            ... on PromotionalBannerCountdownCaptionIrene {\n              campaignEnd\n              __typename\n            }\n            __typename\n          }\n          buttons {\n            variant\n            cta {\n              ariaLabel\n              text\n              targetLanding {\n                ... on OpenContextSheet {\n                  sheet {\n                    ... on WebContextSheet {\n                      title\n                      body {\n                        items {\n                          ... on ContextSheetTextItem {\n                            text\n                            __typename\n                          }\n                          ... on ContextSheetList {\n                            items {\n                              text\n                              __typename\n                            }\n                            __typename\n                          }\n                          __typename\n                        }\n                        __typename\n                      }\n                      buttons {\n                        variant\n                        cta {\n                          text\n                          ariaLabel\n                          targetLanding {\n                            ... on DirectLinkLanding {\n                              urlPath\n                              queryParams {\n                                name\n                                value\n                                __typename\n                              }\n                              __typename\n                            }\n                            ... on LoginLanding {\n                              stub\n                              __typename\n                            }\n                            ... on DeeplinkLanding {\n                              urlPath\n                              queryParams {\n                                name\n                                value\n                                __typename\n                              }\n                              __typename\n                            }\n                            ... on ResolvedLinkLanding {\n                              url\n                              __typename\n                            }\n                            __typename\n                          }\n                          __typename\n                        }\n                        __typename\n                      }\n                      __typename\n                    }\n                    __typename\n                  }\n                  __typename\n                }\n                ... on SearchResultsLandingIrene {\n                  destType\n                  destId\n                  checkin\n                  checkout\n                  nrAdults\n                  nrChildren\n                  childrenAges\n                  nrRooms\n                  filters {\n                    name\n                    value\n                    __typename\n                  }\n                  __typename\n                }\n                ... on DirectLinkLandingIrene {\n                  urlPath\n                  queryParams {\n                    name\n                    value\n                    __typename\n                  }\n                  __typename\n                }\n                ... on LoginLandingIrene {\n                  stub\n                  __typename\n                }\n                ... on DeeplinkLandingIrene {\n                  urlPath\n                  queryParams {\n                    name\n                    value\n                    __typename\n                  }\n                  __typename\n                }\n                ... on SorterLandingIrene {\n                  sorterName\n                  __typename\n                }\n                __typename\n              }\n              __typename\n            }\n            __typename\n          }\n          __typename\n        }\n        designVariant {\n          ... on DesktopPromotionalFullBleedImageIrene {\n            image: image {\n              id\n              url(width: 814, height: 138)\n              alt\n              overlayGradient\n              primaryColorHex\n              __typename\n            }\n            colorScheme\n            signature\n            __typename\n          }\n          ... on DesktopPromotionalImageLeftIrene {\n            imageOpt: image {\n              id\n              url(width: 248, height: 248)\n              alt\n              overlayGradient\n              primaryColorHex\n              __typename\n            }\n            colorScheme\n            signature\n            __typename\n          }\n          ... on DesktopPromotionalImageRightIrene {\n            imageOpt: image {\n              id\n              url(width: 248, height: 248)\n              alt\n              overlayGradient\n              primaryColorHex\n              __typename\n            }\n            colorScheme\n            signature\n            __typename\n          }\n          ... on MdotPromotionalFullBleedImageIrene {\n            image: image {\n              id\n              url(width: 358, height: 136)\n              alt\n              overlayGradient\n              primaryColorHex\n              __typename\n            }\n            colorScheme\n            signature\n            __typename\n          }\n          ... on MdotPromotionalImageLeftIrene {\n            imageOpt: image {\n              id\n              url(width: 128, height: 128)\n              alt\n              overlayGradient\n              primaryColorHex\n              __typename\n            }\n            colorScheme\n            signature\n            __typename\n          }\n          ... on MdotPromotionalImageRightIrene {\n            imageOpt: image {\n              id\n              url(width: 128, height: 128)\n              alt\n              overlayGradient\n              primaryColorHex\n              __typename\n            }\n            colorScheme\n            signature\n            __typename\n          }\n          ... on MdotPromotionalImageTopIrene {\n            imageOpt: image {\n              id\n              url(width: 128, height: 128)\n              alt\n              overlayGradient\n              primaryColorHex\n              __typename\n            }\n            colorScheme\n            signature\n            __typename\n          }\n          ... on MdotPromotionalIllustrationLeftIrene {\n            imageOpt: image {\n              id\n              url(width: 200, height: 200)\n              alt\n              overlayGradient\n              primaryColorHex\n              __typename\n            }\n            colorScheme\n            signature\n            __typename\n          }\n          ... on MdotPromotionalIllustrationRightIrene {\n            imageOpt: image {\n              id\n              url(width: 200, height: 200)\n              alt\n              overlayGradient\n              primaryColorHex\n              __typename\n            }\n            colorScheme\n            signature\n            __typename\n          }\n          __typename\n        }\n        __typename\n      }\n      ... on MerchCarouselIrene @include(if: $carouselLowCodeExp) {\n        carouselCampaignId\n        __typename\n      }\n      __typename\n    }\n    __typename\n  }\n  __typename\n}\n\nfragment VisualFiltersGroup on VisualFiltersGroup {\n  groupId: id\n  position\n  title {\n    text\n    __typename\n  }\n  visualFilters {\n    title {\n      text\n      __typename\n    }\n    description {\n      text\n      __typename\n    }\n    photoUrl\n    action {\n      name\n      context {\n        key\n        value\n        __typename\n      }\n      __typename\n    }\n    __typename\n  }\n  __typename\n}\n\nfragment PropertyUspBadges on SearchResultProperty {\n  propertyUspBadges {\n    name\n    translatedName\n    __typename\n  }\n  __typename\n}\n"
-    })
+async def fetch_hotels_async(checkin_date, checkout_date, location="Seattle, United States", dest_id=20144883, 
+                             adults=2, rooms=1, children=0, pushed=NO_PUSHDOWN, dest_type="city"):
+    """Fetch and project the hotels for a query from Booking.com over the shared pooled session
+
+    `pushed` are normalized filters (see pushdown.py) that Booking.com applies before sending results.
+    """
+    return [hotel async for hotel in iter_hotels_async(
+        checkin_date, checkout_date, location, dest_id, adults, rooms, children, pushed=pushed, dest_type=dest_type
+    )]
+
+async def iter_hotels_async(checkin_date, checkout_date, location="Seattle, United States", dest_id=20144883, 
+                            adults=2, rooms=1, children=0, pushed=NO_PUSHDOWN, page_size=None, dest_type="city"):
+    """Yield projected hotels as soon as they are parsed
+
+    Without `page_size` a single upstream request is made. With it, upstream pages of that
+    size are requested through `pagination.offset` until Booking.com's total is reached.
+    """
+    offset = 0
+    while True:
+        search = search_request(
+            checkin_date, checkout_date, location, dest_id, adults, rooms, children,
+            filters=filters_input(pushed), offset=offset, rows_per_page=page_size or 1000, dest_type=dest_type
+        )
+        meta = {}
+        count = 0
+        project_seconds = 0.0
+        async for hotel in iter_search_results(search, meta):
+            count += 1
+            started = time.perf_counter()
+            projected = project_hotel(hotel)
+            project_seconds += time.perf_counter() - started
+            yield projected
+        SEARCH_STAGE_LATENCY.observe(project_seconds, stage="project")
+        UPSTREAM_RESULTS.inc(count)
+        
+        if not page_size:
+            return
+        offset += count
+        total = (meta.get("pagination") or {}).get("nbResultsTotal") or 0
+        if count == 0 or offset >= total:
+            return
+
+async def iter_search_results(search, meta=None):
+    """POST a search request (search_query.search_request) upstream and yield the raw results as they are parsed
+
+    `meta`, if given, receives the response's `pagination` block.
+    """
+    if meta is None:
+        meta = {}
+    url, headers, payload = search
+    UPSTREAM_REQUEST_BYTES.inc(len(payload))
+    started = time.perf_counter()
+    if not STREAM_PARSE:
+        response = await upstream.post(url, headers=headers, data=payload)
+        # The whole body has been downloaded by now
+        SEARCH_STAGE_LATENCY.observe(time.perf_counter() - started, stage="upstream_wait")
+        UPSTREAM_RESPONSES.inc(status=str(response.status_code))
+        UPSTREAM_RESPONSE_BYTES.inc(len(response.content))
+        if response.status_code != 200:
+            raise upstream.UpstreamStatusError(response.status_code)
+        started = time.perf_counter()
+        data = response.json()
+        SEARCH_STAGE_LATENCY.observe(time.perf_counter() - started, stage="parse")
+        search = ((data.get("data") or {}).get("searchQueries") or {}).get("search")
+        check_search_response(data.get("errors"), isinstance(search, dict))
+        meta["pagination"] = search.get("pagination")
+        for hotel in search.get("results") or []:
+            yield hotel
+        return
+    
+    response = await upstream.stream(url, headers=headers, data=payload)
+    try:
+        # Until the status line and headers are in
+        SEARCH_STAGE_LATENCY.observe(time.perf_counter() - started, stage="upstream_wait")
+        UPSTREAM_RESPONSES.inc(status=str(response.status_code))
+        if response.status_code != 200:
+            raise upstream.UpstreamStatusError(response.status_code)
+        # Only data.searchQueries.search.results (and pagination, and errors ahead of them) is ever materialized
+        parser = ResultsStreamParser(extra_keys=("pagination",), root_keys=("errors",))
+        body_started = time.perf_counter()
+        body_bytes = 0
+        parse_seconds = 0.0
+        async for chunk in response.aiter_content():
+            body_bytes += len(chunk)
+            parse_started = time.perf_counter()
+            hotels = parser.feed(chunk)
+            parse_seconds += time.perf_counter() - parse_started
+            for hotel in hotels:
+                yield hotel
+            if parser.done:
+                break
+        for hotel in parser.close():
+            yield hotel
+        check_search_response(parser.extras.get("errors"), parser.found)
+        meta["pagination"] = parser.extras.get("pagination")
+        # Body download is interleaved with parsing (and with whatever the consumer does per hotel)
+        SEARCH_STAGE_LATENCY.observe(time.perf_counter() - body_started, stage="upstream_body")
+        SEARCH_STAGE_LATENCY.observe(parse_seconds, stage="parse")
+        UPSTREAM_RESPONSE_BYTES.inc(body_bytes)
+    finally:
+        await response.aclose()
+
+def upstream_key(checkin_date, checkout_date, dest_id, dest_type, adults, rooms, children):
+    """Normalized key for one upstream query, without filters
+
+    A region and a city can share a numeric dest_id, so the destination type is part of it.
+    """
+    return (checkin_date, checkout_date, int(dest_id), dest_type, int(adults), int(rooms), int(children))
+
+def _result_size(table):
+    """Approximate in-memory weight of a cached HotelTable, used for byte-bounded eviction
+
+    The hotels' encoded size stands in for their dicts, on top of the table's arrays and encodings.
+    """
+    return sum(len(fragment) for fragment in table.encoded) + table.nbytes
+
+async def _fetch_and_store(key, query):
+    """Fetch one upstream query and store the projected result set in the cache as a HotelTable"""
+    return _store(key, await fetch_hotels_async(**query))
+
+def _store(key, hotels):
+    table = HotelTable(hotels)
+    result_cache.set(key, table, _result_size(table), group=key[0])
+    _learn_currency(key[0], table)
+    if shared_cache is not None or snapshot_store is not None:
+        store_writer.submit(_persist, key, table)
+    return table
+
+def _learn_currency(base_key, table):
+    """Remember the currency a result set for `base_key` came back in, for pushing max_price down"""
+    if table.currency:
+        destination_currency[base_key[2:4]] = table.currency
+
+def _persist(key, table):
+    """Write a fetched result set to the shared cache and the price history (on store_writer's thread)"""
+    if shared_cache is not None:
+        # Encoded hotels never contain a raw newline, so one can separate them
+        shared_cache.set(key, b"\n".join(table.encoded), group=key[0])
+    if snapshot_store is not None:
+        snapshot_store.record(key[0], table)
+
+async def _stream_and_store(key, query, live):
+    """Fetch one upstream query, publishing each hotel to `live` as it is parsed, and store the result set"""
+    try:
+        async for hotel in iter_hotels_async(**query):
+            live.append(hotel)
+        table = _store(key, live.items)
+    except BaseException as e:
+        live.finish(e)
+        raise
+    finally:
+        if live_fetches.get(key) is live:
+            del live_fetches[key]
+    live.finish()
+    return table
+
+async def _refresh_cached(key, query):
+    """Background stale-while-revalidate refresh of one cached query"""
+    try:
+        await search_flight.do(key, lambda: _fetch_and_store(key, query))
+    except Exception as e:
+        logger.warning(f"Background refresh failed for {key}: {e}")
+    finally:
+        result_cache.end_refresh(key)
+
+def _lookup_cached(checkin_date, checkout_date, location, dest_id, adults, rooms, children,
+                   max_price, min_stars, min_score, dest_type="city"):
+    """Find a cached result set that can answer the filters; returns (key, HotelTable or None, query)
+
+    A stale hit is returned as-is and a background refresh is started for it. While the
+    upstream circuit breaker is open, expired entries are served too and nothing is refreshed.
+    Result sets other workers have fetched are found in the shared cache, when there is one.
+    """
+    base_key = upstream_key(checkin_date, checkout_date, dest_id, dest_type, adults, rooms, children)
+    pushed = pushdown_filters(
+        max_price=max_price, min_stars=min_stars, min_score=min_score,
+        currency=destination_currency.get(base_key[2:4])
+    )
     
-    headers = {
-        'accept': '*/*',
-        'accept-language': 'en-US,en;q=0.8',
-        'apollographql-client-name': 'b-search-web-searchresults_rust',
-        'apollographql-client-version': 'ABJNVZXB',
-        'content-type': 'application/json',
-        'origin': 'https://www.booking.com',
-        'priority': 'u=1, i',
-        'referer': 'https://www.booking.com/searchresults.html?ss=Seattle%2C%20United%20States&efdco=1&label=gen173nr-1FCAEoggI46AdIM1gEaLQCiAEBmAExuAEHyAEM2AEB6AEB-AECiAIBqAIDuAK-iPnBBsACAdICJGZmMzBhOGRjLTQ1M2ItNGY0Ny04YmZjLWQyMDFjYTNiZWM1MdgCBeACAQ&sid=13b7b29af206a79542e44dfdce841b83&aid=304142&lang=en-us&sb=1&src_elem=sb&src=index&dest_id=20144883&dest_type=city&checkin=2025-07-01&checkout=2025-07-19&group_adults=2&no_rooms=1&group_children=0',
-        'sec-ch-ua': '"Brave";v="137", "Chromium";v="137", "Not/A)Brand";v="24"',
-        'sec-ch-ua-mobile': '?1',
-        'sec-ch-ua-platform': '"Android"',
-        'sec-fetch-dest': 'empty',
-        'sec-fetch-mode': 'cors',
-        'sec-fetch-site': 'same-origin',
-        'sec-gpc': '1',
-        'user-agent': 'Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Mobile Safari/537.36',
-        'x-booking-context-action-name': 'searchresults_irene',
-        'x-booking-context-aid': '304142',
-        'x-booking-dml-cluster': 'rust',
-        'x-booking-pageview-id': '86ed05d965d10150',
-        'x-booking-site-type-id': '2',
-        'x-booking-topic': 'capla_browser_b-search-web-searchresults',
+    circuit_open = upstream.search_limiter.is_open()
+    key, hotels, state = result_cache.lookup_any(covering_keys(result_cache, base_key, pushed), expired=circuit_open)
+    if key is None and shared_cache is not None:
+        key, body, state, age = shared_cache.lookup_any(
+            covering_keys(shared_cache, base_key, pushed), expired=circuit_open
+        )
+        if key is not None:
+            hotels = HotelTable.from_encoded(body.split(b"\n") if body else [])
+            result_cache.set(key, hotels, _result_size(hotels), group=base_key, age=age)
+            _learn_currency(base_key, hotels)
+    if key is None:
+        key = (base_key, pushed)
+    query = {
+        "checkin_date": checkin_date,
+        "checkout_date": checkout_date,
+        "location": location,
+        "dest_id": dest_id,
+        "dest_type": dest_type,
+        "adults": adults,
+        "rooms": rooms,
+        "children": children,
+        "pushed": key[1]
     }
     
-    response = requests.request("POST", url, headers=headers, data=payload, impersonate="chrome")
+    if state == STALE and not circuit_open and result_cache.begin_refresh(key):
+        # Serve the stale copy now and refresh it on the upstream loop
+        asyncio.run_coroutine_threadsafe(_refresh_cached(key, query), upstream.get_loop())
+    return key, hotels, query
+
+def covering_keys(cache, base_key, pushed):
+    """Cache keys that can answer pushed-down filters for an upstream query: the exact key first, then looser ones"""
+    return [(base_key, pushed)] + [
+        cached_key for cached_key in cache.group_keys(base_key)
+        if cached_key[1] != pushed and covers(cached_key[1], pushed)
+    ]
+
+def lookup_params(params):
+    """_lookup_cached for parsed /search parameters"""
+    return _lookup_cached(
+        params['checkin_date'], params['checkout_date'], params['location'], params['dest_id'],
+        params['adults'], params['rooms'], params['children'],
+        params['max_price'], params['min_stars'], params['min_score'], params['dest_type']
+    )
+
+async def get_hotels_async(checkin_date, checkout_date, location="Seattle, United States", dest_id=20144883, 
+                           adults=2, rooms=1, children=0, max_price=None, min_stars=None, min_score=None,
+                           dest_type="city"):
+    """Return a HotelTable holding a superset of the hotels matching the filters, from the result cache when possible
+
+    Cache entries are keyed on (upstream query, pushed-down filters). Any cached entry whose
+    filters are no stricter than the requested ones can answer the request locally.
+    """
+    key, table, query = _lookup_cached(
+        checkin_date, checkout_date, location, dest_id, adults, rooms, children, max_price, min_stars, min_score,
+        dest_type
+    )
+    if table is not None:
+        return table
     
-    if response.status_code != 200:
-        raise Exception(f"API request failed with status {response.status_code}")
+    # Callers that miss on the same key at the same time share one upstream request
+    return await search_flight.do(key, lambda: _fetch_and_store(key, query))
+
+async def query_hotels_async(checkin_date, checkout_date, location="Seattle, United States", dest_id=20144883, 
+                             max_price=None, min_stars=None, min_reviews=None, adults=2, rooms=1, children=0,
+                             min_price=None, min_score=None, sort=(), limit=None, offset=0, dest_type="city"):
+    """Search for hotels and return (page of matching hotels, total matches)
+
+    Supported filters are pushed upstream, and all of them are re-checked locally on the
+    result set's columns, followed by the sort and the [offset, offset + limit) slice.
+    """
+    table = await get_hotels_async(
+        checkin_date=checkin_date,
+        checkout_date=checkout_date,
+        location=location,
+        dest_id=dest_id,
+        dest_type=dest_type,
+        adults=adults,
+        rooms=rooms,
+        children=children,
+        max_price=max_price,
+        min_stars=min_stars,
+        min_score=min_score
+    )
+    return query_table(
+        table, max_price=max_price, min_price=min_price, min_stars=min_stars, min_reviews=min_reviews,
+        min_score=min_score, sort=sort, limit=limit, offset=offset
+    )
+
+def query_table(table, encoded=False, **query):
+    """Filter, sort and slice a HotelTable; returns (page, total matches)
+
+    Local filtering is the correctness backstop for anything the upstream filters let through.
+    With `encoded`, the page holds each hotel's stored JSON encoding instead of the hotel.
+    """
+    started = time.perf_counter()
+    hotels, total = (table.query_encoded if encoded else table.query)(**query)
+    SEARCH_STAGE_LATENCY.observe(time.perf_counter() - started, stage="filter")
+    SEARCH_RESULTS.observe(len(hotels))
+    return hotels, total
+
+async def search_hotels_async(checkin_date, checkout_date, location="Seattle, United States", dest_id=20144883, 
+                              max_price=None, min_stars=None, min_reviews=None, adults=2, rooms=1, children=0,
+                              **options):
+    """Search for hotels, pushing supported filters upstream and re-checking all of them locally
+
+    `options` are the destination type, extra filters, sort and paging of query_hotels_async.
+    """
+    hotels, _ = await query_hotels_async(
+        checkin_date, checkout_date, location, dest_id, max_price, min_stars, min_reviews,
+        adults, rooms, children, **options
+    )
+    return hotels
+
+async def stream_hotels_async(checkin_date, checkout_date, location="Seattle, United States", dest_id=20144883, 
+                              max_price=None, min_stars=None, min_reviews=None, adults=2, rooms=1, children=0,
+                              min_price=None, min_score=None, sort=(), limit=None, offset=0, page_size=None,
+                              dest_type="city"):
+    """Yield filtered hotels as soon as each one is available
+
+    Single-page searches are answered from the result cache when possible. A live fetch is
+    shared through search_flight: concurrent streamed searches for the query follow its hotels
+    as they arrive, and it is stored in the cache once it completes. Paged searches
+    (`page_size`) always stream live.
+    Sorted or sliced searches need the whole result set first and stream once it is in.
+    """
+    filters = {
+        "max_price": max_price, "min_stars": min_stars, "min_reviews": min_reviews,
+        "min_price": min_price, "min_score": min_score
+    }
+    if sort or limit is not None or offset:
+        hotels, _ = await query_hotels_async(
+            checkin_date, checkout_date, location, dest_id, adults=adults, rooms=rooms, children=children,
+            sort=sort, limit=limit, offset=offset, dest_type=dest_type, **filters
+        )
+        for hotel in hotels:
+            yield hotel
+        return
     
-    data = response.json()
-    search_results = data.get("data", {}).get("searchQueries", {}).get("search", {}).get("results", [])
+    if page_size:
+        async for hotel in iter_hotels_async(
+            checkin_date, checkout_date, location, dest_id, adults, rooms, children,
+            pushed=pushdown_filters(
+                max_price=max_price, min_stars=min_stars, min_score=min_score,
+                currency=destination_currency.get((int(dest_id), dest_type))
+            ),
+            page_size=page_size, dest_type=dest_type
+        ):
+            if hotel_matches(hotel, **filters):
+                yield hotel
+        return
     
-    # Filter results based on criteria
-    filtered_results = []
-    for hotel in search_results:
-        # Check price filter
-        if max_price:
-            price_info = hotel.get("priceDisplayInfoIrene") or {}
-            avg_price_per_night = price_info.get("averagePricePerNight") or {}
-            price_unformatted = avg_price_per_night.get("amountUnformatted", 0)
-            if price_unformatted > max_price:
-                continue
-        
-        # Check star rating filter
-        if min_stars:
-            basic_data = hotel.get("basicPropertyData") or {}
-            star_rating_data = basic_data.get("starRating") or {}
-            star_rating = star_rating_data.get("value", 0)
-            if star_rating < min_stars:
-                continue
-        
-        # Check review count filter
-        if min_reviews:
-            basic_data = hotel.get("basicPropertyData") or {}
-            review_score = basic_data.get("reviewScore") or {}
-            review_count = review_score.get("reviewCount", 0)
-            if review_count < min_reviews:
-                continue
-        
-        # Extract and format hotel data (matching bookingdotcom.py processing)
-        display_name_data = hotel.get("displayName") or {}
-        hotel_name = display_name_data.get("text", "No name available")
+    key, table, query = _lookup_cached(
+        checkin_date, checkout_date, location, dest_id, adults, rooms, children, max_price, min_stars, min_score,
+        dest_type
+    )
+    if table is None:
+        # A miss starts a streamed fetch in search_flight, or joins the fetch already in flight for the query
+        live = Broadcast()
         
-        basic_data = hotel.get("basicPropertyData") or {}
-        location_data = basic_data.get("location") or {}
-        address = location_data.get("address", "")
-        city = location_data.get("city", "")
+        def start():
+            live_fetches[key] = live
+            return _stream_and_store(key, query, live)
         
-        price_info = hotel.get("priceDisplayInfoIrene") or {}
-        display_price = price_info.get("displayPrice") or {}
-        amount_per_stay = display_price.get("amountPerStay") or {}
-        avg_price_per_night = price_info.get("averagePricePerNight") or {}
-        
-        review_score = basic_data.get("reviewScore") or {}
-        star_rating_data = basic_data.get("starRating") or {}
-        
-        meal_plan = hotel.get("mealPlanIncluded") or {}
-        
-        photos = basic_data.get("photos") or {}
-        main_photo = photos.get("main") or {}
-        
-        # Extract and format image URLs - try different formats in order of preference
-        image_url = None
-        for url_type in ["highResJpegUrl", "highResUrl", "lowResJpegUrl", "lowResUrl"]:
-            url_data = main_photo.get(url_type) or {}
-            relative_url = url_data.get("relativeUrl")
-            if relative_url:
-                image_url = format_image_url(relative_url)
-                break
-        
-        hotel_data = {
-            "id": basic_data.get("id"),
-            "name": hotel_name,
-            "location": {
-                "address": address,
-                "city": city,
-                "full_address": f"{address}, {city}" if address and city else city or address
-            },
-            "star_rating": star_rating_data.get("value", 0),
-            "guest_rating": {
-                "score": review_score.get("score", 0),
-                "review_count": review_score.get("reviewCount", 0),
-                "text": review_score.get("totalScoreTextTag", {}).get("translation", "")
-            },
-            "pricing": {
-                "total_price": amount_per_stay.get("amount"),
-                "currency": amount_per_stay.get("currency"),
-                "price_per_night": avg_price_per_night.get("amount"),
-                "price_per_night_unformatted": avg_price_per_night.get("amountUnformatted")
-            },
-            "meal_plan": meal_plan.get("text", "").strip(),
-            "image_url": image_url
-        }
-        
-        filtered_results.append(hotel_data)
+        future = search_flight.start(key, start)
+        joined = live_fetches.get(key)
+        if joined is None:
+            # Not a streamed fetch, or one that has just finished: wait for its result set
+            table = await asyncio.shield(asyncio.wrap_future(future))
+        else:
+            async for hotel in joined.follow():
+                if hotel_matches(hotel, **filters):
+                    yield hotel
+            return
+    for hotel in table.query(**filters)[0]:
+        yield hotel
+
+def search_hotels(checkin_date, checkout_date, location="Seattle, United States", dest_id=20144883, 
+                 max_price=None, min_stars=None, min_reviews=None, adults=2, rooms=1, children=0, **options):
+    """Search for hotels using Booking.com API (blocking wrapper for sync callers)"""
+    return upstream.run(search_hotels_async(
+        checkin_date=checkin_date,
+        checkout_date=checkout_date,
+        location=location,
+        dest_id=dest_id,
+        max_price=max_price,
+        min_stars=min_stars,
+        min_reviews=min_reviews,
+        adults=adults,
+        rooms=rooms,
+        children=children,
+        **options
+    ))
+
+def filter_hotels(hotels, max_price=None, min_stars=None, min_reviews=None, min_price=None, min_score=None):
+    """Filter projected hotels by price per night, star rating, review count and review score"""
+    return [hotel for hotel in hotels if hotel_matches(hotel, max_price, min_stars, min_reviews, min_price, min_score)]
+
+def hotel_matches(hotel, max_price=None, min_stars=None, min_reviews=None, min_price=None, min_score=None):
+    """Check one projected hotel against the filters (HotelTable.mask is the vectorized equivalent)"""
+    # Check price filters
+    price = hotel["pricing"]["price_per_night_unformatted"]
+    if max_price and (price or 0) > max_price:
+        return False
+    if min_price and (price is None or price < min_price):
+        return False
+    
+    # Check star rating filter
+    if min_stars and (hotel["star_rating"] or 0) < min_stars:
+        return False
+    
+    # Check review count filter
+    if min_reviews and (hotel["guest_rating"]["review_count"] or 0) < min_reviews:
+        return False
     
-    return filtered_results
+    # Check review score filter
+    if min_score and (hotel["guest_rating"]["score"] or 0) < min_score:
+        return False
+    
+    return True
+
+# Extract and format one raw search result. Compiled once from the field map shared with bookingdotcom.py
+project_hotel = compile_extractor(HOTEL_FIELDS, transforms={"image_url": format_image_url}, name="project_hotel")
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    HTTP_REQUESTS.inc(endpoint=endpoint, status=str(response.status_code))
+    HTTP_LATENCY.observe(time.perf_counter() - g.request_started, endpoint=endpoint)
+    return response
 
 @app.route('/', methods=['GET'])
 def home():
@@ -249,7 +598,15 @@ def home():
         "endpoints": {
             "/": "This documentation",
             "/search": "Search for hotels",
-            "/health": "Health check"
+            "/search/batch": "Run many searches concurrently",
+            "/jobs/<id>": "Status and result of a search submitted with async=1",
+            "/calendar": "Nightly price summary across a window of check-in dates",
+            "/img/<path>": "Cached, resizable proxy for hotel photos",
+            "/history": "Price history of a hotel or destination from stored snapshots",
+            "/search/changes": "Hotels added, removed or repriced since an earlier version of a search",
+            "/destinations": "Resolve a free-text location to a Booking.com dest_id",
+            "/health": "Health check",
+            "/metrics": "Prometheus metrics"
         },
         "documentation": "See /docs for detailed API documentation"
     })
@@ -257,10 +614,58 @@ def home():
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
+    return jsonify({
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "cache": result_cache.stats(),
+        "shared_cache": shared_cache.stats() if shared_cache is not None else None,
+        "calendar_cache": calendar_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "image_cache": image_cache.stats(),
+        "snapshots": snapshot_store.stats() if snapshot_store is not None else None,
+        "destinations": destination_index.stats(),
+        "change_feed": change_feed.stats(),
+        "jobs": search_jobs.stats(),
+        "singleflight": search_flight.stats(),
+        "rate_limit": upstream.rate_limiter.stats(),
+        "upstream": upstream.limiter_stats(),
+        "sessions": upstream.session_stats(),
+        "json_encoder": JSON_ENCODER
+    })
+
+@app.route('/img/<path:path>', methods=['GET'])
+async def image_endpoint(path):
+    """Hotel photo from Booking.com's CDN through the on-disk cache, resized to the thumbnail width `w` if given"""
+    if not is_allowed(path):
+        return jsonify({
+            "error": "Invalid image path",
+            "message": f"Only /img/{ALLOWED_PREFIX}... photo paths are proxied"
+        }), 400
+    try:
+        width = thumbnail_width(request.args.get('w'))
+    except ValueError as e:
+        return jsonify({"error": "Invalid width", "message": str(e)}), 400
+    
+    # Everything but w is part of the CDN URL (its signature parameters)
+    query = urlencode([(name, value) for name, value in request.args.items(multi=True) if name != 'w'])
+    try:
+        data, content_type = await get_image(path, query, width)
+    except ImageError as e:
+        return jsonify({"error": "Image unavailable", "message": e.message}), e.status
+    
+    response = Response(data, mimetype=content_type)
+    response.cache_control.public = True
+    response.cache_control.max_age = IMAGE_MAX_AGE
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text-format metrics for this process"""
+    return Response(REGISTRY.render(), mimetype=None, content_type=METRICS_CONTENT_TYPE)
 
 @app.route('/search', methods=['GET', 'POST', 'OPTIONS'])
-def search_hotels_endpoint():
+async def search_hotels_endpoint():
     """Search for hotels endpoint"""
     # Handle preflight OPTIONS request
     if request.method == 'OPTIONS':
@@ -277,102 +682,791 @@ def search_hotels_endpoint():
         else:
             data = request.args.to_dict()
         
-        # Required parameters
-        checkin_date = data.get('checkin_date')
-        checkout_date = data.get('checkout_date')
-        
-        if not checkin_date or not checkout_date:
-            return jsonify({
-                "error": "Missing required parameters",
-                "message": "checkin_date and checkout_date are required"
-            }), 400
-        
-        # Validate dates
         try:
-            checkin_parsed = validate_date(checkin_date)
-            checkout_parsed = validate_date(checkout_date)
-            
-            if checkout_parsed <= checkin_parsed:
-                return jsonify({
-                    "error": "Invalid dates",
-                    "message": "Check-out date must be after check-in date"
-                }), 400
-            
-            if checkin_parsed < datetime.now():
-                return jsonify({
-                    "error": "Invalid dates",
-                    "message": "Check-in date cannot be in the past"
-                }), 400
-                
-        except ValueError as e:
-            return jsonify({
-                "error": "Invalid date format",
-                "message": str(e)
-            }), 400
+            params = parse_search_params(await with_destination(data))
+        except SearchParamError as e:
+            return jsonify({"error": e.error, "message": e.message}), 400
         
-        # Optional parameters
-        location = data.get('location', 'Seattle, United States')
-        dest_id = int(data.get('dest_id', 20144883))
-        max_price = data.get('max_price')
-        min_stars = data.get('min_stars')
-        min_reviews = data.get('min_reviews')
-        adults = int(data.get('adults', 2))
-        rooms = int(data.get('rooms', 1))
-        children = int(data.get('children', 0))
+        if request.method == 'POST' and wants_async(data):
+            return submit_search_job(params, data)
         
-        # Convert string parameters to appropriate types
-        if max_price:
-            max_price = float(max_price)
-        if min_stars:
-            min_stars = int(min_stars)
-        if min_reviews:
-            min_reviews = int(min_reviews)
+        if wants_ndjson(data):
+            return ndjson_search_response(params)
         
         # Search for hotels
-        hotels = search_hotels(
-            checkin_date=checkin_date,
-            checkout_date=checkout_date,
-            location=location,
-            dest_id=dest_id,
-            max_price=max_price,
-            min_stars=min_stars,
-            min_reviews=min_reviews,
-            adults=adults,
-            rooms=rooms,
-            children=children
-        )
+        table = await get_params_table_async(params)
+        return search_response(table, params)
         
-        response_data = {
-            "success": True,
-            "search_params": {
-                "checkin_date": checkin_date,
-                "checkout_date": checkout_date,
-                "location": location,
-                "adults": adults,
-                "rooms": rooms,
-                "children": children,
-                "filters": {
-                    "max_price": max_price,
-                    "min_stars": min_stars,
-                    "min_reviews": min_reviews
-                }
-            },
-            "results_count": len(hotels),
-            "hotels": hotels
-        }
-        
-        # Log the full response for frontend debugging
-        logger.info("=== FULL RESPONSE FOR FRONTEND DEBUGGING ===")
-        logger.info(json.dumps(response_data, indent=2, default=str))
-        logger.info("=== END RESPONSE ===")
+    except CircuitOpenError as e:
+        return upstream_unavailable(e)
+    except upstream.UpstreamStatusError as e:
+        return jsonify({
+            "error": "Upstream error",
+            "message": str(e)
+        }), 502
+    except Exception as e:
+        return jsonify({
+            "error": "Search failed",
+            "message": str(e)
+        }), 500
+
+@app.route('/search/changes', methods=['GET', 'POST'])
+async def search_changes_endpoint():
+    """Hotels added, removed or repriced since version `since` of a search, instead of its full hotel list"""
+    try:
+        data = (request.get_json() or {}) if request.method == 'POST' else request.args.to_dict()
+        try:
+            params = parse_search_params(await with_destination(data))
+        except SearchParamError as e:
+            return jsonify({"error": e.error, "message": e.message}), 400
         
-        return jsonify(response_data)
+        table = await get_params_table_async(params)
+        return changes_response(table, params, data.get('since') or None)
         
+    except CircuitOpenError as e:
+        return upstream_unavailable(e)
+    except upstream.UpstreamStatusError as e:
+        return jsonify({
+            "error": "Upstream error",
+            "message": str(e)
+        }), 502
     except Exception as e:
         return jsonify({
             "error": "Search failed",
             "message": str(e)
         }), 500
 
+def changes_response(table, params, since=None):
+    """/search/changes JSON response: what the hotels matching params' filters did since version `since`
+
+    Sort and paging are ignored. Without `since`, or when this process no longer holds that
+    version, every matching hotel is sent as added and `resync` is true.
+    """
+    rows, total = table.select(**{name: params[name] for name in FILTER_PARAMS})
+    snapshot = Snapshot(table, rows)
+    key = (
+        upstream_key(params['checkin_date'], params['checkout_date'], params['dest_id'], params['dest_type'],
+                     params['adults'], params['rooms'], params['children']),
+        tuple(params[name] for name in FILTER_PARAMS)
+    )
+    base = change_feed.advance(key, snapshot, since)
+    if base is None:
+        added_rows, removed, changed = rows, [], []
+    else:
+        added, removed, changed = diff(base, snapshot)
+        added = set(added)
+        added_rows = [row for row in rows if table.ids[row] in added]
+    
+    response_head = dumps({
+        "success": True,
+        "search_params": search_params_summary(params),
+        "version": snapshot.version,
+        "since": since,
+        "resync": base is None,
+        "total_results": total,
+        "added_count": len(added_rows),
+        "removed": removed,
+        "changed": changed
+    })
+    # Added hotels go out whole, from the JSON the result set stored for each
+    body = splice(response_head, "added", [table.encoded[row] for row in added_rows])
+    return Response(body, mimetype='application/json')
+
+def upstream_unavailable(e):
+    """503 for a search that was not sent because the upstream circuit breaker is open"""
+    response = jsonify({
+        "error": "Upstream unavailable",
+        "message": str(e)
+    })
+    response.headers['Retry-After'] = str(max(int(e.retry_after), 1))
+    return response, 503
+
+async def get_params_table_async(params):
+    """HotelTable answering parsed /search parameters, from the result cache when possible"""
+    return await get_hotels_async(
+        checkin_date=params['checkin_date'],
+        checkout_date=params['checkout_date'],
+        location=params['location'],
+        dest_id=params['dest_id'],
+        dest_type=params['dest_type'],
+        adults=params['adults'],
+        rooms=params['rooms'],
+        children=params['children'],
+        max_price=params['max_price'],
+        min_stars=params['min_stars'],
+        min_score=params['min_score']
+    )
+
+def search_response(table, params):
+    """/search JSON response for params answered from a HotelTable
+
+    The ETag is derived from the result set's contents and the request, so a poll whose
+    results have not changed gets a 304 without a body. The body is compressed when the
+    client accepts it, and compressed bodies are cached per ETag and coding.
+    """
+    summary = search_params_summary(params)
+    result_set_id = encode_result_set_id(params)
+    etag = hashlib.blake2b(table.digest + dumps([summary, result_set_id]), digest_size=16).hexdigest()
+    encoding = negotiate(request.accept_encodings)
+    
+    # The client's copy is current whichever coding it was sent with
+    for tag in (etag, f"{etag}-{encoding}") if encoding else (etag,):
+        if request.if_none_match.contains_weak(tag):
+            return with_cache_headers(Response(status=304), tag)
+    
+    cached = response_cache.lookup((etag, encoding))[0] if encoding else None
+    if cached is not None:
+        body, results_count = cached
+    else:
+        body, results_count = search_body(table, params)
+        if encoding and len(body) >= COMPRESS_MIN_BYTES:
+            started = time.perf_counter()
+            body = compress(body, encoding)
+            SEARCH_STAGE_LATENCY.observe(time.perf_counter() - started, stage="compress")
+            response_cache.set((etag, encoding), (body, results_count), len(body) + 100)
+        else:
+            encoding = None
+    
+    if random.random() < SEARCH_LOG_SAMPLE_RATE:
+        log_search(params, results_count, len(body))
+    response = Response(body, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+        etag = f"{etag}-{encoding}"
+    return with_cache_headers(response, etag)
+
+def search_body(table, params):
+    """Encoded /search response body for params answered from a HotelTable, and its results count"""
+    # Assemble the body from the JSON the result set stored for each hotel
+    hotels, total = query_table(table, encoded=True, **{name: params[name] for name in QUERY_PARAMS})
+    started = time.perf_counter()
+    response_head = dumps({
+        "success": True,
+        "search_params": search_params_summary(params),
+        "result_set_id": encode_result_set_id(params),
+        "results_count": len(hotels),
+        "total_results": total
+    })
+    body = splice(response_head, "hotels", hotels)
+    SEARCH_STAGE_LATENCY.observe(time.perf_counter() - started, stage="serialize")
+    # The full response is only dumped when debug logging is on
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(body.decode())
+    return body, len(hotels)
+
+def with_cache_headers(response, etag):
+    """Set the ETag of a /search response and mark it as varying with Accept-Encoding"""
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    return response
+
+def log_search(params, results_count, response_bytes):
+    """Log one compact JSON line describing a search"""
+    logger.info(json.dumps({
+        "event": "search",
+        "checkin_date": params["checkin_date"],
+        "checkout_date": params["checkout_date"],
+        "dest_id": params["dest_id"],
+        "adults": params["adults"],
+        "rooms": params["rooms"],
+        "children": params["children"],
+        "filters": search_params_summary(params)["filters"],
+        "results_count": results_count,
+        "response_bytes": response_bytes,
+        "duration_ms": round((time.perf_counter() - g.request_started) * 1000, 1)
+    }))
+
+def parse_search_params(data):
+    """Validate raw request parameters and convert them into search_hotels keyword arguments"""
+    # A result_set_id stands in for the upstream query parameters of an earlier search
+    if data.get('result_set_id'):
+        try:
+            data = {**data, **decode_result_set_id(data['result_set_id'])}
+        except ValueError as e:
+            raise SearchParamError("Invalid result_set_id", str(e))
+    
+    # Required parameters
+    checkin_date = data.get('checkin_date')
+    checkout_date = data.get('checkout_date')
+    
+    if not checkin_date or not checkout_date:
+        raise SearchParamError("Missing required parameters", "checkin_date and checkout_date are required")
+    
+    # Validate dates
+    try:
+        checkin_parsed = validate_date(checkin_date)
+        checkout_parsed = validate_date(checkout_date)
+    except ValueError as e:
+        raise SearchParamError("Invalid date format", str(e))
+    
+    if checkout_parsed <= checkin_parsed:
+        raise SearchParamError("Invalid dates", "Check-out date must be after check-in date")
+    
+    if checkin_parsed < datetime.now():
+        raise SearchParamError("Invalid dates", "Check-in date cannot be in the past")
+    
+    # Optional parameters
+    max_price = data.get('max_price')
+    min_price = data.get('min_price')
+    min_stars = data.get('min_stars')
+    min_reviews = data.get('min_reviews')
+    min_score = data.get('min_score')
+    limit = data.get('limit')
+    
+    try:
+        sort = parse_sort(data.get('sort'))
+    except ValueError as e:
+        raise SearchParamError("Invalid sort", str(e))
+    
+    try:
+        paging = {
+            "limit": int(limit) if limit else None,
+            "offset": int(data.get('offset') or 0),
+            "page_size": int(data['page_size']) if data.get('page_size') else None
+        }
+    except (TypeError, ValueError):
+        raise SearchParamError("Invalid parameters", "limit, offset and page_size must be integers")
+    if (paging["limit"] is not None and paging["limit"] < 1) or paging["offset"] < 0:
+        raise SearchParamError("Invalid parameters", "limit must be positive and offset cannot be negative")
+    if paging["page_size"] is not None and not 1 <= paging["page_size"] <= MAX_PAGE_SIZE:
+        raise SearchParamError("Invalid parameters", f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+    
+    dest_id, dest_type = resolve_destination(data)
+    
+    return {
+        "checkin_date": checkin_date,
+        "checkout_date": checkout_date,
+        "location": data.get('location') or 'Seattle, United States',
+        "dest_id": dest_id,
+        "dest_type": dest_type,
+        # Convert string parameters to appropriate types
+        "max_price": float(max_price) if max_price else None,
+        "min_price": float(min_price) if min_price else None,
+        "min_stars": int(min_stars) if min_stars else None,
+        "min_reviews": int(min_reviews) if min_reviews else None,
+        "min_score": float(min_score) if min_score else None,
+        "adults": int(data.get('adults', 2)),
+        "rooms": int(data.get('rooms', 1)),
+        "children": int(data.get('children', 0)),
+        "sort": sort,
+        **paging
+    }
+
+def resolve_destination(data):
+    """(dest_id, dest_type) of request parameters: dest_id as given, else `location` as the destination index knows it
+
+    Never calls Booking.com: views resolve unknown locations beforehand with with_destination().
+    """
+    if data.get('dest_id') not in (None, ''):
+        dest_type = str(data.get('dest_type') or 'city').lower()
+        try:
+            dest_id = int(data['dest_id'])
+        except (TypeError, ValueError):
+            raise SearchParamError("Invalid parameters", "dest_id must be an integer")
+        if not dest_type.isalpha():
+            raise SearchParamError("Invalid parameters", "dest_type must be a Booking.com destination type, e.g. city")
+        return dest_id, dest_type
+    
+    location = data.get('location') or 'Seattle, United States'
+    destination = destination_index.lookup(location)
+    if destination is None:
+        raise SearchParamError("Unknown location", f"{location!r} has not been resolved to a Booking.com destination")
+    return destination["dest_id"], destination["dest_type"]
+
+async def with_destination(data):
+    """Request parameters with `location` resolved to a dest_id, asking Booking.com on a miss, for parse_search_params"""
+    if data.get('dest_id') not in (None, '') or data.get('result_set_id'):
+        return data
+    try:
+        destination = await destination_index.resolve(data.get('location') or 'Seattle, United States')
+    except UnknownLocation as e:
+        raise SearchParamError("Unknown location", str(e))
+    return {**data, "dest_id": destination["dest_id"], "dest_type": destination["dest_type"]}
+
+def search_params_summary(params):
+    """The `search_params` block echoed back in search responses"""
+    return {
+        "checkin_date": params["checkin_date"],
+        "checkout_date": params["checkout_date"],
+        "location": params["location"],
+        "dest_id": params["dest_id"],
+        "dest_type": params["dest_type"],
+        "adults": params["adults"],
+        "rooms": params["rooms"],
+        "children": params["children"],
+        "filters": {
+            "max_price": params["max_price"],
+            "min_price": params["min_price"],
+            "min_stars": params["min_stars"],
+            "min_reviews": params["min_reviews"],
+            "min_score": params["min_score"]
+        },
+        "sort": format_sort(params["sort"]),
+        "limit": params["limit"],
+        "offset": params["offset"]
+    }
+
+def wants_async(data):
+    """True if the client asked for the search to run as a background job"""
+    value = request.args.get('async', data.get('async', ''))
+    return str(value).lower() in ('1', 'true')
+
+def submit_search_job(params, data):
+    """202 with the id of a background job running the search"""
+    try:
+        # With the resolved destination, so other workers can redo the search without resolving it again
+        job = search_jobs.submit(params, request={
+            **{name: value for name, value in data.items() if name != 'async'},
+            "dest_id": params['dest_id'],
+            "dest_type": params['dest_type']
+        })
+    except JobQueueFull as e:
+        response = jsonify({"error": "Too many jobs", "message": str(e)})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
+    response = jsonify({
+        "success": True,
+        **job.to_dict(),
+        "status_url": f"/jobs/{job.id}",
+        "search_params": search_params_summary(params),
+        "result_set_id": encode_result_set_id(params)
+    })
+    response.headers['Location'] = f"/jobs/{job.id}"
+    return response, 202
+
+async def run_search_job(params):
+    """Body of an async search job: bring the result set into the result cache; returns its cache key
+
+    The job keeps only the key, so retained jobs do not hold result sets the cache has evicted.
+    """
+    key, table, query = lookup_params(params)
+    if table is None:
+        await search_flight.do(key, lambda: _fetch_and_store(key, query))
+    return key
+
+def cached_result_set(key):
+    """HotelTable stored under a cache key in this worker's or the shared result cache, however old, or None
+
+    Never calls Booking.com.
+    """
+    _, table, _ = result_cache.lookup_any([key], expired=True)
+    if table is None and shared_cache is not None:
+        _, body, _, age = shared_cache.lookup_any([key], expired=True)
+        if body is not None:
+            table = HotelTable.from_encoded(body.split(b"\n") if body else [])
+            result_cache.set(key, table, _result_size(table), group=key[0], age=age)
+    return table
+
+def as_key(value):
+    """A cache key read back from JSON, with its lists turned back into tuples"""
+    return tuple(as_key(item) for item in value) if isinstance(value, list) else value
+
+def job_changed(job):
+    """Record job latencies when a job finishes, and publish its status to the other workers"""
+    if job.finished:
+        JOB_LATENCY.observe(job.started_at - job.submitted_at, phase="queued")
+        JOB_LATENCY.observe(job.finished_at - job.started_at, phase="running")
+    if shared_cache is not None:
+        # Queued behind the job's result set, so other workers never see it succeed before its results
+        store_writer.submit(
+            shared_cache.set, ("job", job.id), dumps({**job.to_dict(), "request": job.request, "result_key": job.result})
+        )
+
+def shared_job(job_id):
+    """Status and parameters of a job another worker ran, or None if it is unknown or no longer retained"""
+    if shared_cache is None:
+        return None
+    key, record, _, age = shared_cache.lookup_any([("job", job_id)], expired=True)
+    if key is None:
+        return None
+    record = loads(record)
+    if record["finished_at"] and age > JOB_RETAIN_SECONDS:
+        return None
+    return record
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def job_endpoint(job_id):
+    """Status of an async search job, with the search response once it has succeeded"""
+    job = search_jobs.get(job_id)
+    if job is not None:
+        status, params, key = job.to_dict(), job.params, job.result
+    else:
+        record = shared_job(job_id)
+        if record is None:
+            return jsonify({
+                "error": "Job not found",
+                "message": f"No job {job_id}, or it finished more than {JOB_RETAIN_SECONDS:.0f} seconds ago"
+            }), 404
+        key = as_key(record.pop("result_key", None))
+        status = record
+        try:
+            params = parse_search_params(record.pop("request"))
+        except SearchParamError as e:
+            return jsonify({"error": e.error, "message": e.message}), 410
+    
+    if status["status"] != SUCCEEDED:
+        return jsonify(status)
+    
+    # Read back from the result cache, or from the shared cache when another worker ran the job
+    table = cached_result_set(key) if key is not None else None
+    if table is None:
+        return jsonify({
+            **status,
+            "error": "Result expired",
+            "message": "The job's result set is no longer cached; submit the search again"
+        }), 410
+    
+    body = embed(dumps(status), "result", search_body(table, params)[0])
+    response = Response(body, mimetype='application/json')
+    encoding = negotiate(request.accept_encodings)
+    if encoding and len(body) >= COMPRESS_MIN_BYTES:
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+def wants_ndjson(data):
+    """True if the client asked for a streamed NDJSON search response"""
+    if str(data.get('stream', '')).lower() in ('1', 'true', 'ndjson'):
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+def ndjson_search_response(params):
+    """Stream a search as NDJSON: the search params first, then each hotel as soon as it is projected"""
+    def generate():
+        yield dumps({
+            "type": "search_params",
+            "search_params": search_params_summary(params),
+            "result_set_id": encode_result_set_id(params)
+        }) + b"\n"
+        count = 0
+        try:
+            for hotel in upstream.iterate(stream_hotels_async(**params)):
+                count += 1
+                yield dumps({"type": "hotel", "hotel": hotel}) + b"\n"
+        except Exception as e:
+            # Headers are already sent, so failures are reported in-band
+            yield dumps({"type": "error", "error": "Search failed", "message": str(e)}) + b"\n"
+            return
+        yield dumps({"type": "end", "results_count": count}) + b"\n"
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/search/batch', methods=['POST'])
+def search_batch_endpoint():
+    """Run a list of searches concurrently, streaming each result back as NDJSON as it finishes"""
+    data = request.get_json(silent=True) or {}
+    searches = data.get('searches')
+    if not isinstance(searches, list) or not searches:
+        return jsonify({
+            "error": "Missing required parameters",
+            "message": "searches must be a non-empty list of search parameter objects"
+        }), 400
+    
+    if len(searches) > BATCH_MAX_SEARCHES:
+        return jsonify({
+            "error": "Too many searches",
+            "message": f"A batch can contain at most {BATCH_MAX_SEARCHES} searches"
+        }), 400
+    
+    try:
+        concurrency = min(int(data.get('concurrency') or BATCH_CONCURRENCY), BATCH_CONCURRENCY)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid concurrency", "message": "concurrency must be an integer"}), 400
+    
+    def generate():
+        succeeded = failed = 0
+        for result in upstream.iterate(iter_batch_results(searches, max(concurrency, 1))):
+            if result["success"]:
+                succeeded += 1
+            else:
+                failed += 1
+            yield dumps({"type": "result", **result}) + b"\n"
+        yield dumps({"type": "end", "succeeded": succeeded, "failed": failed}) + b"\n"
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+async def iter_batch_results(searches, concurrency):
+    """Run searches with at most `concurrency` in flight, yielding each result as it completes"""
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def run_search(index, spec):
+        try:
+            if not isinstance(spec, dict):
+                raise SearchParamError("Invalid search", "Each search must be an object")
+            params = parse_search_params(await with_destination(spec))
+            async with semaphore:
+                # page_size only applies to streamed searches
+                hotels = await search_hotels_async(**{name: value for name, value in params.items() if name != 'page_size'})
+        except SearchParamError as e:
+            return {"index": index, "success": False, "error": e.error, "message": e.message}
+        except Exception as e:
+            return {"index": index, "success": False, "error": "Search failed", "message": str(e)}
+        return {
+            "index": index,
+            "success": True,
+            "search_params": search_params_summary(params),
+            "result_set_id": encode_result_set_id(params),
+            "results_count": len(hotels),
+            "hotels": hotels
+        }
+    
+    tasks = [asyncio.ensure_future(run_search(index, spec)) for index, spec in enumerate(searches)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+@app.route('/history', methods=['GET'])
+def history_endpoint():
+    """Price, score and star series from stored snapshots, for one hotel or one destination, without any upstream call"""
+    if snapshot_store is None:
+        return jsonify({
+            "error": "History disabled",
+            "message": "Set SNAPSHOT_DB to keep price history"
+        }), 503
+    
+    data = request.args.to_dict()
+    try:
+        params = parse_history_params(data)
+    except SearchParamError as e:
+        return jsonify({"error": e.error, "message": e.message}), 400
+    
+    rows = snapshot_store.history(
+        hotel_id=params['hotel_id'],
+        dest_id=params['dest_id'],
+        checkin=params['checkin_date'],
+        checkout=params['checkout_date'],
+        key=params['query_key'],
+        since=params['since'],
+        limit=params['limit']
+    )
+    
+    # Rows come ordered by series, so each series is one run of consecutive rows
+    series = []
+    for hotel_id, key, checkin, checkout, fetched_at, price, score, stars in rows:
+        if not series or series[-1]["_key"] != (hotel_id, key, checkin, checkout):
+            dest_id, dest_type, adults, rooms, children = parse_query_key(key)
+            series.append({
+                "_key": (hotel_id, key, checkin, checkout),
+                "hotel_id": hotel_id,
+                "dest_id": dest_id,
+                "dest_type": dest_type,
+                "checkin_date": checkin,
+                "checkout_date": checkout,
+                "adults": adults,
+                "rooms": rooms,
+                "children": children,
+                "points": []
+            })
+        series[-1]["points"].append({
+            "fetched_at": datetime.fromtimestamp(fetched_at, timezone.utc).isoformat(timespec='seconds'),
+            "price_per_night": price,
+            "score": score,
+            "stars": stars
+        })
+    for entry in series:
+        del entry["_key"]
+    
+    return jsonify({
+        "success": True,
+        "history_params": {name: value for name, value in data.items()},
+        "points_count": len(rows),
+        "truncated": len(rows) == params['limit'],
+        "series": series
+    })
+
+def parse_history_params(data):
+    """Validate /history parameters into SnapshotStore.history keyword arguments"""
+    try:
+        hotel_id = int(data['hotel_id']) if data.get('hotel_id') else None
+        dest_id = int(data['dest_id']) if data.get('dest_id') else None
+        limit = int(data.get('limit') or HISTORY_DEFAULT_LIMIT)
+    except ValueError:
+        raise SearchParamError("Invalid parameters", "hotel_id, dest_id and limit must be integers")
+    if hotel_id is None and dest_id is None:
+        raise SearchParamError("Missing required parameters", "hotel_id or dest_id is required")
+    if not 1 <= limit <= HISTORY_MAX_LIMIT:
+        raise SearchParamError("Invalid parameters", f"limit must be between 1 and {HISTORY_MAX_LIMIT}")
+    
+    try:
+        for name in ('checkin_date', 'checkout_date'):
+            if data.get(name):
+                validate_date(data[name])
+        since = datetime.fromisoformat(data['since']) if data.get('since') else None
+    except ValueError as e:
+        raise SearchParamError("Invalid date format", str(e))
+    if since is not None and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    
+    # Destination type and occupancy narrow the series to one upstream query; they need the destination to form the key
+    key = None
+    if any(data.get(name) for name in ('dest_type', 'adults', 'rooms', 'children')):
+        if dest_id is None:
+            raise SearchParamError("Missing required parameters", "dest_type, adults, rooms and children need dest_id")
+        dest_type = str(data.get('dest_type') or 'city').lower()
+        if not dest_type.isalpha():
+            raise SearchParamError("Invalid parameters", "dest_type must be a Booking.com destination type, e.g. city")
+        try:
+            key = query_key(
+                dest_id, dest_type, data.get('adults') or 2, data.get('rooms') or 1, data.get('children') or 0
+            )
+        except ValueError:
+            raise SearchParamError("Invalid parameters", "adults, rooms and children must be integers")
+    
+    return {
+        'hotel_id': hotel_id,
+        'dest_id': dest_id,
+        'checkin_date': data.get('checkin_date') or None,
+        'checkout_date': data.get('checkout_date') or None,
+        'query_key': key,
+        'since': since.timestamp() if since is not None else None,
+        'limit': limit
+    }
+
+@app.route('/destinations', methods=['GET'])
+async def destinations_endpoint():
+    """Destinations known locally whose name starts with `q`, resolving `q` through Booking.com if none is"""
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({"error": "Missing required parameters", "message": "q is required"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit') or 10), 1), 50)
+    except ValueError:
+        return jsonify({"error": "Invalid parameters", "message": "limit must be an integer"}), 400
+    
+    try:
+        destinations = destination_index.complete(query, limit)
+        if not destinations:
+            destinations = [await destination_index.resolve(query)]
+    except UnknownLocation:
+        destinations = []
+    except CircuitOpenError as e:
+        return upstream_unavailable(e)
+    except upstream.UpstreamStatusError as e:
+        logger.error(f"Destination lookup failed: {e}")
+        return jsonify({"error": "Upstream error", "message": str(e)}), 502
+    
+    return jsonify({"success": True, "query": query, "destinations": destinations})
+
+@app.route('/calendar', methods=['GET', 'POST'])
+async def calendar_endpoint():
+    """Cheapest, median and percentile nightly prices for each check-in date in a window"""
+    if request.method == 'POST':
+        data = request.get_json() or {}
+    else:
+        data = request.args.to_dict()
+    
+    try:
+        start_date = data.get('start_date')
+        if not start_date:
+            raise SearchParamError("Missing required parameters", "start_date is required")
+        try:
+            start = validate_date(start_date)
+            end = validate_date(data['end_date']) if data.get('end_date') else start + timedelta(days=CALENDAR_DEFAULT_DAYS - 1)
+        except ValueError as e:
+            raise SearchParamError("Invalid date format", str(e))
+        if end < start:
+            raise SearchParamError("Invalid dates", "end_date must not be before start_date")
+        if (end - start).days + 1 > CALENDAR_MAX_DAYS:
+            raise SearchParamError("Invalid dates", f"The date window can span at most {CALENDAR_MAX_DAYS} days")
+        
+        try:
+            nights = int(data.get('nights', 1))
+            percentiles = parse_percentiles(data.get('percentiles'))
+        except ValueError as e:
+            raise SearchParamError("Invalid parameters", str(e))
+        if not 1 <= nights <= MAX_NIGHTS:
+            raise SearchParamError("Invalid parameters", f"nights must be between 1 and {MAX_NIGHTS}")
+        
+        # The location is resolved once for all dates
+        data = await with_destination(data)
+        # Every date is validated the same way a /search for it would be
+        searches = []
+        for checkin in checkin_dates(start, end):
+            spec = {
+                **data,
+                "checkin_date": checkin.strftime('%Y-%m-%d'),
+                "checkout_date": (checkin + timedelta(days=nights)).strftime('%Y-%m-%d')
+            }
+            searches.append(parse_search_params(spec))
+    except SearchParamError as e:
+        return jsonify({"error": e.error, "message": e.message}), 400
+    except ValueError as e:
+        return jsonify({"error": "Invalid parameters", "message": str(e)}), 400
+    except CircuitOpenError as e:
+        return upstream_unavailable(e)
+    except upstream.UpstreamStatusError as e:
+        return jsonify({"error": "Upstream error", "message": str(e)}), 502
+    
+    results = await calendar_prices_async(searches)
+    priced = [result for result in results if not isinstance(result, Exception)]
+    summaries = iter(summarize([prices for prices, _ in priced], percentiles))
+    # The currency the upstream searches were priced in; None if no date came back with prices
+    currency = next((currency for _, currency in priced if currency), None)
+    
+    dates = []
+    for params, result in zip(searches, results):
+        entry = {"checkin_date": params["checkin_date"], "checkout_date": params["checkout_date"]}
+        if isinstance(result, Exception):
+            entry["error"] = str(result)
+        else:
+            entry.update(next(summaries))
+        dates.append(entry)
+    
+    first = searches[0]
+    return jsonify({
+        "success": True,
+        "calendar_params": {
+            "start_date": first["checkin_date"],
+            "end_date": searches[-1]["checkin_date"],
+            "nights": nights,
+            "location": first["location"],
+            "dest_id": first["dest_id"],
+            "adults": first["adults"],
+            "rooms": first["rooms"],
+            "children": first["children"],
+            "percentiles": list(percentiles),
+            "filters": search_params_summary(first)["filters"]
+        },
+        "currency": currency,
+        "dates": dates
+    })
+
+def calendar_key(params):
+    return (
+        params["dest_id"], params["dest_type"], params["checkin_date"], params["checkout_date"],
+        params["adults"], params["rooms"], params["children"],
+        params["max_price"], params["min_price"], params["min_stars"], params["min_reviews"], params["min_score"]
+    )
+
+async def calendar_prices_async(searches):
+    """(nightly price array, currency) for each search (or the exception it raised), scanning misses in parallel"""
+    semaphore = asyncio.Semaphore(CALENDAR_CONCURRENCY)
+    
+    async def prices_for(params):
+        key = calendar_key(params)
+        cached, _ = calendar_cache.lookup(key)
+        if cached is not None:
+            return cached
+        async with semaphore:
+            table = await get_hotels_async(
+                params["checkin_date"], params["checkout_date"], params["location"], params["dest_id"],
+                params["adults"], params["rooms"], params["children"],
+                max_price=params["max_price"], min_stars=params["min_stars"], min_score=params["min_score"],
+                dest_type=params["dest_type"]
+            )
+        prices = nightly_prices(table, table.mask(
+            params["max_price"], params["min_price"], params["min_stars"], params["min_reviews"], params["min_score"]
+        ))
+        calendar_cache.set(key, (prices, table.currency), prices.nbytes + 200)
+        return prices, table.currency
+    
+    return await asyncio.gather(*(prices_for(params) for params in searches), return_exceptions=True)
+
 if __name__ == '__main__':
+    # Development server; run `gunicorn -c gunicorn.conf.py app:app` in production
     app.run(debug=True, host='0.0.0.0', port=5000) 
@@ -0,0 +1,80 @@
+"""Sustained search throughput against a throttling upstream: fixed concurrency vs the adaptive limiter
+
+The local GraphQL stand-in answers 429 to any search beyond `--capacity` in flight, as
+Booking.com does to bursts. `--clients` callers send searches through upstream.post() for
+`--seconds`, first with a fixed window of `--clients` requests (no backoff), then with the
+adaptive limiter and retries the app uses. Reports searches completed per second, searches
+that failed after all retries, and how many 429s the upstream had to send.
+
+    python benchmarks/bench_adaptive.py [--clients 32] [--capacity 4] [--delay 0.05] [--seconds 5]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("UPSTREAM_RATE_LIMIT", "0")
+
+import upstream  # noqa: E402
+from ratelimit import AdaptiveLimiter  # noqa: E402
+from stub_server import StubServer  # noqa: E402
+
+PAYLOAD = b'{"variables": {"input": {}}}'
+
+
+async def drive(url, clients, seconds):
+    """Searches completed and failed by `clients` callers in a loop for `seconds`"""
+    counts = {"completed": 0, "failed": 0}
+    deadline = time.perf_counter() + seconds
+
+    async def client():
+        while time.perf_counter() < deadline:
+            try:
+                response = await upstream.post(url, data=PAYLOAD)
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            counts["completed" if ok else "failed"] += 1
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--capacity", type=int, default=4, help="searches the stub serves at once before answering 429")
+    parser.add_argument("--delay", type=float, default=0.05, help="seconds the stub takes per search")
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    stub = StubServer(search_delay=args.delay, max_concurrent=args.capacity).start()
+    limiters = [
+        # Every caller sends at once and a 429 is final, as before the adaptive limiter
+        ("fixed window, no retries", AdaptiveLimiter(args.clients, min_window=args.clients,
+                                                     failure_threshold=10**9), 0),
+        ("adaptive window + backoff", AdaptiveLimiter(upstream.CONCURRENCY, failure_threshold=upstream.BREAKER_THRESHOLD,
+                                                      open_seconds=upstream.BREAKER_SECONDS), upstream.RETRIES),
+    ]
+    print(f"{args.clients} clients, upstream serves {args.capacity} at a time in {args.delay * 1000:.0f} ms, "
+          f"{args.seconds:g}s per run")
+    print(f"{'limiter':<28} {'searches/s':>11} {'failed/s':>9} {'429s/s':>8} {'window':>7}")
+    try:
+        for name, limiter, retries in limiters:
+            upstream.search_limiter = limiter
+            upstream.RETRIES = retries
+            throttled = stub.throttled
+            counts = upstream.run(drive(stub.url, args.clients, args.seconds))
+            print(f"{name:<28} {counts['completed'] / args.seconds:>11.1f} {counts['failed'] / args.seconds:>9.1f} "
+                  f"{(stub.throttled - throttled) / args.seconds:>8.1f} {limiter.window:>7.2f}")
+    finally:
+        upstream.close()
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Compare whole-body json.loads with the streaming results parser on the recorded responses
+
+Each (fixture, mode) runs in a fresh child process so peak RSS is not polluted by the
+other runs. The body is fed to the streaming parser in 16 KB chunks, like a network read.
+
+    python benchmarks/bench_parse.py [--iterations 20]
+"""
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from stream_parse import ResultsStreamParser  # noqa: E402
+
+FIXTURES = ["full_response.json", "response-example.json"]
+CHUNK_SIZE = 16 * 1024
+
+
+def parse_json(body):
+    data = json.loads(body)
+    return data["data"]["searchQueries"]["search"]["results"]
+
+
+def parse_stream(body):
+    parser = ResultsStreamParser()
+    results = []
+    for start in range(0, len(body), CHUNK_SIZE):
+        results.extend(parser.feed(body[start:start + CHUNK_SIZE]))
+    results.extend(parser.close())
+    return results
+
+
+MODES = {"json.loads": parse_json, "stream": parse_stream}
+
+
+def child(mode, fixture, iterations):
+    body = (BACKEND_DIR / fixture).read_bytes()
+    parse = MODES[mode]
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results = parse(body)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    del results
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        count = len(parse(body))
+        timings.append((time.perf_counter() - start) * 1000)
+    print(json.dumps({
+        "results": count,
+        "rss_growth_kb": peak_kb - baseline_kb,
+        "p50_ms": statistics.median(timings),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "FIXTURE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child, args.iterations)
+        return
+
+    print(f"{'fixture':<24} {'size KB':>8} {'mode':<11} {'results':>8} {'peak RSS +KB':>13} {'p50 ms':>8}")
+    for fixture in FIXTURES:
+        size_kb = (BACKEND_DIR / fixture).stat().st_size // 1024
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, __file__, "--iterations", str(args.iterations), "--child", mode, fixture],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output)
+            print(f"{fixture:<24} {size_kb:>8} {mode:<11} {result['results']:>8} "
+                  f"{result['rss_growth_kb']:>13} {result['p50_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
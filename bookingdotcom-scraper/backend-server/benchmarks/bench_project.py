@@ -0,0 +1,146 @@
+"""Hotel projection throughput: hand-written loop vs the field map, interpreted and compiled
+
+Projects every result of full_response.json with the hand-written projection the API and the
+CLI used to carry, with a generic walk over extractor.HOTEL_FIELDS per hotel, and with the
+function compile_extractor generates from it (what both entry points use now).
+
+    python benchmarks/bench_project.py [--rounds 200]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from extractor import HOTEL_FIELDS, Computed, Field, FirstOf, compile_extractor  # noqa: E402
+from stub_server import load_fixture  # noqa: E402
+
+
+def format_image_url(relative_url):
+    if not relative_url:
+        return None
+    return f"https://cf.bstatic.com{relative_url}"
+
+
+def hand_written(hotel):
+    """The projection as it was written out in app.py and bookingdotcom.py"""
+    display_name_data = hotel.get("displayName") or {}
+    hotel_name = display_name_data.get("text", "No name available")
+
+    basic_data = hotel.get("basicPropertyData") or {}
+    location_data = basic_data.get("location") or {}
+    address = location_data.get("address", "")
+    city = location_data.get("city", "")
+
+    price_info = hotel.get("priceDisplayInfoIrene") or {}
+    display_price = price_info.get("displayPrice") or {}
+    amount_per_stay = display_price.get("amountPerStay") or {}
+    avg_price_per_night = price_info.get("averagePricePerNight") or {}
+
+    review_score = basic_data.get("reviewScore") or {}
+    star_rating_data = basic_data.get("starRating") or {}
+
+    meal_plan = hotel.get("mealPlanIncluded") or {}
+
+    photos = basic_data.get("photos") or {}
+    main_photo = photos.get("main") or {}
+
+    image_url = None
+    for url_type in ["highResJpegUrl", "highResUrl", "lowResJpegUrl", "lowResUrl"]:
+        url_data = main_photo.get(url_type) or {}
+        relative_url = url_data.get("relativeUrl")
+        if relative_url:
+            image_url = format_image_url(relative_url)
+            break
+
+    return {
+        "id": basic_data.get("id"),
+        "name": hotel_name,
+        "location": {
+            "address": address,
+            "city": city,
+            "full_address": f"{address}, {city}" if address and city else city or address
+        },
+        "star_rating": star_rating_data.get("value", 0),
+        "guest_rating": {
+            "score": review_score.get("score", 0),
+            "review_count": review_score.get("reviewCount", 0),
+            "text": review_score.get("totalScoreTextTag", {}).get("translation", "")
+        },
+        "pricing": {
+            "total_price": amount_per_stay.get("amount"),
+            "currency": amount_per_stay.get("currency"),
+            "price_per_night": avg_price_per_night.get("amount"),
+            "price_per_night_unformatted": avg_price_per_night.get("amountUnformatted")
+        },
+        "meal_plan": meal_plan.get("text", "").strip(),
+        "image_url": image_url
+    }
+
+
+def interpret(fields, record, transforms):
+    """Walk the field map for one record, with no compilation"""
+    def walk(path, default):
+        value = record
+        for key in path[:-1]:
+            value = value.get(key) or {}
+        return value.get(path[-1], default)
+
+    def resolve(function):
+        return transforms[function] if isinstance(function, str) else function
+
+    def value(spec):
+        if isinstance(spec, dict):
+            return {name: value(sub) for name, sub in spec.items()}
+        if isinstance(spec, Field):
+            found = walk(spec.path, spec.default)
+            return resolve(spec.transform)(found) if spec.transform else found
+        if isinstance(spec, FirstOf):
+            for path in spec.paths:
+                found = walk(path, None)
+                if found:
+                    return resolve(spec.transform)(found) if spec.transform else found
+            return spec.default
+        if isinstance(spec, Computed):
+            return resolve(spec.function)(*(value(field) for field in spec.fields))
+        raise TypeError(spec)
+
+    return value(fields)
+
+
+def hotels_per_second(project, hotels, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for hotel in hotels:
+            project(hotel)
+    return rounds * len(hotels) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    hotels = load_fixture()["data"]["searchQueries"]["search"]["results"]
+    transforms = {"image_url": format_image_url}
+    compiled = compile_extractor(HOTEL_FIELDS, transforms=transforms, name="project_hotel")
+    projections = [
+        ("hand-written", hand_written),
+        ("field map, interpreted", lambda hotel: interpret(HOTEL_FIELDS, hotel, transforms)),
+        ("field map, compiled", compiled),
+    ]
+    for name, project in projections:
+        assert [project(hotel) for hotel in hotels] == [hand_written(hotel) for hotel in hotels], name
+
+    print(f"{len(hotels)} hotels x {args.rounds} rounds")
+    print(f"{'projection':<24} {'hotels/s':>12} {'us/hotel':>9} {'vs hand-written':>16}")
+    baseline = None
+    for name, project in projections:
+        rate = hotels_per_second(project, hotels, args.rounds)
+        baseline = baseline or rate
+        print(f"{name:<24} {rate:>12,.0f} {1e6 / rate:>9.2f} {rate / baseline:>15.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Compare upstream payload size and search latency with and without filter pushdown
+
+Replays full_response.json through a local stand-in for the GraphQL endpoint that
+applies `selectedFilters` like Booking.com does.
+
+    python benchmarks/bench_pushdown.py [--iterations 20]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_server import StubServer  # noqa: E402
+
+SCENARIOS = [
+    {"max_price": 200},
+    {"min_stars": 4},
+    {"max_price": 250, "min_stars": 3},
+    {"max_price": 150, "min_stars": 4, "min_reviews": 50},
+]
+
+
+def run_scenario(app_module, stub, filters, pushed, iterations):
+    """Time fetch + local filtering for one scenario, bypassing the result cache"""
+    import upstream
+
+    latencies = []
+    bytes_before = stub.bytes_sent
+    kept = 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        hotels = upstream.run(app_module.fetch_hotels_async("2030-01-10", "2030-01-12", pushed=pushed))
+        kept = len(app_module.filter_hotels(hotels, **filters))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "bytes": (stub.bytes_sent - bytes_before) // iterations,
+        "fetched": len(hotels),
+        "kept": kept,
+        "p50_ms": statistics.median(latencies),
+        "mean_ms": statistics.fmean(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    stub = StubServer().start()
+    os.environ["BOOKING_GRAPHQL_URL"] = stub.url
+    # Measure the client, not the politeness delay towards Booking.com
+    os.environ.setdefault("UPSTREAM_RATE_LIMIT", "0")
+    import app as app_module
+    from pushdown import NO_PUSHDOWN, pushdown_filters
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    print(f"{'filters':<55} {'mode':<9} {'bytes':>10} {'fetched':>8} {'kept':>5} {'p50 ms':>8} {'mean ms':>8}")
+    for filters in SCENARIOS:
+        # The recorded response is priced in USD
+        pushed = pushdown_filters(filters.get("max_price"), filters.get("min_stars"), currency="USD")
+        for mode, pushed_filters in (("local", NO_PUSHDOWN), ("pushdown", pushed)):
+            result = run_scenario(app_module, stub, filters, pushed_filters, args.iterations)
+            print(f"{str(filters):<55} {mode:<9} {result['bytes']:>10} {result['fetched']:>8} {result['kept']:>5} "
+                  f"{result['p50_ms']:>8.2f} {result['mean_ms']:>8.2f}")
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
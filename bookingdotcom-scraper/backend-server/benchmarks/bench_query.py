@@ -0,0 +1,96 @@
+"""Compare the legacy FullSearch request with the minimal-projection query and payload template
+
+Reports request bytes, payload build time, response bytes and fetch + decode + projection
+latency. Responses come from a local stand-in that replays full_response.json and prunes it
+to the query's selection set, as the GraphQL server would.
+
+    python benchmarks/bench_query.py [--iterations 20]
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_server import StubServer  # noqa: E402
+
+# The ~28 KB query the API used to send, kept for comparison
+LEGACY_QUERY = (Path(__file__).resolve().parent / "full_search_query.graphql").read_text()
+QUERY_ARGS = ("2030-01-10", "2030-01-12", "Seattle, United States", 20144883, 2, 1, 0)
+
+
+def legacy_document(search_query):
+    """The payload dict the legacy code rebuilt and json.dumps'd on every call"""
+    document = json.loads(search_query.build_search_payload(*QUERY_ARGS))
+    document["variables"]["includeBundle"] = False
+    document["variables"]["carouselLowCodeExp"] = False
+    document["query"] = LEGACY_QUERY
+    return document
+
+
+def time_us(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def fetch_latencies(fetch, iterations):
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fetch()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    stub = StubServer().start()
+    os.environ["BOOKING_GRAPHQL_URL"] = stub.url
+    # Measure the client, not the politeness delay towards Booking.com
+    os.environ.setdefault("UPSTREAM_RATE_LIMIT", "0")
+    import app as app_module
+    import search_query
+    import upstream
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    document = legacy_document(search_query)
+    legacy_payload = json.dumps(document).encode()
+    slim_payload = search_query.build_search_payload(*QUERY_ARGS)
+
+    async def legacy_fetch():
+        response = await upstream.post(stub.url, headers=search_query.SEARCH_HEADERS, data=legacy_payload)
+        results = response.json()["data"]["searchQueries"]["search"]["results"]
+        return [app_module.project_hotel(hotel) for hotel in results]
+
+    legacy_ms = fetch_latencies(lambda: upstream.run(legacy_fetch()), args.iterations)
+    legacy_bytes = stub.bytes_sent // args.iterations
+    sent_before = stub.bytes_sent
+    slim_ms = fetch_latencies(lambda: upstream.run(app_module.fetch_hotels_async(*QUERY_ARGS)), args.iterations)
+    slim_bytes = (stub.bytes_sent - sent_before) // args.iterations
+
+    rows = [
+        ("request bytes", len(legacy_payload), len(slim_payload), ""),
+        ("payload build (us)", time_us(lambda: json.dumps(document), 1000),
+         time_us(lambda: search_query.build_search_payload(*QUERY_ARGS), 1000), ".1f"),
+        ("response bytes", legacy_bytes, slim_bytes, ""),
+        ("fetch+decode+project p50 (ms)", legacy_ms, slim_ms, ".2f"),
+    ]
+    print(f"{'metric':<32} {'legacy':>12} {'slim':>12} {'ratio':>7}")
+    for name, legacy, slim, fmt in rows:
+        print(f"{name:<32} {legacy:>12{fmt}} {slim:>12{fmt}} {legacy / slim:>6.1f}x")
+    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
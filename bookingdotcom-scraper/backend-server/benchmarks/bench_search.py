@@ -0,0 +1,140 @@
+"""End-to-end search pipeline benchmark on the recorded response and synthetic 1k / 10k result fixtures
+
+Replays each fixture through the local GraphQL stand-in and measures search_hotels() and the
+/search endpoint (cold: result cache cleared before every call, warm: served from the cache), and a
+warm two-search /search/batch, which must succeed for both searches.
+Reports throughput, p50/p99 latency, peak RSS growth and the mean time per search spent in
+each pipeline stage, taken from the app's own stage histograms (see /metrics). Each fixture
+runs in a fresh child process so peak RSS is not polluted by the others.
+
+    python benchmarks/bench_search.py [--iterations 20] [--sizes 100,1000,10000]
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_server import StubServer, load_fixture, parse_selection, prune, scale_fixture  # noqa: E402
+
+SEARCH = {"checkin_date": "2030-01-10", "checkout_date": "2030-01-12", "min_reviews": 50}
+# Stages reported per search, as recorded in search_stage_duration_seconds
+STAGES = ["upstream_wait", "upstream_body", "parse", "project", "filter", "serialize"]
+
+
+def build_fixture(size, search_query):
+    """The recorded response (100 hotels) or a synthetic one with `size` results"""
+    fixture = load_fixture()
+    if size == len(fixture["data"]["searchQueries"]["search"]["results"]):
+        return fixture
+    # Scale the slim projection only; the stub would prune it to this anyway
+    slim = prune(fixture, {"data": parse_selection(search_query.SEARCH_QUERY)})
+    return scale_fixture(slim, size)
+
+
+def measure(app_module, call, iterations, clear_cache):
+    """Latencies and mean per-stage time for `iterations` calls"""
+    stages = app_module.SEARCH_STAGE_LATENCY
+    before = {stage: stages.totals(stage=stage)[1] for stage in STAGES}
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        if clear_cache:
+            app_module.result_cache.clear()
+        call_started = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - call_started) * 1000)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "per_second": iterations / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[min(len(latencies) - 1, round(0.99 * (len(latencies) - 1)))],
+        "stages_ms": {
+            stage: (stages.totals(stage=stage)[1] - before[stage]) / iterations * 1000 for stage in STAGES
+        },
+    }
+
+
+def child(size, iterations):
+    stub = StubServer().start()
+    os.environ["BOOKING_GRAPHQL_URL"] = stub.url
+    # Measure the client, not the politeness delay towards Booking.com or log volume
+    os.environ.setdefault("UPSTREAM_RATE_LIMIT", "0")
+    os.environ.setdefault("SEARCH_LOG_SAMPLE_RATE", "0")
+    import app as app_module
+    import search_query
+
+    stub.fixture = build_fixture(size, search_query)
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    client = app_module.app.test_client()
+    query = "&".join(f"{name}={value}" for name, value in SEARCH.items())
+
+    def endpoint():
+        response = client.get(f"/search?{query}")
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    def batch():
+        response = client.post("/search/batch", json={"searches": [SEARCH, {**SEARCH, "min_reviews": 500}]})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert results[-1] == {"type": "end", "succeeded": 2, "failed": 0}, results
+
+    # The stub shares this process; have it encode its body before the memory baseline
+    stub.body_for(search_query.SEARCH_QUERY, "")
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Start the upstream loop and session outside the timings
+    app_module.search_hotels(**SEARCH)
+    app_module.result_cache.clear()
+
+    rows = []
+    for mode, call, clear_cache in (
+        ("search_hotels", lambda: app_module.search_hotels(**SEARCH), True),
+        ("/search cold", endpoint, True),
+        ("/search warm", endpoint, False),
+        ("/search/batch", batch, False),
+    ):
+        result = measure(app_module, call, iterations, clear_cache)
+        result["mode"] = mode
+        result["rss_growth_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_kb
+        rows.append(result)
+    stub.stop()
+    print(json.dumps({"body_kb": stub.bytes_sent // stub.requests // 1024, "rows": rows}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--sizes", default="100,1000,10000", help="result counts; 100 is the recorded response")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.iterations)
+        return
+
+    stage_header = " ".join(f"{stage[:13]:>13}" for stage in STAGES)
+    print(f"{'results':>7} {'body KB':>8} {'mode':<14} {'per s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'peak RSS +KB':>13} {stage_header}")
+    for size in (int(size) for size in args.sizes.split(",")):
+        output = subprocess.run(
+            [sys.executable, __file__, "--iterations", str(args.iterations), "--child", str(size)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output)
+        for row in result["rows"]:
+            stages = " ".join(f"{row['stages_ms'][stage]:>13.2f}" for stage in STAGES)
+            print(f"{size:>7} {result['body_kb']:>8} {row['mode']:<14} {row['per_second']:>8.1f} "
+                  f"{row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['rss_growth_kb']:>13} {stages}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Serialize time and allocations of a /search response body on the recorded and synthetic fixtures
+
+Compares the old jsonify() path (Flask's stdlib provider), a plain compact json.dumps, the
+fast encoder (orjson when installed) on the whole response, and the path /search now takes:
+joining the per-hotel encodings stored in the cached HotelTable. Allocations are the peak
+memory traced by tracemalloc during one call.
+
+    python benchmarks/bench_serialize.py [--iterations 50] [--sizes 100,1000,10000]
+
+Run with JSON_ENCODER=json to measure the stdlib fallback of the fast path.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_server import load_fixture, parse_selection, prune, scale_fixture  # noqa: E402
+
+
+def response_data(hotels, total):
+    """Response dict of a /search request without filters"""
+    return {
+        "success": True,
+        "search_params": {"checkin_date": "2030-01-10", "checkout_date": "2030-01-12"},
+        "result_set_id": "rs1.bench",
+        "results_count": len(hotels),
+        "total_results": total,
+        "hotels": hotels,
+    }
+
+
+def measure(fn, iterations):
+    """(p50 us, peak traced KB) of fn()"""
+    fn()
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - started) * 1e6)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(latencies), peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--sizes", default="100,1000,10000", help="result counts; 100 is the recorded response")
+    args = parser.parse_args()
+
+    import app as app_module
+    import search_query
+    from fast_json import JSON_ENCODER, dumps, splice
+    from flask.json.provider import DefaultJSONProvider
+    from hotel_table import HotelTable
+
+    stdlib_provider = DefaultJSONProvider(app_module.app)
+    fixture = load_fixture()
+    slim = prune(fixture, {"data": parse_selection(search_query.SEARCH_QUERY)})
+
+    print(f"fast encoder: {JSON_ENCODER}")
+    print(f"{'results':>7} {'body KB':>8} {'path':<20} {'p50 us':>10} {'peak KB':>9} {'speedup':>8}")
+    for size in (int(size) for size in args.sizes.split(",")):
+        source = fixture if size == len(fixture["data"]["searchQueries"]["search"]["results"]) else scale_fixture(slim, size)
+        hotels = [app_module.project_hotel(hotel) for hotel in source["data"]["searchQueries"]["search"]["results"]]
+        table = HotelTable(hotels)
+        data = response_data(hotels, len(hotels))
+
+        def jsonify():
+            with app_module.app.app_context():
+                return stdlib_provider.response(data).get_data()
+
+        def fragments():
+            encoded, total = table.query_encoded()
+            head = {key: value for key, value in response_data(encoded, total).items() if key != "hotels"}
+            return splice(dumps(head), "hotels", encoded)
+
+        paths = [
+            ("jsonify (stdlib)", jsonify),
+            ("json.dumps", lambda: json.dumps(data, separators=(",", ":"))),
+            ("fast dumps", lambda: dumps(data)),
+            ("stored fragments", fragments),
+        ]
+        assert json.loads(fragments()) == json.loads(dumps(data))
+        body_kb = len(fragments()) // 1024
+        baseline = None
+        for name, fn in paths:
+            p50, peak = measure(fn, args.iterations)
+            baseline = baseline or p50
+            print(f"{size:>7} {body_kb:>8} {name:<20} {p50:>10.1f} {peak:>9.1f} {baseline / p50:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
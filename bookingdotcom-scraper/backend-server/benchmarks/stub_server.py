@@ -0,0 +1,273 @@
+"""Local stand-in for the Booking.com GraphQL search endpoint, replaying a recorded response"""
+import json
+import random
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+FULL_RESPONSE = BACKEND_DIR / "full_response.json"
+
+
+def load_fixture(path=FULL_RESPONSE):
+    with open(path) as f:
+        return json.load(f)
+
+
+def scale_fixture(fixture, count, seed=0):
+    """Grow a recorded response to `count` results by cloning its hotels with new ids and jittered prices and reviews
+
+    Prune the fixture to the query's selection first (see `prune`) to keep large fixtures small.
+    """
+    rng = random.Random(seed)
+    search = fixture["data"]["searchQueries"]["search"]
+    originals = search["results"]
+    results = []
+    for index in range(count):
+        hotel = json.loads(json.dumps(originals[index % len(originals)]))
+        basic_data = hotel.get("basicPropertyData") or {}
+        if "id" in basic_data:
+            basic_data["id"] = 90_000_000 + index
+        name = hotel.get("displayName") or {}
+        if "text" in name:
+            name["text"] = f"{name['text']} #{index}"
+        reviews = basic_data.get("reviewScore") or {}
+        if "reviewCount" in reviews:
+            reviews["reviewCount"] = rng.randint(0, 5000)
+        if "score" in reviews:
+            reviews["score"] = round(rng.uniform(5, 10), 1)
+        price_info = hotel.get("priceDisplayInfoIrene") or {}
+        factor = rng.uniform(0.5, 1.5)
+        for price in ((price_info.get("averagePricePerNight") or {}),
+                      ((price_info.get("displayPrice") or {}).get("amountPerStay") or {})):
+            if isinstance(price.get("amountUnformatted"), (int, float)):
+                price["amountUnformatted"] = round(price["amountUnformatted"] * factor, 2)
+                price["amount"] = f"${price['amountUnformatted']:,.0f}"
+            elif "amount" in price:
+                price["amount"] = f"${rng.randint(50, 900):,}"
+        results.append(hotel)
+    pagination = {**(search.get("pagination") or {}), "nbResultsTotal": count, "nbResultsPerPage": count}
+    return {"data": {"searchQueries": {"search": {**search, "pagination": pagination, "results": results}}}}
+
+
+def _matches(hotel, selected_filters):
+    """Apply a Booking.com `selectedFilters` string the way the real endpoint would"""
+    price_info = hotel.get("priceDisplayInfoIrene") or {}
+    price = (price_info.get("averagePricePerNight") or {}).get("amountUnformatted")
+    basic_data = hotel.get("basicPropertyData") or {}
+    stars = (basic_data.get("starRating") or {}).get("value") or 0
+    score = (basic_data.get("reviewScore") or {}).get("score") or 0
+
+    classes = []
+    score_buckets = []
+    for part in selected_filters.split(";"):
+        name, _, value = part.partition("=")
+        if name == "price":
+            # e.g. USD-min-200-1
+            cap = value.split("-")[2]
+            if price is None or (cap != "max" and price > float(cap)):
+                return False
+        elif name == "class":
+            classes.append(int(value))
+        elif name == "review_score":
+            score_buckets.append(int(value))
+    if classes and int(stars) not in classes:
+        return False
+    if score_buckets and score * 10 < min(score_buckets):
+        return False
+    return True
+
+
+_TOKEN = re.compile(r'\.\.\.|[{}():!$=@\[\],]|"[^"]*"|[A-Za-z_][A-Za-z0-9_]*|-?[0-9.]+')
+
+
+def parse_selection(query):
+    """Output-key tree of a GraphQL query (None marks a leaf); None if the query uses fragments"""
+    if "..." in query:
+        return None
+    tokens = _TOKEN.findall(query)
+    position = tokens.index("{")
+
+    def skip_arguments(i):
+        depth = 0
+        while True:
+            if tokens[i] == "(":
+                depth += 1
+            elif tokens[i] == ")":
+                depth -= 1
+                if depth == 0:
+                    return i + 1
+            i += 1
+
+    def selection_set(i):
+        fields = {}
+        i += 1
+        while tokens[i] != "}":
+            name = tokens[i]
+            i += 1
+            if tokens[i] == ":":
+                # alias: field
+                i += 2
+            if tokens[i] == "(":
+                i = skip_arguments(i)
+            if tokens[i] == "{":
+                fields[name], i = selection_set(i)
+            else:
+                fields[name] = None
+        return fields, i + 1
+
+    return selection_set(position)[0]
+
+
+def prune(value, selection):
+    """Keep only the selected keys of a recorded response, as a GraphQL server would"""
+    if selection is None or value is None:
+        return value
+    if isinstance(value, list):
+        return [prune(item, selection) for item in value]
+    return {key: prune(value[key], sub) for key, sub in selection.items() if key in value}
+
+
+class StubServer:
+    """Serve a recorded GraphQL response on localhost, honouring the query's selection set and pushed-down filters
+
+    GET requests for /xdata/images/... are answered with `image` (bytes), standing in for the photo CDN.
+    With `max_concurrent`, searches beyond that many in flight are answered 429, as Booking.com
+    throttles bursts.
+    """
+
+    def __init__(self, fixture=None, host="127.0.0.1", port=0, paged=False, image=None, image_delay=0,
+                 search_delay=0, max_concurrent=None):
+        self.fixture = fixture if fixture is not None else load_fixture()
+        # Honour pagination.offset / rowsPerPage instead of replaying every result at once
+        self.paged = paged
+        self.image = image
+        # Seconds each photo takes to serve, to hold concurrent requests in flight together
+        self.image_delay = image_delay
+        # Seconds each search takes to answer, so concurrent searches overlap
+        self.search_delay = search_delay
+        self.max_concurrent = max_concurrent
+        self.requests = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.image_requests = 0
+        self.bytes_sent = 0
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/dml/graphql"
+
+    @property
+    def origin(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def body_for(self, query, selected_filters, offset=0, rows_per_page=None):
+        """Encoded response for a query, filter string and page (encoded once so the stub's cost stays out of timings)"""
+        with self._lock:
+            cache_key = (query, selected_filters, offset, rows_per_page)
+            body = self._bodies.get(cache_key)
+            if body is None:
+                response = self.fixture
+                if selected_filters or offset or rows_per_page:
+                    search = response["data"]["searchQueries"]["search"]
+                    results = [hotel for hotel in search["results"] if _matches(hotel, selected_filters)]
+                    pagination = {**(search.get("pagination") or {}), "nbResultsTotal": len(results)}
+                    results = results[offset:offset + rows_per_page if rows_per_page else None]
+                    response = {"data": {"searchQueries": {"search": {
+                        **search, "pagination": pagination, "results": results
+                    }}}}
+                selection = parse_selection(query) if query else None
+                if selection is not None:
+                    response = prune(response, {"data": selection})
+                body = json.dumps(response).encode()
+                self._bodies[cache_key] = body
+            return body
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out in separate writes; don't let Nagle + delayed ACK stall them
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_POST(self):
+                length = int(self.headers.get("content-length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                with stub._lock:
+                    throttled = stub.max_concurrent is not None and stub.in_flight >= stub.max_concurrent
+                    if throttled:
+                        stub.throttled += 1
+                    else:
+                        stub.in_flight += 1
+                if throttled:
+                    self.send_response(429)
+                    self.send_header("content-length", "0")
+                    self.end_headers()
+                    return
+                try:
+                    time.sleep(stub.search_delay)
+                    self.send_search(payload)
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def send_search(self, payload):
+                search_input = payload.get("variables", {}).get("input", {})
+                filters = search_input.get("filters") or {}
+                pagination = search_input.get("pagination") or {}
+                body = stub.body_for(
+                    payload.get("query", ""), filters.get("selectedFilters", ""),
+                    offset=pagination.get("offset") or 0,
+                    # Booking.com caps pages at 100 rows, whatever is asked for
+                    rows_per_page=min(pagination.get("rowsPerPage") or 100, 100) if stub.paged else None,
+                )
+                self.send_response(200)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with stub._lock:
+                    stub.requests += 1
+                    stub.bytes_sent += len(body)
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.image_requests += 1
+                time.sleep(stub.image_delay)
+                if stub.image is None or not self.path.startswith("/xdata/images/"):
+                    self.send_response(404)
+                    self.send_header("content-length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("content-type", "image/jpeg")
+                self.send_header("content-length", str(len(stub.image)))
+                self.end_headers()
+                self.wfile.write(stub.image)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
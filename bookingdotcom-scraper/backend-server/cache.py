@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds a cached search result is served as fresh
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", 300))
+# Extra seconds an expired result may still be served while it is refreshed in the background
+RESULT_CACHE_STALE_TTL = float(os.environ.get("RESULT_CACHE_STALE_TTL", 1800))
+# Total approximate size of cached results before least recently used entries are evicted
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+FRESH = "fresh"
+STALE = "stale"
+# Past the stale window; only returned when asked for, e.g. while the upstream is unavailable
+EXPIRED = "expired"
+
+
+class _Entry:
+    __slots__ = ("value", "size", "stored_at", "group")
+
+    def __init__(self, value, size, stored_at, group):
+        self.value = value
+        self.size = size
+        self.stored_at = stored_at
+        self.group = group
+
+
+class ResultCache:
+    """Thread-safe TTL cache with LRU eviction by byte size and stale-while-revalidate"""
+
+    def __init__(self, ttl=RESULT_CACHE_TTL, stale_ttl=RESULT_CACHE_STALE_TTL, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._groups = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "stale_hits": 0,
+            "expired_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "refreshes": 0,
+        }
+
+    def lookup(self, key):
+        """Return (value, FRESH | STALE) for a cached key, or (None, None) on a miss"""
+        _, value, state = self.lookup_any([key])
+        return value, state
+
+    def lookup_any(self, keys, expired=False):
+        """Return (key, value, state) for the first live key, or (None, None, None) if none is cached
+
+        With `expired`, entries past their stale window are returned as EXPIRED instead of dropped.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                age = now - entry.stored_at
+                if age > self.ttl + self.stale_ttl:
+                    if expired:
+                        self._entries.move_to_end(key)
+                        self._counters["expired_hits"] += 1
+                        return key, entry.value, EXPIRED
+                    self._remove(key)
+                    self._counters["expirations"] += 1
+                    continue
+                self._entries.move_to_end(key)
+                if age > self.ttl:
+                    self._counters["stale_hits"] += 1
+                    return key, entry.value, STALE
+                self._counters["hits"] += 1
+                return key, entry.value, FRESH
+            self._counters["misses"] += 1
+            return None, None, None
+
+    def group_keys(self, group):
+        """Keys currently cached under a group (e.g. every filter variant of one upstream query)"""
+        with self._lock:
+            return list(self._groups.get(group, ()))
+
+    def set(self, key, value, size, group=None, age=0):
+        """Store a value with its approximate size in bytes, evicting LRU entries as needed
+
+        `age` is how many seconds old the value already is, e.g. when copied from another cache.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = _Entry(value, size, time.monotonic() - age, group)
+            self._bytes += size
+            if group is not None:
+                self._groups.setdefault(group, set()).add(key)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._counters["evictions"] += 1
+
+    def begin_refresh(self, key):
+        """Claim the background refresh for a stale key; False if one is already running"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self._counters["refreshes"] += 1
+            return True
+
+    def end_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Counters and occupancy for the health endpoint"""
+        with self._lock:
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "stale_ttl_seconds": self.stale_ttl,
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        if entry.group is not None:
+            keys = self._groups[entry.group]
+            keys.discard(key)
+            if not keys:
+                del self._groups[entry.group]
@@ -0,0 +1,107 @@
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict
+
+# Change feed: the hotels a search matched are kept per query as one small entry per hotel
+# (a fingerprint of its encoding plus its price and score), so a poller can ask what changed
+# since the version it last saw instead of downloading the whole list and diffing it itself.
+# Versions are content hashes, so every worker that has seen the same results names them alike.
+
+# Queries whose snapshots are kept; the least recently polled one is dropped first
+FEED_MAX_QUERIES = int(os.environ.get("FEED_MAX_QUERIES", 1000))
+# Versions kept per query; a client further behind than this gets a full resync
+FEED_VERSIONS = int(os.environ.get("FEED_VERSIONS", 16))
+
+
+class Snapshot:
+    """The hotels a search matched at one version: hotel id -> (fingerprint, price per night, score)"""
+
+    __slots__ = ("version", "hotels")
+
+    def __init__(self, table, rows):
+        fingerprints = table.fingerprints()
+        prices = table.price.tolist()
+        scores = table.score.tolist()
+        digest = hashlib.blake2b(digest_size=8)
+        self.hotels = {}
+        for row in rows:
+            digest.update(fingerprints[row].to_bytes(8, "big"))
+            hotel_id = table.ids[row]
+            if hotel_id is not None:
+                price = prices[row]
+                self.hotels[hotel_id] = (fingerprints[row], None if math.isnan(price) else price, scores[row])
+        self.version = digest.hexdigest()
+
+
+def _delta(before, after):
+    return {
+        "from": before,
+        "to": after,
+        "change": round(after - before, 2) if before is not None and after is not None else None
+    }
+
+
+def diff(old, new):
+    """(added ids, removed ids, price and score changes) from one snapshot to another, in one pass over each
+
+    Hotels whose fingerprint is unchanged are skipped without looking at their fields; a
+    changed hotel is only reported if its price or score moved.
+    """
+    added, changed = [], []
+    for hotel_id, (fingerprint, price, score) in new.hotels.items():
+        before = old.hotels.get(hotel_id)
+        if before is None:
+            added.append(hotel_id)
+        elif before[0] != fingerprint:
+            change = {"id": hotel_id}
+            if before[1] != price:
+                change["price_per_night"] = _delta(before[1], price)
+            if before[2] != score:
+                change["score"] = _delta(before[2], score)
+            if len(change) > 1:
+                changed.append(change)
+    removed = [hotel_id for hotel_id in old.hotels if hotel_id not in new.hotels]
+    return added, removed, changed
+
+
+class ChangeFeed:
+    """The last FEED_VERSIONS snapshots of up to FEED_MAX_QUERIES queries"""
+
+    def __init__(self, max_queries=FEED_MAX_QUERIES, versions=FEED_VERSIONS):
+        self.max_queries = max_queries
+        self.versions = max(int(versions), 1)
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"polls": 0, "versions": 0, "resyncs": 0}
+
+    def advance(self, key, snapshot, since=None):
+        """Make snapshot the latest version of a query; returns its kept snapshot at version `since`, or None"""
+        with self._lock:
+            versions = self._queries.get(key)
+            if versions is None:
+                versions = self._queries[key] = OrderedDict()
+                if len(self._queries) > self.max_queries:
+                    self._queries.popitem(last=False)
+            else:
+                self._queries.move_to_end(key)
+            base = versions.get(since) if since else None
+            if snapshot.version not in versions:
+                self._counters["versions"] += 1
+            versions[snapshot.version] = snapshot
+            versions.move_to_end(snapshot.version)
+            while len(versions) > self.versions:
+                versions.popitem(last=False)
+            self._counters["polls"] += 1
+            if base is None:
+                self._counters["resyncs"] += 1
+        return base
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counters,
+                "queries": len(self._queries),
+                "snapshots": sum(len(versions) for versions in self._queries.values())
+            }
@@ -0,0 +1,32 @@
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content-Encoding negotiation for API responses: brotli when the client accepts it and the
+# brotli package is installed, gzip otherwise.
+
+# Bodies smaller than this are sent as they are; compressing them saves next to nothing
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+# 0-11; the top levels compress a little better but are far too slow to run per response
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 5))
+
+# Supported codings in order of preference when the client accepts several equally
+ENCODINGS = ("br", "gzip") if brotli else ("gzip",)
+
+
+def negotiate(accept_encodings):
+    """Best supported coding for a parsed Accept-Encoding header (request.accept_encodings), or None"""
+    return accept_encodings.best_match(ENCODINGS)
+
+
+def compress(body, encoding):
+    """body compressed with `encoding` ("br" or "gzip")"""
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output, and so the ETag, identical for identical bodies
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
@@ -0,0 +1,257 @@
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+
+import upstream
+from local_sqlite import BackgroundWriter, LocalConnection
+from search_query import SEARCH_HEADERS, SESSION_PARAMS
+from singleflight import SingleFlight
+
+# Free-text locations are turned into Booking.com destinations (dest_id and dest_type) through
+# Booking.com's autocomplete. Answers are kept in a prefix trie in memory, backed by a SQLite
+# index on disk, so a location is only looked up upstream once per DESTINATION_TTL, across
+# restarts and across the worker processes of one server.
+
+# Booking.com autocomplete endpoint (overridable to point at a local stand-in)
+AUTOCOMPLETE_URL = os.environ.get("BOOKING_AUTOCOMPLETE_URL", "https://accommodations.booking.com/autocomplete.json")
+# Path of the SQLite index; empty keeps resolved locations in memory only
+DESTINATION_DB = os.environ.get("DESTINATION_DB", os.path.join(tempfile.gettempdir(), "bookingdotcom-destinations.db"))
+# Seconds a resolved location is trusted before it is looked up again
+DESTINATION_TTL = float(os.environ.get("DESTINATION_TTL", 7 * 24 * 3600))
+# Searched when a request names no location; known without a lookup
+DEFAULT_LOCATION = "Seattle, United States"
+DEFAULT_DESTINATION = {"dest_id": 20144883, "dest_type": "city", "label": "Seattle, United States"}
+# Autocomplete suggestions requested per lookup; all of them are indexed under their labels
+AUTOCOMPLETE_SIZE = 5
+
+AUTOCOMPLETE_HEADERS = {
+    name: SEARCH_HEADERS[name]
+    for name in ("accept", "content-type", "origin")
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS destinations (
+    name TEXT PRIMARY KEY,
+    dest_id INTEGER NOT NULL,
+    dest_type TEXT NOT NULL,
+    label TEXT NOT NULL,
+    resolved_at REAL NOT NULL
+);
+"""
+
+_WORDS = re.compile(r"\w+")
+
+
+def normalize(location):
+    """Index key of a location: lower case words separated by single spaces, punctuation dropped"""
+    return " ".join(_WORDS.findall(location.casefold()))
+
+
+class UnknownLocation(LookupError):
+    """Booking.com's autocomplete has no destination for a location"""
+
+
+class PrefixTrie:
+    """Values keyed by string, found by exact key or by prefix"""
+
+    _END = ""
+
+    def __init__(self):
+        self._root = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def get(self, key):
+        node = self._node(key)
+        return None if node is None else node.get(self._END)
+
+    def set(self, key, value):
+        node = self._root
+        for char in key:
+            node = node.setdefault(char, {})
+        if self._END not in node:
+            self._size += 1
+        node[self._END] = value
+
+    def items(self, prefix, limit):
+        """Up to `limit` (key, value) pairs whose key starts with prefix, shortest keys first"""
+        node = self._node(prefix)
+        if node is None:
+            return []
+        found = []
+        # Breadth first, so whole words come before the longer names that start with them
+        pending = deque([(prefix, node)])
+        while pending and len(found) < limit:
+            key, node = pending.popleft()
+            for char, child in node.items():
+                if char == self._END:
+                    found.append((key, child))
+                else:
+                    pending.append((key + char, child))
+        return found[:limit]
+
+    def _node(self, key):
+        node = self._root
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+
+
+class DestinationIndex:
+    """Resolves locations to destinations: prefix trie first, then the SQLite index, then Booking.com
+
+    Destinations are dicts with `dest_id`, `dest_type` and Booking.com's `label`. Every
+    autocomplete suggestion is indexed under its label, and the first one under the location
+    as given, so both resolve locally afterwards.
+    """
+
+    def __init__(self, path=DESTINATION_DB, ttl=DESTINATION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._trie = PrefixTrie()
+        self._lock = threading.Lock()
+        # The database is opened, and the trie filled from it, on first use rather than at import
+        self._connections = LocalConnection(path, SCHEMA) if path else None
+        # _fetch runs on the upstream loop, so index writes are made from a thread of their own
+        self._writer = BackgroundWriter("destination-writer")
+        self._loaded = not path
+        self._flight = SingleFlight(upstream.get_loop)
+        self._counters = {"hits": 0, "disk_hits": 0, "lookups": 0, "unknown": 0}
+        self.pin(DEFAULT_LOCATION, DEFAULT_DESTINATION)
+
+    def lookup(self, location):
+        """The destination for a location if it is known locally and fresh, else None; never calls Booking.com"""
+        self._load()
+        name = normalize(location)
+        with self._lock:
+            entry = self._trie.get(name)
+        if entry is not None and entry[1] > time.time() - self.ttl:
+            self._count("hits")
+            return entry[0]
+        if self.path:
+            # Another worker process may have resolved it since this one loaded the index
+            row = self._connection().execute(
+                "SELECT dest_id, dest_type, label, resolved_at FROM destinations WHERE name = ? AND resolved_at > ?",
+                (name, time.time() - self.ttl)
+            ).fetchone()
+            if row is not None:
+                destination = _destination(*row[:3])
+                with self._lock:
+                    self._trie.set(name, (destination, row[3]))
+                self._count("disk_hits")
+                return destination
+        return None
+
+    async def resolve(self, location):
+        """The destination for a location, asking Booking.com's autocomplete on a local miss
+
+        Raises UnknownLocation when Booking.com has no match. Concurrent misses for the same
+        location share one upstream request.
+        """
+        destination = self.lookup(location)
+        if destination is None:
+            name = normalize(location)
+            destination = await self._flight.do(("destination", name), lambda: self._fetch(location, name))
+        if destination is None:
+            self._count("unknown")
+            raise UnknownLocation(f"No Booking.com destination matches {location!r}")
+        return destination
+
+    def pin(self, location, destination):
+        """Index a destination for a location in this process for good, e.g. the default destination"""
+        with self._lock:
+            self._trie.set(normalize(location), (destination, math.inf))
+
+    def complete(self, prefix, limit=10):
+        """Distinct known destinations whose location or label starts with prefix, shortest names first"""
+        self._load()
+        with self._lock:
+            entries = self._trie.items(normalize(prefix), limit * AUTOCOMPLETE_SIZE)
+        destinations = {}
+        for _, (destination, _) in entries:
+            destinations.setdefault((destination["dest_id"], destination["dest_type"]), destination)
+        return list(destinations.values())[:limit]
+
+    def flush(self):
+        """Block until every location resolved so far has been written to the index on disk"""
+        self._writer.flush()
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, "entries": len(self._trie), "path": self.path or None}
+
+    async def _fetch(self, location, name):
+        """Ask the autocomplete for a location and index its suggestions; returns the first one or None"""
+        self._count("lookups")
+        response = await upstream.post(AUTOCOMPLETE_URL, headers=AUTOCOMPLETE_HEADERS, data=json.dumps({
+            "query": location,
+            "language": SESSION_PARAMS["lang"],
+            "aid": int(SESSION_PARAMS["aid"]),
+            "size": AUTOCOMPLETE_SIZE,
+        }).encode())
+        if response.status_code != 200:
+            raise upstream.UpstreamStatusError(response.status_code)
+        suggestions = []
+        for result in (response.json() or {}).get("results") or []:
+            try:
+                suggestions.append(_destination(result["dest_id"], result["dest_type"], result.get("label") or ""))
+            except (KeyError, TypeError, ValueError):
+                # Not a destination (e.g. a search suggestion without an id)
+                continue
+        if not suggestions:
+            return None
+        entries = [(normalize(destination["label"]), destination) for destination in suggestions if destination["label"]]
+        entries.append((name, suggestions[0]))
+        self._store(entries)
+        return suggestions[0]
+
+    def _store(self, entries):
+        resolved_at = time.time()
+        with self._lock:
+            for name, destination in entries:
+                self._trie.set(name, (destination, resolved_at))
+        if self.path:
+            self._writer.submit(self._write, entries, resolved_at)
+
+    def _write(self, entries, resolved_at):
+        with self._connection() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO destinations (name, dest_id, dest_type, label, resolved_at) VALUES (?, ?, ?, ?, ?)",
+                [(name, destination["dest_id"], destination["dest_type"], destination["label"], resolved_at)
+                 for name, destination in entries]
+            )
+
+    def _load(self):
+        """Fill the trie with the fresh entries of the database, once"""
+        if self._loaded:
+            return
+        rows = self._connection().execute(
+            "SELECT name, dest_id, dest_type, label, resolved_at FROM destinations WHERE resolved_at > ?",
+            (time.time() - self.ttl,)
+        ).fetchall()
+        with self._lock:
+            for name, dest_id, dest_type, label, resolved_at in rows:
+                # Entries resolved since (or pinned) are at least as good as the ones on disk
+                if self._trie.get(name) is None:
+                    self._trie.set(name, (_destination(dest_id, dest_type, label), resolved_at))
+            self._loaded = True
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _connection(self):
+        return self._connections.get()
+
+
+def _destination(dest_id, dest_type, label):
+    return {"dest_id": int(dest_id), "dest_type": str(dest_type).lower(), "label": label}
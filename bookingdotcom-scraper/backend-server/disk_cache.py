@@ -0,0 +1,108 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+class DiskCache:
+    """Thread-safe cache of byte strings stored as files in one directory, with LRU eviction by total size
+
+    Recency is tracked in memory and seeded from the files' modification times, so a restarted
+    process picks up the cache it left behind. Files are written to a temporary name and
+    renamed into place, so readers never see a partial file, and several processes can
+    share one directory. The directory is created and scanned on first use, not when the
+    cache is constructed.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # File name -> size, least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+        self._loaded = False
+
+    def _load(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            existing = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    existing.append((stat.st_mtime, entry.name, stat.st_size))
+            for _, name, size in sorted(existing):
+                self._entries[name] = size
+                self._bytes += size
+            self._evict()
+            self._loaded = True
+
+    def get(self, key):
+        """Return the cached bytes for key, or None on a miss
+
+        Files written by other processes sharing the directory are picked up as well.
+        """
+        self._load()
+        name = self._name(key)
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            # Never cached, or deleted behind our back, e.g. evicted by another process
+            with self._lock:
+                self._forget(name)
+                self._counters["misses"] += 1
+            return None
+        with self._lock:
+            if name in self._entries:
+                self._entries.move_to_end(name)
+            else:
+                self._entries[name] = len(data)
+                self._bytes += len(data)
+                self._evict()
+            self._counters["hits"] += 1
+        return data
+
+    def set(self, key, data):
+        self._load()
+        name = self._name(key)
+        path = os.path.join(self.directory, name)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+        with self._lock:
+            self._forget(name)
+            self._entries[name] = len(data)
+            self._bytes += len(data)
+            self._evict()
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, "entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+    @staticmethod
+    def _name(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _forget(self, name):
+        size = self._entries.pop(name, None)
+        if size is not None:
+            self._bytes -= size
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self._counters["evictions"] += 1
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,201 @@
+import keyword
+
+# Declarative extraction of output records from nested upstream JSON. A field map (output
+# field -> Field / FirstOf / Computed, nested dicts for nested output) is compiled once into
+# a plain Python function: each intermediate object on the way is looked up a single time
+# and shared by every field below it, so projecting a hotel costs no more than hand-written
+# code, with no per-hotel interpretation of the map.
+
+
+class Field:
+    """Value at a dotted source path, or `default` if a key on the way is missing
+
+    Intermediate objects that are null count as missing, the leaf value is returned as-is.
+    `transform` (a callable, or the name of one passed to compile_extractor) is applied to it.
+    """
+
+    def __init__(self, path, default=None, transform=None):
+        self.path = tuple(path.split("."))
+        self.default = default
+        self.transform = transform
+
+
+class FirstOf:
+    """First truthy value of several source paths, in order of preference, or `default`
+
+    `transform` is only applied to a value that was found.
+    """
+
+    def __init__(self, *paths, default=None, transform=None):
+        self.paths = [tuple(path.split(".")) for path in paths]
+        self.default = default
+        self.transform = transform
+
+
+class Computed:
+    """Value of function(*values of the given fields)"""
+
+    def __init__(self, function, *fields):
+        self.function = function
+        self.fields = fields
+
+
+def stripped(value):
+    """Strip surrounding whitespace from strings; anything else is returned unchanged"""
+    return value.strip() if isinstance(value, str) else value
+
+
+def full_address(address, city):
+    return f"{address}, {city}" if address and city else city or address
+
+
+# Raw Booking.com search result -> hotel record, as returned by the API and printed by the CLI
+HOTEL_FIELDS = {
+    "id": Field("basicPropertyData.id"),
+    "name": Field("displayName.text", "No name available"),
+    "location": {
+        "address": Field("basicPropertyData.location.address", ""),
+        "city": Field("basicPropertyData.location.city", ""),
+        "full_address": Computed(
+            full_address,
+            Field("basicPropertyData.location.address", ""),
+            Field("basicPropertyData.location.city", ""),
+        ),
+    },
+    "star_rating": Field("basicPropertyData.starRating.value", 0),
+    "guest_rating": {
+        "score": Field("basicPropertyData.reviewScore.score", 0),
+        "review_count": Field("basicPropertyData.reviewScore.reviewCount", 0),
+        "text": Field("basicPropertyData.reviewScore.totalScoreTextTag.translation", ""),
+    },
+    "pricing": {
+        "total_price": Field("priceDisplayInfoIrene.displayPrice.amountPerStay.amount"),
+        "currency": Field("priceDisplayInfoIrene.displayPrice.amountPerStay.currency"),
+        "price_per_night": Field("priceDisplayInfoIrene.averagePricePerNight.amount"),
+        "price_per_night_unformatted": Field("priceDisplayInfoIrene.averagePricePerNight.amountUnformatted"),
+    },
+    "meal_plan": Field("mealPlanIncluded.text", "", transform=stripped),
+    # Main photo URL, in order of preference; the "image_url" transform turns it into an absolute URL
+    "image_url": FirstOf(
+        "basicPropertyData.photos.main.highResJpegUrl.relativeUrl",
+        "basicPropertyData.photos.main.highResUrl.relativeUrl",
+        "basicPropertyData.photos.main.lowResJpegUrl.relativeUrl",
+        "basicPropertyData.photos.main.lowResUrl.relativeUrl",
+        transform="image_url",
+    ),
+}
+
+
+class _Compiler:
+    """Generates the source of one extractor function from a field map"""
+
+    def __init__(self, transforms):
+        self.transforms = transforms
+        self.namespace = {}
+        self.lines = []
+        # Source path prefix -> local holding that (possibly empty) object
+        self.objects = {(): "record"}
+        # (kind, spec identity) -> local holding the extracted value, so repeated fields are read once
+        self.values = {}
+
+    def constant(self, value):
+        """Source expression for a default value"""
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return repr(value)
+        name = f"_const{len(self.namespace)}"
+        self.namespace[name] = value
+        return name
+
+    def function(self, function):
+        if isinstance(function, str):
+            if function not in self.transforms:
+                raise ValueError(f"No transform named {function!r} was given")
+            function = self.transforms[function]
+        name = f"_fn{len(self.namespace)}"
+        self.namespace[name] = function
+        return name
+
+    def local(self, expression):
+        name = f"v{len(self.lines)}"
+        self.lines.append(f"    {name} = {expression}")
+        return name
+
+    def object(self, path):
+        """Local holding the object at path, {} if anything on the way is missing or null"""
+        if path not in self.objects:
+            parent = self.object(path[:-1])
+            self.objects[path] = self.local(f"{parent}.get({path[-1]!r}) or {{}}")
+        return self.objects[path]
+
+    def lookup(self, path, default):
+        if default is None:
+            return f"{self.object(path[:-1])}.get({path[-1]!r})"
+        return f"{self.object(path[:-1])}.get({path[-1]!r}, {self.constant(default)})"
+
+    def lazy_lookup(self, path, start):
+        """Expression for the value at path, only materializing objects up to path[:start] as locals"""
+        expression = self.object(path[:start])
+        for key in path[start:-1]:
+            expression = f"({expression}.get({key!r}) or {{}})"
+        return f"{expression}.get({path[-1]!r})"
+
+    def value(self, spec):
+        """Local holding the value of one field spec"""
+        if isinstance(spec, Field):
+            key = ("field", spec.path, repr(spec.default), spec.transform)
+        elif isinstance(spec, FirstOf):
+            key = ("first", tuple(spec.paths), repr(spec.default), spec.transform)
+        else:
+            key = ("computed", id(spec))
+        if key in self.values:
+            return self.values[key]
+
+        if isinstance(spec, Field):
+            value = self.local(self.lookup(spec.path, spec.default))
+            if spec.transform is not None:
+                value = self.local(f"{self.function(spec.transform)}({value})")
+        elif isinstance(spec, FirstOf):
+            # Objects shared by all candidates are looked up once; the rest only until a value is found
+            shared = 0
+            while all(len(path) > shared + 1 and path[shared] == spec.paths[0][shared] for path in spec.paths):
+                shared += 1
+            candidates = " or ".join(self.lazy_lookup(path, shared) for path in spec.paths)
+            value = self.local(candidates)
+            found = f"{self.function(spec.transform)}({value})" if spec.transform is not None else value
+            value = self.local(f"{found} if {value} else {self.constant(spec.default)}")
+        elif isinstance(spec, Computed):
+            arguments = ", ".join(self.value(field) for field in spec.fields)
+            value = self.local(f"{self.function(spec.function)}({arguments})")
+        else:
+            raise TypeError(f"Unsupported field spec {spec!r}")
+        self.values[key] = value
+        return value
+
+    def record(self, fields, indent="    "):
+        """Source of the dict literal built from a (nested) field map"""
+        items = []
+        for name, spec in fields.items():
+            value = self.record(spec, indent + "    ") if isinstance(spec, dict) else self.value(spec)
+            items.append(f"{indent}    {name!r}: {value},")
+        return "{\n" + "\n".join(items) + f"\n{indent}}}"
+
+
+def compile_extractor(fields, transforms=None, name="extract"):
+    """Compile a field map into a function(record) -> dict
+
+    `transforms` maps the transform names used in the map to callables. The generated
+    source is kept on the function as `__source__`.
+    """
+    if not name.isidentifier() or keyword.iskeyword(name):
+        raise ValueError(f"{name!r} is not a valid function name")
+    compiler = _Compiler(transforms or {})
+    result = compiler.record(fields)
+    # Transforms and constants are bound as default arguments, so they are read as fast locals
+    bound = "".join(f", {name}={name}" for name in compiler.namespace)
+    source = f"def {name}(record{bound}):\n" + "\n".join(compiler.lines) + f"\n    return {result}\n"
+    namespace = dict(compiler.namespace)
+    exec(compile(source, f"<extractor {name}>", "exec"), namespace)
+    function = namespace[name]
+    function.__source__ = source
+    function.__doc__ = "Extract one record (generated by extractor.compile_extractor)"
+    return function
@@ -0,0 +1,68 @@
+import json
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON encoding for API responses. orjson is used when it is installed and the stdlib encoder
+# otherwise; JSON_ENCODER=json forces the stdlib. Both write compact UTF-8 with keys in
+# insertion order, so responses look the same whichever one is active.
+
+JSON_ENCODER = os.environ.get("JSON_ENCODER", "orjson" if orjson else "json")
+if JSON_ENCODER not in ("orjson", "json"):
+    raise ValueError(f"JSON_ENCODER must be orjson or json, not {JSON_ENCODER!r}")
+if JSON_ENCODER == "orjson" and orjson is None:
+    raise ImportError("JSON_ENCODER=orjson but orjson is not installed")
+
+# Types neither encoder handles natively (dates, decimals, ...) are encoded the way Flask does
+_default = DefaultJSONProvider.default
+
+if JSON_ENCODER == "orjson":
+    def dumps(obj):
+        """Encode obj as compact JSON bytes"""
+        return orjson.dumps(obj, default=_default)
+
+    loads = orjson.loads
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_default)
+
+    def dumps(obj):
+        """Encode obj as compact JSON bytes"""
+        return _encoder.encode(obj).encode()
+
+    loads = json.loads
+
+
+def splice(head, key, fragments):
+    """Add a JSON array assembled from already encoded `fragments` to the encoded object `head` under `key`
+
+    Lets a response reuse stored encodings of its items instead of encoding them again.
+    """
+    prefix = head[:-1] + (b"," if len(head) > 2 else b"") + dumps(key) + b":["
+    if not fragments:
+        return prefix + b"]}"
+    # Fold the prefix and suffix into the end fragments so the body is built in one join
+    parts = list(fragments)
+    parts[0] = prefix + parts[0]
+    parts[-1] = parts[-1] + b"]}"
+    return b",".join(parts)
+
+
+def embed(head, key, encoded):
+    """Add the already encoded JSON value `encoded` to the encoded object `head` under `key`"""
+    return head[:-1] + (b"," if len(head) > 2 else b"") + dumps(key) + b":" + encoded + b"}"
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that makes jsonify() use the fast encoder"""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
@@ -0,0 +1,28 @@
+import multiprocessing
+import os
+import tempfile
+
+# Production server: gunicorn -c gunicorn.conf.py app:app
+#
+# Pre-forked worker processes, each serving requests from a pool of threads. The app is
+# imported once in the master before the fork (preload_app), so workers start with its
+# modules, compiled extractor and caches already set up, and share memory pages with the
+# master. Search results are shared between the workers through SHARED_CACHE_DB.
+
+bind = os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+workers = int(os.environ.get("WEB_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("WEB_THREADS", 8))
+worker_class = "gthread"
+preload_app = True
+# Searches wait on Booking.com, retries and backoff included
+timeout = int(os.environ.get("WEB_TIMEOUT", 120))
+accesslog = os.environ.get("ACCESS_LOG", "-") or None
+
+# Read when the app is preloaded, so every worker opens the same shared cache
+os.environ.setdefault("SHARED_CACHE_DB", os.path.join(tempfile.gettempdir(), "bookingdotcom-shared-cache.db"))
+
+
+def post_fork(server, worker):
+    # The limits on calls to Booking.com are for the whole server, not for each worker
+    import upstream
+    upstream.split_limits(workers)
@@ -0,0 +1,163 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from fast_json import dumps, loads
+
+# Columnar view of a projected result set. The hotel dicts are kept for output; the fields
+# they are filtered and sorted on are copied once into NumPy arrays so every later query
+# is a handful of vectorized operations, whatever the number of hotels. Each hotel is also
+# JSON-encoded once, so responses built from the table only join stored bytes.
+
+# API sort keys; each one is also the name of the HotelTable column it orders by
+SORT_KEYS = ("price", "stars", "score", "reviews")
+# Filter combinations whose matching rows are remembered per table (re-sorting and paging reuse them)
+MASK_CACHE_SIZE = 16
+
+
+def parse_sort(value):
+    """Parse "price,-score" into (("price", False), ("score", True)); raises ValueError on unknown keys"""
+    if not value:
+        return ()
+    sort = []
+    for part in value.split(",") if isinstance(value, str) else value:
+        part = part.strip()
+        descending = part.startswith("-")
+        key = part.lstrip("+-")
+        if key not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key {key!r}; use one of {', '.join(SORT_KEYS)}")
+        sort.append((key, descending))
+    return tuple(sort)
+
+
+def format_sort(sort):
+    """Inverse of parse_sort"""
+    return ",".join(("-" if descending else "") + key for key, descending in sort) or None
+
+
+class HotelTable:
+    """Projected hotels with NumPy columns for price, stars, review score and review count
+
+    Missing prices are NaN; missing stars, scores and review counts are 0, matching the
+    `or 0` handling of the per-hotel filters. Tables are immutable once built, so the sort
+    orders and filter results computed for one query are kept and reused by the next.
+    """
+
+    def __init__(self, hotels, encoded=None):
+        self.hotels = hotels
+        self.encoded = encoded if encoded is not None else [dumps(hotel) for hotel in hotels]
+        # Content hash of the encoded hotels: the same results get the same digest whichever fetch built them
+        digest = hashlib.blake2b(digest_size=16)
+        for fragment in self.encoded:
+            digest.update(fragment)
+            digest.update(b"\n")
+        self.digest = digest.digest()
+        self.ids = [hotel["id"] for hotel in hotels]
+        self.names = [hotel["name"] for hotel in hotels]
+        self.price = np.array([hotel["pricing"]["price_per_night_unformatted"] for hotel in hotels], dtype=np.float64)
+        self.stars = np.array([hotel["star_rating"] or 0 for hotel in hotels], dtype=np.float64)
+        self.score = np.array([hotel["guest_rating"]["score"] or 0 for hotel in hotels], dtype=np.float64)
+        self.reviews = np.array([hotel["guest_rating"]["review_count"] or 0 for hotel in hotels], dtype=np.int64)
+        # Booking.com prices a whole search in one currency
+        currencies = (hotel["pricing"].get("currency") for hotel in hotels)
+        self.currency = next((currency for currency in currencies if currency), None)
+        self._orders = {}
+        self._fingerprints = None
+        self._matches = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_encoded(cls, encoded):
+        """Rebuild a table from the `encoded` list of another one (e.g. read back from a shared cache)"""
+        return cls([loads(fragment) for fragment in encoded], encoded)
+
+    def __len__(self):
+        return len(self.hotels)
+
+    @property
+    def nbytes(self):
+        columns = self.price.nbytes + self.stars.nbytes + self.score.nbytes + self.reviews.nbytes
+        return columns + sum(len(fragment) for fragment in self.encoded)
+
+    def fingerprints(self):
+        """64-bit content hash of each hotel's encoding, computed on first use"""
+        if self._fingerprints is None:
+            self._fingerprints = [
+                int.from_bytes(hashlib.blake2b(fragment, digest_size=8).digest(), "big") for fragment in self.encoded
+            ]
+        return self._fingerprints
+
+    def mask(self, max_price=None, min_price=None, min_stars=None, min_reviews=None, min_score=None):
+        """Boolean array of the hotels matching every given filter"""
+        keep = np.ones(len(self.hotels), dtype=bool)
+        if max_price:
+            # Hotels without a price are kept, as in app.filter_hotels
+            keep &= ~(self.price > max_price)
+        if min_price:
+            keep &= self.price >= min_price
+        if min_stars:
+            keep &= self.stars >= min_stars
+        if min_reviews:
+            keep &= self.reviews >= min_reviews
+        if min_score:
+            keep &= self.score >= min_score
+        return keep
+
+    def matching(self, max_price=None, min_price=None, min_stars=None, min_reviews=None, min_score=None):
+        """Boolean mask of the matching rows and their count, remembered per filter combination"""
+        filters = (max_price, min_price, min_stars, min_reviews, min_score)
+        with self._lock:
+            cached = self._matches.get(filters)
+            if cached is not None:
+                self._matches.move_to_end(filters)
+                return cached
+        keep = self.mask(*filters)
+        cached = (keep, int(np.count_nonzero(keep)))
+        with self._lock:
+            self._matches[filters] = cached
+            if len(self._matches) > MASK_CACHE_SIZE:
+                self._matches.popitem(last=False)
+        return cached
+
+    def sort_order(self, sort):
+        """All row indices ordered by `sort` ((key, descending) pairs), built on first use
+
+        Ties keep their upstream order. Missing prices sort last in either direction.
+        """
+        order = self._orders.get(sort)
+        if order is None:
+            columns = []
+            for key, descending in sort:
+                column = getattr(self, key)
+                columns.append(-column if descending else column)
+            # lexsort treats its last key as the primary one
+            order = np.lexsort(columns[::-1])
+            self._orders[sort] = order
+        return order
+
+    def order(self, keep, sort, limit=None):
+        """Indices of the rows in `keep`, ordered by `sort`, first `limit` only"""
+        if not sort:
+            return np.flatnonzero(keep)[:limit]
+        # Walk the prebuilt order and keep the matching rows: no sort per query
+        order = self.sort_order(tuple(sort))
+        return order[keep[order]][:limit]
+
+    def select(self, max_price=None, min_price=None, min_stars=None, min_reviews=None, min_score=None,
+               sort=(), limit=None, offset=0):
+        """Row indices of the matching hotels in the requested order, in [offset, offset + limit), and the total"""
+        keep, total = self.matching(max_price, min_price, min_stars, min_reviews, min_score)
+        end = offset + limit if limit is not None else None
+        return self.order(keep, sort, end)[offset:].tolist(), total
+
+    def query(self, *args, **kwargs):
+        """Like select, but returns the hotels themselves"""
+        indices, total = self.select(*args, **kwargs)
+        return [self.hotels[index] for index in indices], total
+
+    def query_encoded(self, *args, **kwargs):
+        """Like select, but returns each hotel's stored JSON encoding"""
+        indices, total = self.select(*args, **kwargs)
+        return [self.encoded[index] for index in indices], total
@@ -0,0 +1,135 @@
+import asyncio
+import io
+import mimetypes
+import os
+import tempfile
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+import upstream
+from disk_cache import DiskCache
+from singleflight import SingleFlight
+
+# Hotel photos for the /img proxy: fetched once from Booking.com's CDN, optionally scaled
+# down to a thumbnail width, and kept in an on-disk LRU cache. Without Pillow, photos are
+# proxied and cached at their original size.
+
+# Where photos are fetched from; point it at a local server to run without the CDN
+IMAGE_ORIGIN = os.environ.get("IMAGE_ORIGIN", "https://cf.bstatic.com").rstrip("/")
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "bookingdotcom-images"))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Seconds browsers may reuse a proxied photo; the CDN paths are signed and never change content
+IMAGE_MAX_AGE = int(os.environ.get("IMAGE_MAX_AGE", 7 * 24 * 3600))
+# When set (e.g. http://localhost:5000/img), search results link to photos through the proxy at this width
+IMAGE_PROXY_URL = os.environ.get("IMAGE_PROXY_URL", "").rstrip("/")
+IMAGE_PROXY_WIDTH = int(os.environ.get("IMAGE_PROXY_WIDTH", 400))
+
+# Widths photos are resized to; other widths are rounded up, so few variants of a photo are cached
+THUMBNAIL_WIDTHS = (200, 400, 800)
+# Only photo paths are proxied, so /img cannot be used to fetch anything else from the origin
+ALLOWED_PREFIX = "xdata/images/"
+JPEG_QUALITY = 85
+
+image_cache = DiskCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES)
+# Concurrent requests for the same photo and width share one fetch and resize
+image_flight = SingleFlight(upstream.get_loop)
+
+
+class ImageError(Exception):
+    """A photo could not be served; `status` is the HTTP status to answer with"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def is_allowed(path):
+    """True if path (relative, as captured by the /img route) names a photo that may be proxied"""
+    return path.startswith(ALLOWED_PREFIX) and ".." not in path.split("/")
+
+
+def thumbnail_width(value):
+    """Parse the w parameter into one of THUMBNAIL_WIDTHS, or None for the original; raises ValueError"""
+    if value in (None, ""):
+        return None
+    width = int(value)
+    if width <= 0:
+        raise ValueError("w must be a positive number of pixels")
+    for candidate in THUMBNAIL_WIDTHS:
+        if width <= candidate:
+            return candidate
+    # Wider than any thumbnail: the original is the best there is
+    return None
+
+
+def proxied_url(relative_url, width=IMAGE_PROXY_WIDTH):
+    """URL of a CDN photo (path and query relative to the CDN) through IMAGE_PROXY_URL at `width`"""
+    separator = "&" if "?" in relative_url else "?"
+    return f"{IMAGE_PROXY_URL}{relative_url}{separator}w={width}"
+
+
+def content_type(path):
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def resize(data, width):
+    """Scale an encoded image down to `width` pixels wide, keeping its aspect ratio and format"""
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width <= width:
+            return data
+        image_format = image.format
+        # thumbnail() lets JPEG decode at a reduced scale, much faster than a full decode and resize
+        image.thumbnail((width, image.height), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, format=image_format, quality=JPEG_QUALITY)
+        return output.getvalue()
+
+
+async def get_image(path, query, width=None):
+    """Return (bytes, content type) of a photo at a thumbnail width (None for the original)
+
+    Served from the disk cache when possible; otherwise fetched from IMAGE_ORIGIN once,
+    however many requests for it arrive at the same time. Raises ImageError.
+    """
+    if Image is None:
+        width = None
+    key = _cache_key(path, query, width)
+    data = image_cache.get(key)
+    if data is None:
+        data = await image_flight.do(key, lambda: _load(path, query, width))
+    return data, content_type(path)
+
+
+def _cache_key(path, query, width):
+    return f"{path}?{query}|{width or ''}"
+
+
+async def _load(path, query, width):
+    """Fetch (or reuse the cached original of) a photo and resize it, caching both; runs on the upstream loop"""
+    original = image_cache.get(_cache_key(path, query, None)) if width else None
+    if original is None:
+        original = await _fetch(path, query)
+        await asyncio.to_thread(image_cache.set, _cache_key(path, query, None), original)
+    if width is None:
+        return original
+    # Decoding and encoding are CPU-bound; keep them off the event loop
+    resized = await asyncio.to_thread(resize, original, width)
+    await asyncio.to_thread(image_cache.set, _cache_key(path, query, width), resized)
+    return resized
+
+
+async def _fetch(path, query):
+    url = f"{IMAGE_ORIGIN}/{path}" + (f"?{query}" if query else "")
+    try:
+        response = await upstream.get(url)
+    except Exception as e:
+        raise ImageError(502, f"Image request failed: {e}")
+    if response.status_code == 404:
+        raise ImageError(404, "Image not found")
+    if response.status_code != 200:
+        raise ImageError(502, f"Image request failed with status {response.status_code}")
+    return response.content
@@ -0,0 +1,159 @@
+import asyncio
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+# Searches run in the background: submitting one returns a job id at once, and the client
+# polls for the outcome instead of holding a connection (and a server thread) open for the
+# whole upstream latency.
+
+# Jobs run at once; each one is a coroutine on the upstream loop, so they cost no threads
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 8))
+# Jobs allowed to wait for a worker before new ones are refused
+JOB_MAX_QUEUED = int(os.environ.get("JOB_MAX_QUEUED", 1000))
+# Seconds a finished job can still be fetched; its results only as long as the result cache keeps them
+JOB_RETAIN_SECONDS = float(os.environ.get("JOB_RETAIN_SECONDS", 600))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    """A job was refused because JOB_MAX_QUEUED jobs are already waiting"""
+
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat(timespec='milliseconds') if seconds else None
+
+
+class Job:
+    """One submitted search; `result` is whatever the run function returned"""
+
+    def __init__(self, params, request):
+        self.id = secrets.token_urlsafe(12)
+        self.params = params
+        # The parameters as submitted, enough for another process to describe or redo the job
+        self.request = request
+        self.status = QUEUED
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.result = None
+
+    @property
+    def finished(self):
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self):
+        """Status of the job, without its result"""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "submitted_at": _timestamp(self.submitted_at),
+            "started_at": _timestamp(self.started_at),
+            "finished_at": _timestamp(self.finished_at),
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """FIFO queue of jobs drained by at most `workers` coroutines on the loop returned by get_loop
+
+    `run(params)` is awaited for each job. `on_change(job)`, if given, is called from the
+    worker whenever a job starts or finishes.
+    """
+
+    def __init__(self, run, get_loop, workers=JOB_WORKERS, max_queued=JOB_MAX_QUEUED,
+                 retain_seconds=JOB_RETAIN_SECONDS, on_change=None):
+        self._run = run
+        self._get_loop = get_loop
+        self.workers = max(int(workers), 1)
+        self.max_queued = max_queued
+        self.retain_seconds = retain_seconds
+        self._on_change = on_change
+        self._jobs = OrderedDict()
+        self._pending = deque()
+        # Finished jobs in the order they finished, so the oldest are expired first
+        self._finished = deque()
+        self._active = 0
+        self._running = 0
+        self._lock = threading.Lock()
+        self._counters = {"submitted": 0, "succeeded": 0, "failed": 0, "rejected": 0}
+
+    def submit(self, params, request=None):
+        """Queue a job and return it; raises JobQueueFull when the queue is at max_queued"""
+        with self._lock:
+            self._expire()
+            if len(self._pending) >= self.max_queued:
+                self._counters["rejected"] += 1
+                raise JobQueueFull(f"{len(self._pending)} jobs are already waiting")
+            job = Job(params, request)
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._counters["submitted"] += 1
+            start_worker = self._active < self.workers
+            if start_worker:
+                self._active += 1
+        if start_worker:
+            asyncio.run_coroutine_threadsafe(self._drain(), self._get_loop())
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counters,
+                "queued": len(self._pending),
+                "running": self._running,
+                "workers": self.workers,
+                "utilization": round(self._running / self.workers, 3),
+                "retained": len(self._jobs),
+            }
+
+    async def _drain(self):
+        """Worker: run queued jobs one after another until the queue is empty"""
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._active -= 1
+                    return
+                job = self._pending.popleft()
+                job.status = RUNNING
+                job.started_at = time.time()
+                self._running += 1
+            self._changed(job)
+            try:
+                result, error, status = await self._run(job.params), None, SUCCEEDED
+            except Exception as e:
+                result, error, status = None, str(e), FAILED
+            with self._lock:
+                job.result = result
+                job.error = error
+                job.finished_at = time.time()
+                # Last, so whoever sees the job finished also sees when and how
+                job.status = status
+                self._running -= 1
+                self._counters[status] += 1
+                self._finished.append(job)
+                self._expire()
+            self._changed(job)
+
+    def _changed(self, job):
+        if self._on_change is not None:
+            self._on_change(job)
+
+    def _expire(self):
+        """Forget finished jobs past retain_seconds (caller holds the lock)"""
+        deadline = time.time() - self.retain_seconds
+        while self._finished and self._finished[0].finished_at < deadline:
+            del self._jobs[self._finished.popleft().id]
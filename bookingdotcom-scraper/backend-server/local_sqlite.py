@@ -0,0 +1,71 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class LocalConnection:
+    """One SQLite connection per thread and per process, opened in WAL mode on first use
+
+    A connection opened before a fork must not be used by the child, so a new one is opened
+    whenever the process id changes. `schema`, if given, is run on every new connection, so
+    the database file is only created once something uses it.
+    """
+
+    def __init__(self, path, schema=None):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+
+    def get(self):
+        if getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            if self.schema:
+                connection.executescript(self.schema)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+
+class BackgroundWriter:
+    """Runs writes one after another on a thread of its own, in the order they were submitted
+
+    SQLite writes can wait up to the connection timeout for another process's write lock,
+    so code running on an event loop hands them to a writer instead of blocking every task
+    on the loop. Failures are logged. The thread is started on first use in each process.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+
+    def submit(self, write, *args):
+        """Queue write(*args); returns at once"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, args=(self._queue,), name=self.name, daemon=True).start()
+                self._pid = os.getpid()
+            self._queue.put((write, args))
+
+    def flush(self):
+        """Block until everything submitted so far has been written"""
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def _run(self, writes):
+        while True:
+            write, args = writes.get()
+            try:
+                write(*args)
+            except Exception as e:
+                logger.warning(f"{self.name}: background write failed: {e}")
+            finally:
+                writes.task_done()
@@ -0,0 +1,74 @@
+import os
+from datetime import timedelta
+
+import numpy as np
+
+# Summaries of nightly prices across a window of check-in dates, for the /calendar endpoint.
+# Each date's prices are kept as a compact float array; all dates are aggregated at once
+# over a NaN-padded (dates x hotels) matrix.
+
+# Longest window of check-in dates one /calendar request may scan
+CALENDAR_MAX_DAYS = int(os.environ.get("CALENDAR_MAX_DAYS", 62))
+CALENDAR_DEFAULT_DAYS = 30
+# Searches a /calendar request runs at once
+CALENDAR_CONCURRENCY = int(os.environ.get("CALENDAR_CONCURRENCY", 8))
+MAX_NIGHTS = 30
+DEFAULT_PERCENTILES = (10, 25, 75, 90)
+
+
+def checkin_dates(start, end):
+    """Every check-in date from start to end inclusive"""
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def nightly_prices(table, keep):
+    """Per-night prices of the kept rows of a HotelTable, skipping hotels without one"""
+    prices = table.price[keep]
+    return prices[~np.isnan(prices)]
+
+
+def parse_percentiles(value):
+    """Parse "10,25,75,90" into a tuple of percentiles; raises ValueError if any is outside 0-100"""
+    if not value:
+        return DEFAULT_PERCENTILES
+    if isinstance(value, str):
+        value = value.split(",")
+    percentiles = tuple(sorted({float(part) for part in value}))
+    if any(not 0 <= percentile <= 100 for percentile in percentiles):
+        raise ValueError("percentiles must be between 0 and 100")
+    return percentiles
+
+
+def percentile_label(percentile):
+    """p10, p2.5, ..."""
+    return f"p{percentile:g}"
+
+
+def summarize(price_arrays, percentiles=DEFAULT_PERCENTILES):
+    """count, min, median and percentiles for each array of prices, computed in one pass over all dates
+
+    Dates without any price get a count of 0 and None for every statistic.
+    """
+    counts = np.array([len(prices) for prices in price_arrays], dtype=np.int64)
+    width = int(counts.max()) if len(counts) else 0
+    matrix = np.full((len(price_arrays), max(width, 1)), np.nan)
+    for row, prices in enumerate(price_arrays):
+        matrix[row, :len(prices)] = prices
+
+    priced = counts > 0
+    stats = np.full((len(price_arrays), 2 + len(percentiles)), np.nan)
+    if priced.any():
+        rows = matrix[priced]
+        stats[priced, 0] = np.nanmin(rows, axis=1)
+        # Median and the requested percentiles come out of a single partition of each row
+        quantiles = np.nanpercentile(rows, [50, *percentiles], axis=1)
+        stats[priced, 1:] = quantiles.T
+
+    labels = ["min", "median", *(percentile_label(percentile) for percentile in percentiles)]
+    summaries = []
+    for count, values in zip(counts.tolist(), np.round(stats, 2).tolist()):
+        summary = {"count": count}
+        for label, value in zip(labels, values):
+            summary[label] = None if count == 0 else value
+        summaries.append(summary)
+    return summaries
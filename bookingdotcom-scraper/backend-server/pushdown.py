@@ -0,0 +1,74 @@
+import math
+import os
+
+# Translate the API's filter parameters into Booking.com's native `selectedFilters`
+# string so the upstream only returns (roughly) the properties we are going to keep.
+# The local filter loop in app.filter_hotels stays in place as the correctness backstop.
+
+# Set FILTER_PUSHDOWN=0 to always fetch the unfiltered result set
+FILTER_PUSHDOWN = os.environ.get("FILTER_PUSHDOWN", "1") != "0"
+# Booking.com's budget slider step; caps are rounded up to it so nearby prices share a cache entry
+PRICE_STEP = 10
+MAX_STAR_CLASS = 5
+# Booking.com's review score buckets ("Pleasant 6+" ... "Wonderful 9+"), in tenths of a point
+REVIEW_SCORE_BUCKETS = (60, 70, 80, 90)
+
+# (price cap per night, its currency, minimum star class, minimum review score bucket) -- None means "not pushed down"
+NO_PUSHDOWN = (None, None, None, None)
+
+
+def pushdown_filters(max_price=None, min_stars=None, min_score=None, currency=None):
+    """Normalize the filters that have a native Booking.com equivalent
+
+    `currency` is the one Booking.com prices the destination in (see HotelTable.currency);
+    max_price is compared with prices in it locally, so the budget is only pushed down when
+    it is known. min_score is pushed down as the highest review score bucket at or below it;
+    the exact threshold is applied locally. min_reviews and min_price have no upstream
+    equivalent and are always applied locally.
+    """
+    if not FILTER_PUSHDOWN:
+        return NO_PUSHDOWN
+    price_cap = int(math.ceil(max_price / PRICE_STEP) * PRICE_STEP) if max_price and currency else None
+    min_class = int(math.ceil(min_stars)) if min_stars else None
+    if min_class is not None and min_class > MAX_STAR_CLASS:
+        min_class = None
+    score_bucket = None
+    if min_score:
+        buckets = [bucket for bucket in REVIEW_SCORE_BUCKETS if bucket <= min_score * 10]
+        score_bucket = buckets[-1] if buckets else None
+    return (price_cap, currency if price_cap is not None else None, min_class, score_bucket)
+
+
+def selected_filters(pushed):
+    """Render normalized pushdown filters as Booking.com's `selectedFilters` string"""
+    price_cap, currency, min_class, score_bucket = pushed
+    parts = []
+    if price_cap is not None:
+        # Trailing "-1" selects the per-night budget
+        parts.append(f"price={currency}-min-{price_cap}-1")
+    if min_class is not None:
+        parts.extend(f"class={stars}" for stars in range(min_class, MAX_STAR_CLASS + 1))
+    if score_bucket is not None:
+        parts.append(f"review_score={score_bucket}")
+    return ";".join(parts)
+
+
+def filters_input(pushed):
+    """GraphQL `filters` input for a search payload"""
+    selected = selected_filters(pushed)
+    return {"selectedFilters": selected} if selected else {}
+
+
+def covers(cached, wanted):
+    """True if a result set fetched with `cached` filters contains every hotel `wanted` can match"""
+    cached_price, cached_currency, cached_class, cached_score = cached
+    wanted_price, wanted_currency, wanted_class, wanted_score = wanted
+    if cached_price is not None and (
+        wanted_price is None or wanted_currency != cached_currency or wanted_price > cached_price
+    ):
+        return False
+    if cached_class is not None and (wanted_class is None or wanted_class < cached_class):
+        return False
+    if cached_score is not None and (wanted_score is None or wanted_score < cached_score):
+        return False
+    return True
@@ -0,0 +1,181 @@
+import asyncio
+import time
+from collections import deque
+
+# Outcomes of an upstream request, as reported to AdaptiveLimiter.release
+SUCCESS = "success"
+# Told to slow down (403, 429) or overloaded (5xx)
+THROTTLED = "throttled"
+# No response at all (connection error, timeout)
+FAILED = "failed"
+
+
+class RateLimiter:
+    """Per-key request rate limit with a burst allowance (GCRA)
+
+    Callers are spaced 1/rate seconds apart once `burst` requests have gone out back to back.
+    Not thread-safe: use it from a single event loop.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(int(burst), 1)
+        self._tat = {}
+        self._counters = {"acquired": 0, "delayed": 0}
+
+    async def acquire(self, key):
+        """Wait until a request for key is allowed"""
+        self._counters["acquired"] += 1
+        if self.rate <= 0:
+            return
+        now = asyncio.get_running_loop().time()
+        interval = 1 / self.rate
+        # Theoretical arrival time of the next request; up to burst - 1 intervals may be borrowed
+        tat = max(self._tat.get(key, now), now)
+        self._tat[key] = tat + interval
+        delay = tat - (self.burst - 1) * interval - now
+        if delay > 0:
+            self._counters["delayed"] += 1
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        return {**self._counters, "rate": self.rate, "burst": self.burst}
+
+
+class CircuitOpenError(Exception):
+    """A request was refused without being sent because the circuit breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Upstream is unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency window with a circuit breaker, for the requests to one upstream
+
+    At most `window` requests are in flight; the rest wait in FIFO order. Each success widens
+    the window by 1/window (about one slot per window's worth of successes) up to max_window.
+    A throttled or failed request halves it, once per round: requests sent before a cut do not
+    cut again. After `failure_threshold` cuts with no success in between, the breaker opens and
+    requests are refused with CircuitOpenError for `open_seconds`, doubled each time it opens
+    again without a success in between. Then a single probe request is let through; its outcome closes the
+    breaker or opens it again.
+    Not thread-safe: use it from a single event loop (stats() may be read from anywhere).
+    """
+
+    def __init__(self, max_window, min_window=1, failure_threshold=5, open_seconds=30, max_open_seconds=600):
+        self.max_window = max(int(max_window), 1)
+        self.min_window = min(max(int(min_window), 1), self.max_window)
+        self.failure_threshold = max(int(failure_threshold), 1)
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.window = float(self.max_window)
+        self.in_flight = 0
+        self._waiters = deque()
+        # Bumped by every cut; a request only cuts the window if none happened since it was sent
+        self._round = 0
+        self._failures = 0
+        # Times the breaker opened since the last success
+        self._trips = 0
+        self._open_until = None
+        self._probing = False
+        self._counters = {"succeeded": 0, "throttled": 0, "failed": 0, "rejected": 0, "opened": 0}
+
+    async def acquire(self):
+        """Wait for a slot and return a ticket for release(); raises CircuitOpenError while the breaker is open"""
+        probe = False
+        if self._open_until is not None:
+            now = time.monotonic()
+            if self._probing or now < self._open_until:
+                self._counters["rejected"] += 1
+                raise CircuitOpenError(max(self._open_until - now, 1))
+            # Cooled down: this request finds out whether the upstream has recovered
+            self._probing = probe = True
+        if probe or (self.in_flight < int(self.window) and not self._waiters):
+            self.in_flight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                # _wake() takes the slot on the waiter's behalf before resolving it
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self.in_flight -= 1
+                    self._wake()
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                raise
+        return self._round, probe
+
+    def release(self, ticket, outcome):
+        """Free a ticket's slot and adapt to its outcome (SUCCESS, THROTTLED, FAILED, or None for no signal)"""
+        sent_in_round, probe = ticket
+        self.in_flight -= 1
+        if outcome == SUCCESS:
+            self._counters["succeeded"] += 1
+            self.window = min(self.window + 1 / self.window, self.max_window)
+            self._failures = 0
+            if probe:
+                self._probing = False
+                self._open_until = None
+                self._trips = 0
+        elif outcome in (THROTTLED, FAILED):
+            self._counters[outcome] += 1
+            if probe:
+                self._probing = False
+                self._open()
+            elif sent_in_round == self._round:
+                # One burst of rejections is one signal, however many requests it hit
+                self.window = max(self.window / 2, self.min_window)
+                self._round += 1
+                if self._open_until is None:
+                    self._failures += 1
+                    if self._failures >= self.failure_threshold:
+                        self._open()
+        elif probe:
+            # No verdict (e.g. cancelled); the next request probes instead
+            self._probing = False
+        self._wake()
+
+    def is_open(self):
+        """True while requests are being refused"""
+        return self._open_until is not None and (self._probing or time.monotonic() < self._open_until)
+
+    def state(self):
+        if self._open_until is None:
+            return "closed"
+        return "open" if self.is_open() and not self._probing else "half_open"
+
+    def stats(self):
+        retry_after = self._open_until - time.monotonic() if self._open_until is not None else None
+        return {
+            **self._counters,
+            "state": self.state(),
+            "window": round(self.window, 2),
+            "max_window": self.max_window,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "consecutive_failures": self._failures,
+            "retry_after": round(max(retry_after, 0), 1) if retry_after is not None else None,
+        }
+
+    def _open(self):
+        self._trips += 1
+        seconds = min(self.open_seconds * 2 ** (self._trips - 1), self.max_open_seconds)
+        self._open_until = time.monotonic() + seconds
+        self._failures = 0
+        self._counters["opened"] += 1
+        # Nobody queued behind the failures gets through either
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._counters["rejected"] += 1
+                waiter.set_exception(CircuitOpenError(seconds))
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.window):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
@@ -0,0 +1,34 @@
+import base64
+import binascii
+import json
+
+# A result_set_id names one upstream query (destination, dates, occupancy) so a client can
+# re-filter, re-sort and page through its cached result set without resending the query.
+# The id carries the query itself rather than pointing into process memory, so it keeps
+# working across workers and after the cached result set has expired (it is just refetched).
+
+PREFIX = "rs1."
+FIELDS = ("checkin_date", "checkout_date", "location", "dest_id", "adults", "rooms", "children", "dest_type")
+# Ids issued before dest_type was part of the query are for cities
+LEGACY_DEFAULTS = {"dest_type": "city"}
+
+
+def encode_result_set_id(params):
+    """result_set_id for the upstream query of parsed search params"""
+    values = [params[field] for field in FIELDS]
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return PREFIX + base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_result_set_id(result_set_id):
+    """Query parameters named by a result_set_id; raises ValueError if it is malformed"""
+    if not isinstance(result_set_id, str) or not result_set_id.startswith(PREFIX):
+        raise ValueError("Unknown result_set_id format")
+    encoded = result_set_id[len(PREFIX):]
+    try:
+        values = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError("result_set_id could not be decoded")
+    if not isinstance(values, list) or len(values) not in (len(FIELDS), len(FIELDS) - len(LEGACY_DEFAULTS)):
+        raise ValueError("result_set_id could not be decoded")
+    return {**LEGACY_DEFAULTS, **dict(zip(FIELDS, values))}
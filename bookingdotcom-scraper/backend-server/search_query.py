@@ -0,0 +1,298 @@
+import json
+import os
+import re
+import secrets
+from urllib.parse import urlencode
+
+import upstream
+
+# Builds the Booking.com GraphQL search request. The payload is serialized once at import
+# time with placeholder slots; per request only the variable values are encoded and spliced in.
+
+# Booking.com GraphQL search endpoint (overridable to point at a local stand-in, e.g. for benchmarks).
+# The query string of the search results page is appended per request (see search_request).
+GRAPHQL_URL = os.environ.get("BOOKING_GRAPHQL_URL", "https://www.booking.com/dml/graphql")
+SEARCH_PAGE_URL = "https://www.booking.com/searchresults.html"
+
+# Tracking parameters of the web client's session, sent with every search
+SESSION_PARAMS = {
+    "label": "gen173nr-1FCAEoggI46AdIM1gEaLQCiAEBmAExuAEHyAEM2AEB6AEB-AECiAIBqAIDuAK-iPnBBsACAdICJGZmMzBhOGRjLTQ1M2ItNGY0Ny04YmZjLWQyMDFjYTNiZWM1MdgCBeACAQ",
+    "sid": "13b7b29af206a79542e44dfdce841b83",
+    "aid": "304142",
+    "lang": "en-us",
+    "sb": "1",
+    "src_elem": "sb",
+    "src": "index",
+}
+
+# Only the fields read by the hotel projection (extractor.HOTEL_FIELDS) plus pagination.
+# Keeps the operation name the web client uses.
+SEARCH_QUERY = """
+query FullSearch($input: SearchQueryInput!) {
+  searchQueries {
+    search(input: $input) {
+      pagination {
+        nbResultsPerPage
+        nbResultsTotal
+      }
+      results {
+        displayName {
+          text
+        }
+        basicPropertyData {
+          id
+          location {
+            address
+            city
+          }
+          reviewScore: reviews {
+            score: totalScore
+            reviewCount: reviewsCount
+            totalScoreTextTag {
+              translation
+            }
+          }
+          starRating {
+            value
+          }
+          photos {
+            main {
+              highResJpegUrl {
+                relativeUrl
+              }
+              highResUrl {
+                relativeUrl
+              }
+              lowResJpegUrl {
+                relativeUrl
+              }
+              lowResUrl {
+                relativeUrl
+              }
+            }
+          }
+        }
+        priceDisplayInfoIrene {
+          displayPrice {
+            amountPerStay {
+              amount
+              currency
+            }
+          }
+          averagePricePerNight {
+            amount
+            amountUnformatted
+          }
+        }
+        mealPlanIncluded {
+          text
+        }
+      }
+    }
+  }
+}
+"""
+
+# Headers of the web client's search requests. The browser's own identity (user-agent and the
+# sec-ch-ua client hints) comes from the impersonation profile of the session that sends the
+# request, so it always matches the TLS fingerprint; the page view id is generated per request.
+SEARCH_HEADERS = {
+    'accept': '*/*',
+    'apollographql-client-name': 'b-search-web-searchresults_rust',
+    'apollographql-client-version': 'ABJNVZXB',
+    'content-type': 'application/json',
+    'origin': 'https://www.booking.com',
+    'sec-fetch-dest': 'empty',
+    'sec-fetch-mode': 'cors',
+    'sec-fetch-site': 'same-origin',
+    'x-booking-context-action-name': 'searchresults_irene',
+    'x-booking-context-aid': '304142',
+    'x-booking-dml-cluster': 'rust',
+    'x-booking-site-type-id': '2',
+    'x-booking-topic': 'capla_browser_b-search-web-searchresults',
+}
+
+
+def slot(name):
+    """Placeholder value for a variable spliced in at render time"""
+    return f"\0{name}\0"
+
+
+_SLOT_PATTERN = re.compile(r'"\\u0000(\w+)\\u0000"')
+_encode = json.JSONEncoder(separators=(",", ":")).encode
+
+
+class PayloadTemplate:
+    """JSON document serialized once, with `slot()` placeholders filled in per request"""
+
+    def __init__(self, document):
+        parts = _SLOT_PATTERN.split(_encode(document))
+        self._literals = [part.encode() for part in parts[0::2]]
+        self._slots = parts[1::2]
+
+    def render(self, values):
+        """Encode the slot values and splice them between the pre-encoded literals"""
+        literals = self._literals
+        out = [literals[0]]
+        for index, name in enumerate(self._slots):
+            out.append(_encode(values[name]).encode())
+            out.append(literals[index + 1])
+        return b"".join(out)
+
+
+SEARCH_PAYLOAD = PayloadTemplate({
+    "operationName": "FullSearch",
+    "variables": {
+        "input": {
+            "acidCarouselContext": None,
+            "childrenAges": [],
+            "dates": {
+                "checkin": slot("checkin"),
+                "checkout": slot("checkout")
+            },
+            "doAvailabilityCheck": False,
+            "encodedAutocompleteMeta": None,
+            "enableCampaigns": True,
+            "filters": slot("filters"),
+            "flexibleDatesConfig": {
+                "broadDatesCalendar": {
+                    "checkinMonths": [],
+                    "los": [],
+                    "startWeekdays": []
+                },
+                "dateFlexUseCase": "DATE_RANGE",
+                "dateRangeCalendar": {
+                    "checkin": [slot("checkin")],
+                    "checkout": [slot("checkout")]
+                }
+            },
+            "forcedBlocks": None,
+            "location": {
+                "searchString": slot("location"),
+                "destType": slot("dest_type"),
+                "destId": slot("dest_id")
+            },
+            "metaContext": {
+                "metaCampaignId": 0,
+                "externalTotalPrice": None,
+                "feedPrice": None,
+                "hotelCenterAccountId": None,
+                "rateRuleId": None,
+                "dragongateTraceId": None,
+                "pricingProductsTag": None
+            },
+            "nbRooms": slot("rooms"),
+            "nbAdults": slot("adults"),
+            "nbChildren": slot("children"),
+            "showAparthotelAsHotel": True,
+            "needsRoomsMatch": False,
+            "optionalFeatures": {
+                "forceArpExperiments": True,
+                "testProperties": False
+            },
+            "pagination": {
+                "rowsPerPage": slot("rows_per_page"),
+                "offset": slot("offset")
+            },
+            "rawQueryForSession": slot("raw_query"),
+            "referrerBlock": {
+                "blockName": "searchbox"
+            },
+            "sbCalendarOpen": True,
+            "sorters": {
+                "selectedSorter": None,
+                "referenceGeoId": None,
+                "tripTypeIntentId": None
+            },
+            "travelPurpose": 2,
+            "seoThemeIds": [],
+            "useSearchParamsFromSession": True,
+            "merchInput": {
+                "testCampaignIds": []
+            },
+            "webSearchContext": {
+                "reason": "CLIENT_SIDE_UPDATE",
+                "source": "SEARCH_RESULTS",
+                "outcome": "SEARCH_RESULTS"
+            },
+            "clientSideRequestId": slot("request_id")
+        }
+    },
+    "extensions": {},
+    # Whitespace carries no meaning in GraphQL; collapse it to keep the request small
+    "query": " ".join(SEARCH_QUERY.split())
+})
+
+
+def search_page_query(checkin_date, checkout_date, location, dest_id, dest_type, adults, rooms, children):
+    """Query string of the search results page for one query, as the web client builds it"""
+    return urlencode({
+        "ss": location,
+        "efdco": 1,
+        **SESSION_PARAMS,
+        "dest_id": dest_id,
+        "dest_type": dest_type.lower(),
+        "checkin": checkin_date,
+        "checkout": checkout_date,
+        "group_adults": adults,
+        "no_rooms": rooms,
+        "group_children": children,
+    })
+
+
+def new_request_id():
+    """Random id in the format of the web client's page view and request ids"""
+    return secrets.token_hex(8)
+
+
+def build_search_payload(checkin_date, checkout_date, location, dest_id, adults, rooms, children,
+                         filters=None, offset=0, rows_per_page=1000, dest_type="city", request_id=None):
+    """Render the search request body (bytes) for one query"""
+    page_query = search_page_query(checkin_date, checkout_date, location, dest_id, dest_type, adults, rooms, children)
+    return SEARCH_PAYLOAD.render({
+        "checkin": checkin_date,
+        "checkout": checkout_date,
+        "location": location,
+        "dest_id": dest_id,
+        # Autocomplete answers in lower case, the GraphQL enum is upper case
+        "dest_type": dest_type.upper(),
+        "adults": adults,
+        "rooms": rooms,
+        "children": children,
+        "filters": filters or {},
+        "offset": offset,
+        "rows_per_page": rows_per_page,
+        "raw_query": f"/searchresults.html?{page_query}",
+        "request_id": request_id or new_request_id()
+    })
+
+
+def search_request(checkin_date, checkout_date, location, dest_id, adults, rooms, children,
+                   filters=None, offset=0, rows_per_page=1000, dest_type="city"):
+    """(url, headers, body) of the search request for one query
+
+    The URL and referer carry the destination and dates of the results page the request
+    appears to come from, as they do in the web client. Every request gets fresh page view
+    and request ids, so no two share a fingerprint.
+    """
+    page_query = search_page_query(checkin_date, checkout_date, location, dest_id, dest_type, adults, rooms, children)
+    separator = "&" if "?" in GRAPHQL_URL else "?"
+    request_id = new_request_id()
+    headers = {**SEARCH_HEADERS, "referer": f"{SEARCH_PAGE_URL}?{page_query}", "x-booking-pageview-id": request_id}
+    payload = build_search_payload(
+        checkin_date, checkout_date, location, dest_id, adults, rooms, children,
+        filters=filters, offset=offset, rows_per_page=rows_per_page, dest_type=dest_type, request_id=request_id
+    )
+    return f"{GRAPHQL_URL}{separator}{page_query}", headers, payload
+
+
+def check_search_response(errors, found):
+    """Raise UpstreamQueryError for a search answered with GraphQL `errors` or without a search block
+
+    Either would otherwise parse as zero hotels and be cached, shared and recorded as a real result.
+    """
+    if errors:
+        messages = [error.get("message") if isinstance(error, dict) else str(error) for error in errors]
+        raise upstream.UpstreamQueryError("; ".join(str(message) for message in messages)[:500])
+    if not found:
+        raise upstream.UpstreamQueryError("the response holds no searchQueries.search block")
@@ -0,0 +1,171 @@
+import random
+import threading
+import time
+
+# Upstream requests are spread over a pool of long-lived sessions, one per browser profile,
+# each with its own TLS fingerprint, connections and cookie jar. When Booking.com starts
+# degrading one fingerprint, traffic moves to the others instead of collapsing for everyone.
+
+# Weight of the newest request in a session's moving averages of latency and errors
+HEALTH_ALPHA = 0.2
+# Error rate at which a session is considered sick and rested
+SICK_ERROR_RATE = 0.5
+# Requests a session must have answered before its error rate is trusted
+MIN_SAMPLES = 3
+
+HEALTHY = "healthy"
+COOLING = "cooling"
+
+
+class PooledSession:
+    """One pool member: a browser profile, its current session, and the health of its recent requests"""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.session = None
+        # Moving averages; latency is unknown until the first request
+        self.latency = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.in_flight = 0
+        self.cooldowns = 0
+        self.cool_until = 0.0
+        self.counters = {"requests": 0, "errors": 0, "cooldowns": 0}
+
+    def cost(self):
+        """Expected time to a good response: latency, queued behind requests in flight, inflated by the error rate"""
+        # An untried session costs nothing, so each one gets tried early on
+        latency = self.latency or 0.0
+        return latency * (1 + self.in_flight) / max(1 - self.error_rate, 0.05)
+
+
+class Lease:
+    """A pool member and the session object lent out with it"""
+
+    __slots__ = ("member", "session")
+
+    def __init__(self, member, session):
+        self.member = member
+        self.session = session
+
+
+class SessionPool:
+    """Lends out the healthiest of several sessions, resting sick ones and replacing their sessions
+
+    `factory(profile)` creates a session impersonating a browser profile. Each request is
+    sent on the member with the lowest expected cost (see PooledSession.cost) that is not
+    cooling down. A member whose error rate reaches SICK_ERROR_RATE rests for `cooldown`
+    seconds, doubling each time it falls sick again (up to `cooldown_max`), and comes back
+    with a fresh session, so also with fresh connections and cookies. If every member is
+    resting, the one due back first is used.
+
+    Call `record()` once the outcome of a request is known, and `release()` once its body
+    has been read.
+    """
+
+    def __init__(self, profiles, factory, cooldown=60, cooldown_max=900, close_session=None):
+        if not profiles:
+            raise ValueError("at least one profile is required")
+        self.members = [PooledSession(profile) for profile in profiles]
+        self.cooldown = cooldown
+        self.cooldown_max = cooldown_max
+        self._factory = factory
+        self._close_session = close_session
+        # Sessions replaced while requests were still using them, and how many
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Lease the session of the member expected to answer best right now"""
+        now = time.monotonic()
+        with self._lock:
+            ready = [member for member in self.members if member.cool_until <= now]
+            if ready:
+                lowest = min(member.cost() for member in ready)
+                # Ties (e.g. untried members) are broken at random, so load spreads between them
+                member = random.choice([member for member in ready if member.cost() == lowest])
+            else:
+                member = min(self.members, key=lambda member: member.cool_until)
+            if member.session is None:
+                member.session = self._factory(member.profile)
+            member.in_flight += 1
+            member.counters["requests"] += 1
+            return Lease(member, member.session)
+
+    def record(self, lease, latency, ok):
+        """Fold a request's latency (seconds) and outcome into its member's health"""
+        member = lease.member
+        retired = None
+        with self._lock:
+            member.latency = latency if member.latency is None else (
+                (1 - HEALTH_ALPHA) * member.latency + HEALTH_ALPHA * latency
+            )
+            member.error_rate = (1 - HEALTH_ALPHA) * member.error_rate + HEALTH_ALPHA * (0.0 if ok else 1.0)
+            member.samples += 1
+            if ok:
+                member.cooldowns = 0
+            else:
+                member.counters["errors"] += 1
+                if (member.samples >= MIN_SAMPLES and member.error_rate >= SICK_ERROR_RATE
+                        and lease.session is member.session):
+                    retired = self._rest(member)
+        if retired is not None:
+            self._close(retired)
+
+    def release(self, lease):
+        """Return a leased session once its response has been read"""
+        retired = None
+        with self._lock:
+            if lease.session is lease.member.session:
+                lease.member.in_flight -= 1
+            elif lease.session in self._retired:
+                self._retired[lease.session] -= 1
+                if self._retired[lease.session] == 0:
+                    del self._retired[lease.session]
+                    retired = lease.session
+        if retired is not None:
+            self._close(retired)
+
+    def sessions(self):
+        """Every open session, current and retired"""
+        with self._lock:
+            return [member.session for member in self.members if member.session is not None] + list(self._retired)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "profile": member.profile,
+                "state": COOLING if member.cool_until > now else HEALTHY,
+                "latency_ms": round(member.latency * 1000, 1) if member.latency is not None else None,
+                "error_rate": round(member.error_rate, 3),
+                "in_flight": member.in_flight,
+                "cool_for": round(max(member.cool_until - now, 0), 1),
+                **member.counters,
+            } for member in self.members]
+
+    def healthy(self):
+        """Members not cooling down"""
+        now = time.monotonic()
+        with self._lock:
+            return sum(1 for member in self.members if member.cool_until <= now)
+
+    def _rest(self, member):
+        """Start a member's cool-down and detach its session (caller holds the lock); returns a session to close now"""
+        member.cool_until = time.monotonic() + min(self.cooldown * 2 ** member.cooldowns, self.cooldown_max)
+        member.cooldowns += 1
+        member.counters["cooldowns"] += 1
+        # It comes back on probation: one more failure puts it straight back to rest
+        member.error_rate = SICK_ERROR_RATE * (1 - HEALTH_ALPHA)
+        member.samples = MIN_SAMPLES
+        session, member.session = member.session, None
+        # Requests still using the old session (the failed one included) keep it open until they are released
+        if member.in_flight > 0:
+            self._retired[session] = member.in_flight
+            member.in_flight = 0
+            return None
+        return session
+
+    def _close(self, session):
+        if self._close_session is not None:
+            self._close_session(session)
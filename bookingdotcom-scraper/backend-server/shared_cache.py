@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+
+from cache import EXPIRED, FRESH, RESULT_CACHE_STALE_TTL, RESULT_CACHE_TTL, STALE
+from local_sqlite import LocalConnection
+
+# Second-level result cache shared by every worker process of the server: a SQLite database
+# in WAL mode (readers never wait for a writer) that any worker can answer from, so adding
+# workers does not divide the cache hit rate. Each worker keeps its own ResultCache in front
+# of it. Put the file on /dev/shm to keep it in memory.
+
+# Path of the shared database; empty (the default for `python app.py`) keeps caching per process
+SHARED_CACHE_DB = os.environ.get("SHARED_CACHE_DB", "")
+SHARED_CACHE_MAX_BYTES = int(os.environ.get("SHARED_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Share of max_bytes kept by an eviction, so the next few writes do not evict again
+EVICT_TO = 0.9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    group_key TEXT,
+    stored_at REAL NOT NULL,
+    size INTEGER NOT NULL,
+    value BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_group ON results (group_key);
+CREATE INDEX IF NOT EXISTS results_stored_at ON results (stored_at);
+-- Running total of results.size, so a write can tell whether to evict without summing the table
+CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+INSERT OR IGNORE INTO usage (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM results;
+"""
+
+# Drops the oldest entries beyond the newest given number of bytes
+EVICT = """
+DELETE FROM results WHERE key IN (
+    SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY stored_at DESC, key) AS total FROM results)
+    WHERE total > ?
+)
+"""
+
+
+def _encode_key(key):
+    return json.dumps(key, separators=(",", ":"))
+
+
+def _decode_key(text):
+    def tuples(value):
+        return tuple(tuples(item) for item in value) if isinstance(value, list) else value
+    return tuples(json.loads(text))
+
+
+class SharedCache:
+    """Byte strings cached in a SQLite database shared between processes, with TTLs and eviction by size
+
+    Keys are tuples of JSON-encodable values. Ages are measured in wall-clock time so all
+    processes agree on them; freshness follows the same TTL and stale window as ResultCache.
+    Every thread of every process gets its own connection.
+    """
+
+    def __init__(self, path, ttl=RESULT_CACHE_TTL, stale_ttl=RESULT_CACHE_STALE_TTL, max_bytes=SHARED_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self._connections = LocalConnection(path, SCHEMA)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "stale_hits": 0, "expired_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def lookup_any(self, keys, expired=False):
+        """Return (key, value, state, age in seconds) for the first live key, or (None, None, None, None)
+
+        With `expired`, entries past their stale window are returned as EXPIRED.
+        """
+        connection = self._connection()
+        now = time.time()
+        for key in keys:
+            row = connection.execute(
+                "SELECT stored_at, value FROM results WHERE key = ?", (_encode_key(key),)
+            ).fetchone()
+            if row is None:
+                continue
+            age = max(now - row[0], 0)
+            if age > self.ttl + self.stale_ttl:
+                if not expired:
+                    continue
+                state = EXPIRED
+            else:
+                state = STALE if age > self.ttl else FRESH
+            self._count(f"{state}_hits" if state != FRESH else "hits")
+            return key, row[1], state, age
+        self._count("misses")
+        return None, None, None, None
+
+    def group_keys(self, group):
+        """Keys currently stored under a group, whatever their age"""
+        rows = self._connection().execute(
+            "SELECT key FROM results WHERE group_key = ?", (_encode_key(group),)
+        ).fetchall()
+        return [_decode_key(key) for key, in rows]
+
+    def set(self, key, value, group=None):
+        """Store a value, evicting the oldest entries once the database holds more than max_bytes"""
+        encoded = _encode_key(key)
+        with self._connection() as connection:
+            # Taken up front, so the size replaced and the running total are read and written together
+            connection.execute("BEGIN IMMEDIATE")
+            replaced = connection.execute("SELECT size FROM results WHERE key = ?", (encoded,)).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO results (key, group_key, stored_at, size, value) VALUES (?, ?, ?, ?, ?)",
+                (encoded, _encode_key(group) if group is not None else None, time.time(), len(value), value)
+            )
+            connection.execute(
+                "UPDATE usage SET bytes = bytes + ? WHERE id = 0", (len(value) - (replaced[0] if replaced else 0),)
+            )
+            total, = connection.execute("SELECT bytes FROM usage WHERE id = 0").fetchone()
+            if total > self.max_bytes:
+                # Only now is the whole table scanned, and it is brought well under the limit
+                connection.execute(EVICT, (int(self.max_bytes * EVICT_TO),))
+                connection.execute("UPDATE usage SET bytes = (SELECT COALESCE(SUM(size), 0) FROM results) WHERE id = 0")
+                self._count("evictions")
+        self._count("writes")
+
+    def clear(self):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM results")
+            connection.execute("UPDATE usage SET bytes = 0 WHERE id = 0")
+
+    def stats(self):
+        """This process's counters, and the occupancy of the shared database"""
+        entries, size = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            **counters,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "path": self.path,
+        }
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _connection(self):
+        return self._connections.get()
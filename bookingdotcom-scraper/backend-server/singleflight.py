@@ -0,0 +1,110 @@
+import asyncio
+import threading
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one in-flight execution
+
+    The shared call runs on the loop returned by ``get_loop`` so that callers on
+    any event loop (or thread) can join it. Every caller receives the same result
+    or exception, and a cancelled caller never cancels the shared call.
+    """
+
+    def __init__(self, get_loop):
+        self._get_loop = get_loop
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._counters = {"executions": 0, "deduplicated": 0}
+
+    def start(self, key, coro_factory):
+        """Join the in-flight call for key, or start one; returns a concurrent.futures.Future"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._counters["deduplicated"] += 1
+                return future
+            future = asyncio.run_coroutine_threadsafe(coro_factory(), self._get_loop())
+            self._inflight[key] = future
+            self._counters["executions"] += 1
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    async def do(self, key, coro_factory):
+        """Await the shared result for key from any event loop"""
+        future = self.start(key, coro_factory)
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def in_flight(self, key):
+        """True if a call for key is currently running"""
+        with self._lock:
+            return key in self._inflight
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, "in_flight": len(self._inflight)}
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+
+class Broadcast:
+    """Items produced by one shared call, replayed to every reader as they arrive
+
+    The producer appends items and finally calls finish(), with the exception it failed
+    with if any. Readers on any event loop iterate with follow(), from the first item on,
+    however late they join.
+    """
+
+    def __init__(self):
+        self.items = []
+        self._lock = threading.Lock()
+        self._waiters = []
+        self._done = False
+        self._error = None
+
+    def append(self, item):
+        with self._lock:
+            self.items.append(item)
+            self._wake()
+
+    def finish(self, error=None):
+        with self._lock:
+            self._done = True
+            self._error = error
+            self._wake()
+
+    async def follow(self):
+        """Yield every item, waiting for new ones until the producer finishes; re-raises its exception"""
+        index = 0
+        while True:
+            with self._lock:
+                items = self.items[index:]
+                done, error = self._done, self._error
+                waiter = None
+                if not items and not done:
+                    loop = asyncio.get_running_loop()
+                    waiter = loop.create_future()
+                    self._waiters.append((loop, waiter))
+            if items:
+                index += len(items)
+                for item in items:
+                    yield item
+            elif done:
+                if error is not None:
+                    raise error
+                return
+            else:
+                await waiter
+
+    def _wake(self):
+        # Caller holds the lock
+        for loop, waiter in self._waiters:
+            loop.call_soon_threadsafe(_resolve, waiter)
+        self._waiters = []
+
+
+def _resolve(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
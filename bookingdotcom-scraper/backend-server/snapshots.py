@@ -0,0 +1,177 @@
+import logging
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+# Price history: every result set fetched from Booking.com can be kept as one row per hotel
+# in a local SQLite database (WAL mode, so /history reads never wait for the writer).
+# Rows are written in bulk by a background thread, off the request path.
+
+# Path of the SQLite database; empty (the default) keeps no history
+SNAPSHOT_DB = os.environ.get("SNAPSHOT_DB", "")
+HISTORY_DEFAULT_LIMIT = 1000
+HISTORY_MAX_LIMIT = int(os.environ.get("HISTORY_MAX_LIMIT", 10000))
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS price_snapshots (
+    hotel_id INTEGER NOT NULL,
+    query_key TEXT NOT NULL,
+    dest_id INTEGER NOT NULL,
+    checkin TEXT NOT NULL,
+    checkout TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    price REAL,
+    score REAL,
+    stars REAL,
+    PRIMARY KEY (hotel_id, query_key, checkin, checkout, fetched_at)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS price_snapshots_destination
+    ON price_snapshots (dest_id, checkin, checkout, fetched_at);
+"""
+
+INSERT = """
+INSERT OR IGNORE INTO price_snapshots
+    (hotel_id, query_key, dest_id, checkin, checkout, fetched_at, price, score, stars)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def query_key(dest_id, dest_type, adults, rooms, children):
+    """Key of the upstream query a snapshot came from, without its dates: dest_id:dest_type:adults:rooms:children"""
+    return f"{int(dest_id)}:{dest_type}:{int(adults)}:{int(rooms)}:{int(children)}"
+
+
+def parse_query_key(key):
+    """(dest_id, dest_type, adults, rooms, children) of a query_key
+
+    Keys recorded before the destination type was part of them (dest_id:adults:rooms:children) are for cities.
+    """
+    parts = key.split(":")
+    if len(parts) == 4:
+        parts.insert(1, "city")
+    dest_id, dest_type, adults, rooms, children = parts
+    return int(dest_id), dest_type, int(adults), int(rooms), int(children)
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # WAL keeps committed transactions durable across crashes with NORMAL; only a power loss can drop the last ones
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class SnapshotStore:
+    """Appends fetched result sets to the price_snapshots table and serves price series from its indexes
+
+    `record` only queues the rows; a background thread inserts everything queued so far
+    in one transaction. Each reading thread gets its own connection.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        connection = _connect(path)
+        with connection:
+            connection.executescript(SCHEMA)
+        self._writer = connection
+        self._counters = {"result_sets": 0, "rows": 0, "errors": 0}
+        self._start()
+        # Threads and SQLite connections do not survive a fork (e.g. pre-forked server workers)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def record(self, upstream_query, table, fetched_at=None):
+        """Queue one row per hotel of a HotelTable fetched for upstream_query (app.upstream_key)"""
+        checkin, checkout, dest_id, dest_type, adults, rooms, children = upstream_query
+        key = query_key(dest_id, dest_type, adults, rooms, children)
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        rows = [
+            (hotel_id, key, int(dest_id), checkin, checkout, fetched_at,
+             None if math.isnan(price) else price, score, stars)
+            for hotel_id, price, score, stars in zip(
+                table.ids, table.price.tolist(), table.score.tolist(), table.stars.tolist()
+            )
+            if hotel_id is not None
+        ]
+        if rows:
+            self._queue.put(rows)
+
+    def flush(self):
+        """Block until everything queued so far has been written"""
+        self._queue.join()
+
+    def history(self, hotel_id=None, dest_id=None, checkin=None, checkout=None, key=None, since=None,
+                limit=HISTORY_DEFAULT_LIMIT):
+        """Snapshot rows for one hotel or one destination, ordered by hotel, query, stay and fetch time
+
+        Lookups by hotel use the primary key, lookups by destination (and dates) the
+        destination index. Returns tuples of
+        (hotel_id, query_key, checkin, checkout, fetched_at, price, score, stars).
+        """
+        if hotel_id is None and dest_id is None:
+            raise ValueError("hotel_id or dest_id is required")
+        conditions, arguments = [], []
+        for column, value in (("hotel_id", hotel_id), ("dest_id", dest_id), ("query_key", key),
+                              ("checkin", checkin), ("checkout", checkout)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                arguments.append(value)
+        if since is not None:
+            conditions.append("fetched_at >= ?")
+            arguments.append(since)
+        sql = (
+            "SELECT hotel_id, query_key, checkin, checkout, fetched_at, price, score, stars "
+            f"FROM price_snapshots WHERE {' AND '.join(conditions)} "
+            "ORDER BY hotel_id, query_key, checkin, checkout, fetched_at LIMIT ?"
+        )
+        return self._reader().execute(sql, (*arguments, limit)).fetchall()
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, "pending": self._queue.qsize()}
+
+    def _start(self):
+        self._queue = queue.Queue()
+        self._readers = threading.local()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._write_loop, name="snapshot-writer", daemon=True)
+        self._thread.start()
+
+    def _after_fork(self):
+        self._writer = _connect(self.path)
+        self._counters = {"result_sets": 0, "rows": 0, "errors": 0}
+        self._start()
+
+    def _reader(self):
+        connection = getattr(self._readers, "connection", None)
+        if connection is None:
+            connection = self._readers.connection = _connect(self.path)
+        return connection
+
+    def _write_loop(self):
+        while True:
+            batches = [self._queue.get()]
+            # Take whatever else is already waiting, so a burst is written in one transaction
+            while True:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self._writer:
+                    for rows in batches:
+                        self._writer.executemany(INSERT, rows)
+                with self._lock:
+                    self._counters["result_sets"] += len(batches)
+                    self._counters["rows"] += sum(len(rows) for rows in batches)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to write {len(batches)} snapshot batches: {e}")
+                with self._lock:
+                    self._counters["errors"] += 1
+            finally:
+                for _ in batches:
+                    self._queue.task_done()
@@ -0,0 +1,255 @@
+import codecs
+import json
+import re
+
+# Incremental parser for Booking.com GraphQL search responses.
+#
+# Bytes are fed in as they arrive. Objects along the target path are walked key by key,
+# every other value is skipped by scanning for its closing bracket (nothing is built for
+# it), and each element of the target array is decoded on its own once it has arrived.
+
+RESULTS_PATH = ("data", "searchQueries", "search", "results")
+
+# Strings (complete, or a lone quote when one is cut off by the end of the buffer) and brackets
+_STRUCTURE = re.compile(r'"(?:[^"\\]|\\.)*"|[\[\]{}"]')
+_decoder = json.JSONDecoder()
+_SCALAR_END = re.compile(r'[,}\]\s]')
+# Longest run of non-bracket text and complete strings
+_TO_BRACKET = re.compile(r'(?:[^"\[\]{}]++|"(?:[^"\\]++|\\.)*+")*+')
+_NON_WHITESPACE = re.compile(r'[^ \t\n\r]')
+
+_OBJECT, _KEY, _COLON, _SKIP, _ARRAY, _ITEM, _DONE = range(7)
+
+
+class ResultsStreamParser:
+    """Feed response bytes in chunks; get back each item of the target array as it completes
+
+    `extra_keys` are sibling keys of the array (e.g. "pagination") that are decoded whole
+    and exposed in `extras`. Parsing continues past the array until they have been seen.
+    `root_keys` (e.g. "errors") are decoded into `extras` too when they come before the
+    array in the top-level object; parsing does not wait for them.
+    """
+
+    def __init__(self, path=RESULTS_PATH, extra_keys=(), root_keys=()):
+        self.path = path
+        self.extra_keys = set(extra_keys)
+        self.root_keys = set(root_keys)
+        self.extras = {}
+        # Deepest level of the path entered so far
+        self._reached = 0
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._level = 0
+        self._state = _OBJECT
+        self._skip_depth = 0
+        self._skip_start = None
+        self._skip_key = None
+        self._pending_key = None
+        self._retry_at = 0
+
+    @property
+    def found(self):
+        """True once the object holding the target array has been entered (False if a parent was null or missing)"""
+        return self._reached >= len(self.path) - 1
+
+    @property
+    def done(self):
+        """True once the target array (and any extras) has been read; the rest of the body can be ignored"""
+        return self._state == _DONE
+
+    def feed(self, chunk):
+        """Consume a chunk of the body and return the array items completed by it"""
+        if self._state == _DONE:
+            return []
+        self._buf += self._text.decode(chunk)
+        items = []
+        self._run(items)
+        # Drop everything already consumed so the buffer only holds the value in progress
+        keep_from = self._pos if self._skip_start is None else self._skip_start
+        if keep_from:
+            self._buf = self._buf[keep_from:]
+            self._pos -= keep_from
+            if self._skip_start is not None:
+                self._skip_start -= keep_from
+        return items
+
+    def close(self):
+        """Signal the end of the body; raises ValueError if the target array was cut short"""
+        self._retry_at = 0
+        items = self.feed(b"") if self._state != _DONE else []
+        self._buf += self._text.decode(b"", final=True)
+        if self._state != _DONE:
+            raise ValueError("Response ended before " + ".".join(self.path) + " was complete")
+        return items
+
+    def _skip_whitespace(self):
+        """Move to the next non-whitespace character; False if the buffer is exhausted"""
+        match = _NON_WHITESPACE.search(self._buf, self._pos)
+        if match is None:
+            self._pos = len(self._buf)
+            return False
+        self._pos = match.start()
+        return True
+
+    def _run(self, items):
+        while True:
+            if not self._skip_whitespace():
+                return
+            buf, pos, state = self._buf, self._pos, self._state
+            char = buf[pos]
+
+            if state in (_OBJECT, _ARRAY) and len(buf) - pos < 4 and "null".startswith(buf[pos:]):
+                # Possibly a null cut off by the end of the buffer
+                return
+
+            if state == _OBJECT:
+                if buf.startswith("null", pos):
+                    # e.g. "data": null on a GraphQL error -- there are no results
+                    self._pos = pos + 4
+                    self._state = _DONE
+                    return
+                if char != "{":
+                    raise ValueError(f"Expected an object at {'.'.join(self.path[:self._level]) or 'root'}")
+                self._pos = pos + 1
+                self._state = _KEY
+                self._reached = max(self._reached, self._level)
+
+            elif state == _KEY:
+                if char == ",":
+                    self._pos = pos + 1
+                elif char == "}":
+                    # Object on the path closed without containing the target
+                    self._state = _DONE
+                    return
+                elif char != '"':
+                    raise ValueError(f"Expected a key in {'.'.join(self.path[:self._level]) or 'root'}")
+                else:
+                    match = _STRUCTURE.match(buf, pos)
+                    if len(match.group()) == 1:
+                        return
+                    key = json.loads(match.group())
+                    self._pos = match.end()
+                    self._state = _COLON
+                    self._pending_key = key
+
+            elif state == _COLON:
+                if char != ":":
+                    raise ValueError(f"Expected ':' after key {self._pending_key!r}")
+                self._pos = pos + 1
+                key = self._pending_key
+                if key == self.path[self._level]:
+                    self._level += 1
+                    self._state = _ARRAY if self._level == len(self.path) else _OBJECT
+                else:
+                    capture = ((self._level == len(self.path) - 1 and key in self.extra_keys)
+                               or (self._level == 0 and key in self.root_keys))
+                    self._begin_skip(key if capture else None)
+
+            elif state == _SKIP:
+                if not self._skip_value():
+                    return
+                self._finish_skip()
+
+            elif state == _ARRAY:
+                if buf.startswith("null", pos):
+                    self._pos = pos + 4
+                    self._end_array()
+                elif char != "[":
+                    raise ValueError(f"Expected an array at {'.'.join(self.path)}")
+                else:
+                    self._pos = pos + 1
+                    self._state = _ITEM
+
+            elif state == _ITEM:
+                if char == ",":
+                    self._pos = pos + 1
+                elif char == "]":
+                    self._pos = pos + 1
+                    self._end_array()
+                elif len(buf) >= self._retry_at:
+                    # Items are decoded by the C decoder straight from the buffer. When one is not
+                    # complete yet, wait until the partial item has doubled before retrying so
+                    # large items over small chunks stay linear.
+                    try:
+                        item, end = _decoder.raw_decode(buf, pos)
+                    except json.JSONDecodeError:
+                        self._retry_at = pos + 2 * (len(buf) - pos)
+                        return
+                    items.append(item)
+                    self._pos = end
+                    self._retry_at = 0
+                else:
+                    return
+
+            if self._state == _DONE:
+                return
+
+    def _end_array(self):
+        if self.extra_keys.issubset(self.extras):
+            self._state = _DONE
+        else:
+            # Keep walking the parent object for extras that come after the array
+            self._level -= 1
+            self._state = _KEY
+
+    def _begin_skip(self, capture_key):
+        self._state = _SKIP
+        self._skip_depth = 0
+        self._skip_key = capture_key
+        self._skip_start = self._pos if capture_key is not None else None
+
+    def _finish_skip(self):
+        if self._skip_key is not None:
+            self.extras[self._skip_key] = json.loads(self._buf[self._skip_start:self._pos])
+        self._skip_key = None
+        self._skip_start = None
+        self._state = _KEY
+
+    def _skip_value(self):
+        """Advance past one JSON value without building it; False if more input is needed"""
+        buf, pos = self._buf, self._pos
+        if self._skip_depth == 0:
+            char = buf[pos]
+            if char == '"':
+                match = _STRUCTURE.match(buf, pos)
+                if len(match.group()) == 1:
+                    return False
+                self._pos = match.end()
+                return True
+            if char not in "[{":
+                match = _SCALAR_END.search(buf, pos)
+                if match is None:
+                    return False
+                self._pos = match.start()
+                return True
+        depth = self._skip_depth
+        end = len(buf)
+        skip_to_bracket = _TO_BRACKET.match
+        while True:
+            # Jump over everything up to the next bracket outside a string in one regex step
+            pos = skip_to_bracket(buf, pos).end()
+            if pos == end or buf[pos] == '"':
+                # Out of input, possibly inside a string cut off by the end of the buffer
+                self._pos = pos
+                self._skip_depth = depth
+                return False
+            if buf[pos] in "[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    self._pos = pos + 1
+                    self._skip_depth = 0
+                    return True
+            pos += 1
+
+
+def iter_results(chunks, path=RESULTS_PATH):
+    """Yield the items of the target array from an iterable of byte chunks"""
+    parser = ResultsStreamParser(path)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+        if parser.done:
+            return
+    yield from parser.close()
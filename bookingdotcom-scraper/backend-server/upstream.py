@@ -0,0 +1,377 @@
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from curl_cffi import CurlHttpVersion
+from curl_cffi.requests import AsyncSession
+
+from ratelimit import FAILED, SUCCESS, THROTTLED, AdaptiveLimiter, RateLimiter
+from session_pool import SessionPool
+
+# Max concurrent upstream connections kept by each session of the pool
+MAX_CLIENTS = int(os.environ.get("UPSTREAM_MAX_CLIENTS", 20))
+# Seconds before an upstream request is abandoned
+TIMEOUT = float(os.environ.get("UPSTREAM_TIMEOUT", 30))
+# Browser profiles (curl_cffi impersonation targets) of the session pool, one session each
+IMPERSONATE = [profile.strip() for profile in
+               os.environ.get("UPSTREAM_IMPERSONATE", "chrome,chrome_android,safari,firefox").split(",") if profile.strip()]
+# Seconds a sick session first rests before it is tried again with a fresh session; doubles up to the max
+SESSION_COOLDOWN = float(os.environ.get("UPSTREAM_SESSION_COOLDOWN", 60))
+SESSION_COOLDOWN_MAX = float(os.environ.get("UPSTREAM_SESSION_COOLDOWN_MAX", 900))
+# Requests per second allowed to each upstream host (0 disables), after a burst of RATE_BURST
+RATE_LIMIT = float(os.environ.get("UPSTREAM_RATE_LIMIT", 5))
+RATE_BURST = int(os.environ.get("UPSTREAM_RATE_BURST", 5))
+
+# Concurrent search requests at most; the adaptive window moves between 1 and this
+CONCURRENCY = int(os.environ.get("UPSTREAM_CONCURRENCY", 8))
+# Retries of a throttled (403, 429, 5xx) or failed search request, after a jittered exponential backoff
+RETRIES = int(os.environ.get("UPSTREAM_RETRIES", 2))
+BACKOFF_BASE = float(os.environ.get("UPSTREAM_BACKOFF_BASE", 0.5))
+# Longest wait before a retry; a longer Retry-After is not waited for
+BACKOFF_MAX = float(os.environ.get("UPSTREAM_BACKOFF_MAX", 10))
+# Failed requests in a row that open the circuit breaker, and seconds it first stays open
+BREAKER_THRESHOLD = int(os.environ.get("UPSTREAM_BREAKER_THRESHOLD", 5))
+BREAKER_SECONDS = float(os.environ.get("UPSTREAM_BREAKER_SECONDS", 30))
+
+# Fetch priority each browser family sends with a page's fetch() requests; everything else that
+# tells browsers apart (user agent, client hints, accept-language) comes from the session's impersonation
+FETCH_PRIORITY = {"chrome": "u=1, i", "edge": "u=1, i", "safari": "u=3, i", "firefox": "u=4", "tor": "u=4"}
+
+# Statuses Booking.com sends when it wants us to slow down
+THROTTLE_STATUSES = (403, 429)
+
+rate_limiter = RateLimiter(RATE_LIMIT, RATE_BURST)
+search_limiter = AdaptiveLimiter(CONCURRENCY, failure_threshold=BREAKER_THRESHOLD, open_seconds=BREAKER_SECONDS)
+_counters = {"retries": 0}
+
+_lock = threading.Lock()
+_loop = None
+_pool = None
+
+
+def _run_loop(loop):
+    """Run the shared upstream event loop forever (background thread target)"""
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_loop():
+    """Return the background event loop that owns the session pool, starting it if needed"""
+    global _loop
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=_run_loop, args=(loop,), name="upstream-loop", daemon=True)
+                thread.start()
+                _loop = loop
+    return _loop
+
+
+def _new_session(profile):
+    # Each session keeps its own HTTP/2 connections, TLS sessions and cookies warm across searches
+    return AsyncSession(
+        loop=get_loop(),
+        max_clients=MAX_CLIENTS,
+        impersonate=profile,
+        http_version=CurlHttpVersion.V2TLS,
+        timeout=TIMEOUT,
+    )
+
+
+def get_pool():
+    """Return the pool of long-lived sessions, one per IMPERSONATE profile (must be called on the upstream loop)"""
+    global _pool
+    if _pool is None:
+        _pool = SessionPool(
+            IMPERSONATE, _new_session, cooldown=SESSION_COOLDOWN, cooldown_max=SESSION_COOLDOWN_MAX,
+            close_session=lambda session: asyncio.ensure_future(session.close())
+        )
+    return _pool
+
+
+class UpstreamStatusError(Exception):
+    """Booking.com answered a search with a status other than 200, after any retries"""
+
+    def __init__(self, status_code):
+        super().__init__(f"API request failed with status {status_code}")
+        self.status_code = status_code
+
+
+def browser_headers(profile, headers):
+    """Request headers as a browser of the profile's family would send them"""
+    family = next((family for family in FETCH_PRIORITY if profile.startswith(family)), None)
+    if family is None:
+        return headers
+    return {**(headers or {}), "priority": FETCH_PRIORITY[family]}
+
+
+class UpstreamQueryError(UpstreamStatusError):
+    """Booking.com answered a search with 200, but with GraphQL errors or without its search results"""
+
+    def __init__(self, message):
+        Exception.__init__(self, f"API request failed: {message}")
+        self.status_code = 200
+
+
+def outcome(status_code):
+    """How a response status counts for the adaptive limiter"""
+    if status_code in THROTTLE_STATUSES or status_code >= 500:
+        return THROTTLED
+    # Anything else, even a 4xx, shows the upstream is answering normally
+    return SUCCESS
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Seconds to wait before retry number `attempt` (from 0): a random share of an exponential ceiling, or Retry-After"""
+    # Full jitter keeps callers throttled at the same moment from coming back together
+    delay = random.uniform(0, min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX))
+    return max(delay, retry_after or 0)
+
+
+def _retry_after(response):
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        # An HTTP date; the jittered backoff will do
+        return None
+
+
+async def _send(url, send):
+    """Make a search request through the adaptive limiter and the rate limit, retrying throttled attempts
+
+    `send(session, profile)` makes one attempt on a session leased from the pool, so a retry
+    can go out on a healthier one. Attempts answered with 403, 429 or 5xx, or that fail to connect,
+    are retried up to RETRIES times. Returns the last attempt's response and a function that
+    frees its concurrency slot and session, to call once the body has been read. Raises
+    CircuitOpenError while the circuit breaker is open.
+    """
+    attempt = 0
+    while True:
+        ticket = await search_limiter.acquire()
+        pool = get_pool()
+        lease = pool.acquire()
+        started = time.perf_counter()
+        try:
+            await rate_limiter.acquire(urlsplit(url).netloc)
+            # The rate limit wait is not the session's latency
+            started = time.perf_counter()
+            response = await send(lease.session, lease.member.profile)
+        except asyncio.CancelledError:
+            search_limiter.release(ticket, None)
+            pool.release(lease)
+            raise
+        except Exception:
+            search_limiter.release(ticket, FAILED)
+            pool.record(lease, time.perf_counter() - started, False)
+            pool.release(lease)
+            if attempt >= RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+        else:
+            result = outcome(response.status_code)
+            pool.record(lease, time.perf_counter() - started, result == SUCCESS)
+            retry_after = _retry_after(response)
+            if result == SUCCESS or attempt >= RETRIES or (retry_after or 0) > BACKOFF_MAX:
+                def release():
+                    search_limiter.release(ticket, result)
+                    pool.release(lease)
+                return response, release
+            search_limiter.release(ticket, result)
+            await response.aclose()
+            pool.release(lease)
+            delay = backoff_delay(attempt, retry_after)
+        _counters["retries"] += 1
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+def limiter_stats():
+    """Adaptive limiter, circuit breaker and retry state for the health endpoint"""
+    return {**search_limiter.stats(), **_counters}
+
+
+def session_stats():
+    """Health of each session in the pool, for the health endpoint"""
+    return _pool.stats() if _pool is not None else []
+
+
+async def _post(url, headers, data):
+    response, release = await _send(
+        url, lambda session, profile: session.post(url, headers=browser_headers(profile, headers), data=data)
+    )
+    release()
+    return response
+
+
+async def _get(url, headers):
+    # Photos come from the CDN, so their outcome says nothing about a session's standing with Booking.com
+    pool = get_pool()
+    lease = pool.acquire()
+    try:
+        return await lease.session.get(url, headers=headers)
+    finally:
+        pool.release(lease)
+
+
+def run(coro):
+    """Run a coroutine on the upstream loop and block until it finishes (for sync callers)"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
+
+
+async def submit(coro):
+    """Run a coroutine on the upstream loop and await it from any other event loop"""
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, get_loop()))
+
+
+async def post(url, headers=None, data=None):
+    """POST a search through the session pool from any event loop, with retries (see _send)"""
+    return await submit(_post(url, headers, data))
+
+
+async def get(url, headers=None):
+    """GET through the session pool from any event loop
+
+    Not rate limited: meant for static assets such as hotel photos, which a browser
+    would fetch all at once anyway.
+    """
+    return await submit(_get(url, headers))
+
+
+class StreamedResponse:
+    """Upstream response whose body is read chunk by chunk on the caller's event loop"""
+
+    def __init__(self, status_code, queue, future):
+        self.status_code = status_code
+        self._queue = queue
+        self._future = future
+
+    async def aiter_content(self):
+        while True:
+            kind, value = await self._queue.get()
+            if kind == "chunk":
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                return
+
+    async def aclose(self):
+        """Stop reading; an unfinished transfer is aborted on the upstream loop"""
+        self._future.cancel()
+
+
+async def stream(url, headers=None, data=None):
+    """POST a search through the session pool, handing body chunks to the caller as they arrive
+
+    Retried like post() until the status line is in; the body itself is never retried.
+    """
+    caller = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    started = caller.create_future()
+
+    def put(kind, value=None):
+        caller.call_soon_threadsafe(queue.put_nowait, (kind, value))
+
+    def resolve(method, value):
+        caller.call_soon_threadsafe(lambda: started.done() or getattr(started, method)(value))
+
+    async def pump():
+        try:
+            response, release = await _send(
+                url, lambda session, profile: session.post(
+                    url, headers=browser_headers(profile, headers), data=data, stream=True
+                )
+            )
+        except Exception as e:
+            resolve("set_exception", e)
+            return
+        try:
+            resolve("set_result", response.status_code)
+            async for chunk in response.aiter_content():
+                put("chunk", chunk)
+            put("end")
+        except RuntimeError:
+            # The caller's loop has gone away; nobody is reading any more
+            pass
+        except Exception as e:
+            put("error", e)
+        finally:
+            await response.aclose()
+            release()
+
+    future = asyncio.run_coroutine_threadsafe(pump(), get_loop())
+    try:
+        status_code = await started
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    return StreamedResponse(status_code, queue, future)
+
+
+def iterate(aiterator):
+    """Drive an async iterator on the upstream loop and yield its items to a sync caller
+
+    Used to feed streaming HTTP responses, which Flask consumes as plain generators.
+    Closing the generator early cancels the producer.
+    """
+    items = queue.Queue()
+
+    async def pump():
+        try:
+            async for item in aiterator:
+                items.put(("item", item))
+            items.put(("end", None))
+        except Exception as e:
+            items.put(("error", e))
+
+    future = asyncio.run_coroutine_threadsafe(pump(), get_loop())
+    try:
+        while True:
+            kind, value = items.get()
+            if kind == "item":
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                return
+    finally:
+        future.cancel()
+
+
+def split_limits(workers):
+    """Give this process its share of the rate limit and concurrency, when `workers` processes call Booking.com"""
+    rate_limiter.rate = RATE_LIMIT / workers
+    rate_limiter.burst = max(RATE_BURST // workers, 1)
+    search_limiter.max_window = max(CONCURRENCY // workers, 1)
+    search_limiter.window = min(search_limiter.window, search_limiter.max_window)
+
+
+def _after_fork():
+    """The loop thread and the sessions' connections stay with the parent; a forked child starts its own"""
+    global _lock, _loop, _pool
+    _lock = threading.Lock()
+    _loop = None
+    _pool = None
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def close():
+    """Close the pool's sessions and stop the upstream loop"""
+    global _loop, _pool
+    with _lock:
+        if _loop is None:
+            return
+        if _pool is not None:
+            for session in _pool.sessions():
+                asyncio.run_coroutine_threadsafe(session.close(), _loop).result()
+            _pool = None
+        _loop.call_soon_threadsafe(_loop.stop)
+        _loop = None